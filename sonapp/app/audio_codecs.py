@@ -0,0 +1,288 @@
+import struct
+
+import numpy as np
+
+
+def to_pcm16(samples):
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def to_pcm16_into(samples, scratch, out):
+    """to_pcm16 through a reusable float32 scratch into an existing int16 array"""
+    np.clip(samples, -1.0, 1.0, out=scratch)
+    np.multiply(scratch, 32767, out=scratch)
+    np.copyto(out, scratch, casting='unsafe')
+    return out
+
+
+def scratch_for(codec, size):
+    """Per-codec float32, int16 and index work rows, reallocated only when the frame size changes"""
+    if codec.scratch is None or len(codec.scratch[0]) != size:
+        codec.scratch = (np.empty(size, dtype=np.float32), np.empty(size, dtype=np.int16),
+                         np.empty(size, dtype=np.intp))
+    return codec.scratch
+
+
+class Float32Codec:
+    """Raw float32 PCM, the original wire format"""
+
+    name = 'f32'
+    bytes_per_sample = 4
+    stateful = False
+
+    def payload_size(self, samples):
+        return samples * 4
+
+    def encode(self, samples):
+        return np.asarray(samples, dtype=np.float32).tobytes()
+
+    def encode_into(self, samples, out):
+        """Encode straight into the writable buffer out; returns the payload length"""
+        np.frombuffer(out, dtype=np.float32, count=len(samples))[:] = samples
+        return len(samples) * 4
+
+    def decode(self, payload):
+        return np.frombuffer(payload, dtype=np.float32).copy()
+
+    def decode_into(self, payload, out):
+        out[:] = np.frombuffer(payload, dtype=np.float32)
+
+
+class Int16Codec:
+    """16-bit linear PCM"""
+
+    name = 'pcm16'
+    bytes_per_sample = 2
+    stateful = False
+
+    def __init__(self):
+        self.scratch = None
+
+    def payload_size(self, samples):
+        return samples * 2
+
+    def encode(self, samples):
+        return to_pcm16(samples).tobytes()
+
+    def encode_into(self, samples, out):
+        scratch = scratch_for(self, len(samples))[0]
+        to_pcm16_into(samples, scratch, np.frombuffer(out, dtype=np.int16, count=len(samples)))
+        return len(samples) * 2
+
+    def decode(self, payload):
+        return np.frombuffer(payload, dtype=np.int16).astype(np.float32) / 32768
+
+    def decode_into(self, payload, out):
+        # Cast first, then scale in place: a mixed-type multiply would buffer the cast
+        np.copyto(out, np.frombuffer(payload, dtype=np.int16), casting='unsafe')
+        np.multiply(out, 1 / 32768, out=out)
+
+
+def _ulaw_tables():
+    pcm = np.arange(-32768, 32768, dtype=np.int32) >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    value = np.minimum(np.abs(pcm), 8159) + 0x21
+    segment = np.searchsorted(np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF]), value)
+    code = np.where(segment >= 8, 0x7F, (np.minimum(segment, 7) << 4) | ((value >> (segment + 1)) & 0x0F))
+    encode = ((code ^ mask) & 0xFF).astype(np.uint8)
+
+    code = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (code >> 4) & 0x07
+    t = (((code & 0x0F) << 3) + 0x84) << exponent
+    decode = np.where(code & 0x80, 0x84 - t, t - 0x84).astype(np.float32) / 32768
+    # Index the encoder by the int16 bit pattern so lookups need no offset.
+    return np.roll(encode, -32768), decode
+
+
+def _alaw_tables():
+    pcm = np.arange(-32768, 32768, dtype=np.int32) >> 3
+    mask = np.where(pcm >= 0, 0xD5, 0x55)
+    value = np.where(pcm >= 0, pcm, -pcm - 1)
+    segment = np.searchsorted(np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF]), value)
+    shift = np.where(segment < 2, 1, segment)
+    code = np.where(segment >= 8, 0x7F, (np.minimum(segment, 7) << 4) | ((value >> shift) & 0x0F))
+    encode = ((code ^ mask) & 0xFF).astype(np.uint8)
+
+    code = np.arange(256, dtype=np.int32) ^ 0x55
+    segment = (code & 0x70) >> 4
+    t = ((code & 0x0F) << 4) + np.where(segment == 0, 8, 0x108)
+    t = np.where(segment > 1, t << np.maximum(segment - 1, 0), t)
+    decode = np.where(code & 0x80, t, -t).astype(np.float32) / 32768
+    return np.roll(encode, -32768), decode
+
+
+class CompandingCodec:
+    """G.711 style 8-bit companding through precomputed lookup tables"""
+
+    bytes_per_sample = 1
+    stateful = False
+
+    def __init__(self, name, tables):
+        self.name = name
+        self.encode_table, self.decode_table = tables
+        self.scratch = None
+
+    def payload_size(self, samples):
+        return samples
+
+    def encode(self, samples):
+        return self.encode_table[to_pcm16(samples).view(np.uint16)].tobytes()
+
+    def encode_into(self, samples, out):
+        # take() needs intp indices and, with mode='raise', buffers its output;
+        # indices always fit the table, so convert into scratch and skip the check
+        scratch, pcm, index = scratch_for(self, len(samples))
+        to_pcm16_into(samples, scratch, pcm)
+        np.copyto(index, pcm.view(np.uint16))
+        np.take(self.encode_table, index, out=np.frombuffer(out, dtype=np.uint8, count=len(samples)), mode='wrap')
+        return len(samples)
+
+    def decode(self, payload):
+        return self.decode_table[np.frombuffer(payload, dtype=np.uint8)]
+
+    def decode_into(self, payload, out):
+        index = scratch_for(self, len(out))[2]
+        np.copyto(index, np.frombuffer(payload, dtype=np.uint8))
+        np.take(self.decode_table, index, out=out, mode='wrap')
+
+
+IMA_STEPS = [
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767,
+]
+IMA_INDEX = [-1, -1, -1, -1, 2, 4, 6, 8] * 2
+ADPCM_HEADER = struct.Struct('<hBx')  # predictor, step index
+
+
+class AdpcmCodec:
+    """IMA-ADPCM, 4 bits per sample.
+
+    Each frame starts with the encoder's predictor and step index, so frames
+    decode independently and a lost frame does not corrupt the next one. The
+    ADPCM recurrence is inherently sequential per sample; only the nibble
+    packing and PCM conversion are vectorized.
+    """
+
+    name = 'adpcm'
+    bytes_per_sample = 0.5
+    stateful = True  # encoder carries predictor state from frame to frame
+
+    def __init__(self):
+        self.predictor = 0
+        self.index = 0
+
+    def payload_size(self, samples):
+        return ADPCM_HEADER.size + (samples + 1) // 2
+
+    def encode(self, samples):
+        pcm = to_pcm16(samples).tolist()
+        header = ADPCM_HEADER.pack(self.predictor, self.index)
+        predictor, index = self.predictor, self.index
+        codes = [0] * len(pcm)
+        for i, sample in enumerate(pcm):
+            step = IMA_STEPS[index]
+            diff = sample - predictor
+            code = 0
+            if diff < 0:
+                code = 8
+                diff = -diff
+            delta = step >> 3
+            if diff >= step:
+                code |= 4
+                diff -= step
+                delta += step
+            step >>= 1
+            if diff >= step:
+                code |= 2
+                diff -= step
+                delta += step
+            step >>= 1
+            if diff >= step:
+                code |= 1
+                delta += step
+            predictor = predictor - delta if code & 8 else predictor + delta
+            predictor = -32768 if predictor < -32768 else 32767 if predictor > 32767 else predictor
+            index = min(88, max(0, index + IMA_INDEX[code]))
+            codes[i] = code
+        self.predictor, self.index = predictor, index
+
+        nibbles = np.array(codes, dtype=np.uint8)
+        if len(nibbles) % 2:
+            nibbles = np.append(nibbles, np.uint8(0))
+        return header + (nibbles[0::2] | (nibbles[1::2] << 4)).tobytes()
+
+    def encode_into(self, samples, out):
+        # The per-sample loop allocates anyway; this only matches the PCM codecs' interface
+        payload = self.encode(samples)
+        out[:len(payload)] = payload
+        return len(payload)
+
+    def decode(self, payload):
+        predictor, index = ADPCM_HEADER.unpack_from(payload)
+        packed = np.frombuffer(payload, dtype=np.uint8, offset=ADPCM_HEADER.size)
+        codes = np.empty(len(packed) * 2, dtype=np.uint8)
+        codes[0::2] = packed & 0x0F
+        codes[1::2] = packed >> 4
+
+        pcm = [0] * len(codes)
+        for i, code in enumerate(codes.tolist()):
+            step = IMA_STEPS[index]
+            delta = step >> 3
+            if code & 4:
+                delta += step
+            if code & 2:
+                delta += step >> 1
+            if code & 1:
+                delta += step >> 2
+            predictor = predictor - delta if code & 8 else predictor + delta
+            predictor = -32768 if predictor < -32768 else 32767 if predictor > 32767 else predictor
+            index = min(88, max(0, index + IMA_INDEX[code]))
+            pcm[i] = predictor
+        return np.array(pcm, dtype=np.float32) / 32768
+
+    def decode_into(self, payload, out):
+        out[:] = self.decode(payload)
+
+
+_ULAW = _ulaw_tables()
+_ALAW = _alaw_tables()
+
+CODECS = {
+    'f32': Float32Codec,
+    'pcm16': Int16Codec,
+    'ulaw': lambda: CompandingCodec('ulaw', _ULAW),
+    'alaw': lambda: CompandingCodec('alaw', _ALAW),
+    'adpcm': AdpcmCodec,
+}
+
+
+# Sent in the frame header's flags byte so a receiver can follow a mid-stream codec change
+CODEC_IDS = {'f32': 1, 'pcm16': 2, 'ulaw': 3, 'alaw': 4, 'adpcm': 5}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+
+
+def create_codec(name):
+    """Return a fresh codec instance; ADPCM keeps per-stream encoder state"""
+    return CODECS[name]()
+
+
+def negotiate(offered, supported=None):
+    """Pick the first offered codec the server supports, falling back to f32"""
+    supported = CODECS if supported is None else supported
+    for name in offered or ():
+        if name in supported:
+            return name
+    return 'f32'
+
+
+def cheaper_codec(offered, current):
+    """Next offered codec below current in bytes per sample, or None if there is none"""
+    size = create_codec(current).bytes_per_sample
+    candidates = [(create_codec(name).bytes_per_sample, name) for name in offered or () if name in CODECS]
+    candidates = [candidate for candidate in candidates if candidate[0] < size]
+    return max(candidates)[1] if candidates else None
@@ -3,57 +3,76 @@ import socket
 import threading
 import numpy as np
 import time
-import json
+import select
+
+import framing
+from audio_codecs import CODEC_NAMES, create_codec
+from discovery import ServerCache, ServerSearch
+from jitter_buffer import JitterBuffer
+from playout_smoother import PlayoutSmoother
+from spsc_ring import SpscRing
+from transmit_gate import OPEN, TransmitGate
+from vad import VoiceActivityDetector
 
 class AudioClient:
-    def __init__(self, channels=1, buffer_size=1024, discovery_port=65431):
+    KEEPALIVE_INTERVAL = 5  # seconds of media silence before a NAT keepalive
+    MAX_REDIRECTS = 3
+    CONNECT_TIMEOUT = 1.0  # a cached server that has gone away must not stall startup
+    JOIN_TIMEOUT = 5.0  # the server may consult the cluster directory before answering
+    CAPTURE_FRAMES = 8  # captured frames the sender may fall behind by before they are dropped
+    PLAYBACK_FRAMES = 4
+    PLAYBACK_LEAD = 2  # decoded frames the receiver keeps queued ahead of the output callback
+
+    def __init__(self, channels=1, buffer_size=1024, discovery_port=65431, channel_key='lobby',
+                 codecs=('ulaw', 'pcm16', 'f32'), transport='tcp', vad=True, gate=None):
         self.channels = channels
         self.buffer_size = buffer_size
         self.discovery_port = discovery_port
+        self.channel_key = channel_key
+        self.codecs = list(codecs)
+        self.codec = create_codec('f32')
+        self.rx_codec = self.codec  # the server may step our downstream to a cheaper codec
+        self.transport = transport
+        self.sample_rate = 48000
         self.running = True
+        self.tx_seq = 0
+        self.vad = VoiceActivityDetector() if vad else None
+        self.suppress_silence = False  # enabled once the server confirms support
+        self.talking = False
+        # Push-to-talk, toggle and mute close the gate; the server is told so it
+        # drops us from the mix at once rather than waiting out the jitter buffer
+        self.gate = gate if gate is not None else TransmitGate(OPEN)
+        self.gate.on_change = self.gate_changed
+        self.talk_state = True  # what the server last heard from us; it assumes we talk on join
+        self.send_lock = threading.Lock()  # held by the receiver while it moves us to another node
         
         # Initialize socket
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-        
-    def discover_server(self):
-        """Discover the audio server on the network"""
-        print("Searching for audio server...")
-        
-        # Create UDP socket for discovery
-        discovery_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        discovery_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        discovery_socket.settimeout(1)  # Set timeout for receiving response
-        
-        # Try different broadcast addresses
-        broadcast_addresses = [
-            '255.255.255.255',  # Global broadcast
-            '192.168.1.255',    # Common local network
-            '192.168.0.255',    # Alternative local network
-            '10.0.0.255'        # Another common network
-        ]
-        
-        for _ in range(5):  # Try 5 times
-            for broadcast_addr in broadcast_addresses:
-                try:
-                    # Send discovery request
-                    discovery_socket.sendto(b'', (broadcast_addr, self.discovery_port))
-                    
-                    # Wait for response
-                    data, _ = discovery_socket.recvfrom(1024)
-                    server_info = json.loads(data.decode())
-                    
-                    discovery_socket.close()
-                    return server_info['host'], server_info['port']
-                    
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    print(f"Discovery error on {broadcast_addr}: {e}")
-                    continue
+        self.sock = None
+        self.reader = None
+        self.open_stream()
+
+        # UDP media path, set up only if the server accepts transport='udp'
+        self.media_sock = None
+        self.media_token = None
+        self.media_buffer = bytearray(framing.MAX_DATAGRAM)
+        self.media_view = memoryview(self.media_buffer)
+        self.last_media_send = 0
+        self.server_cache = ServerCache()
+
+        # The audio callbacks only copy frames through these rings; network I/O,
+        # coding and the jitter buffer live on the sender and receiver threads
+        frame_size = buffer_size * channels
+        self.capture = SpscRing(self.CAPTURE_FRAMES, frame_size)
+        self.playback = SpscRing(self.PLAYBACK_FRAMES, frame_size)
+        self.captured = threading.Event()
+        self.frame = np.zeros(frame_size, dtype=np.float32)
+        self.input_xruns = 0  # PortAudio input overflows
+        self.output_xruns = 0  # PortAudio output underflows
+        self.playout = self.new_playout()
         
-        discovery_socket.close()
-        raise RuntimeError("Could not find audio server")
+    def search_server(self):
+        """Start discovery in the background; ServerSearch.result() waits for it"""
+        return ServerSearch(self.discovery_port, {'channel': self.channel_key}).start()
 
     def setup_audio_devices(self):
         """Set up audio input and output devices"""
@@ -83,55 +102,280 @@ class AudioClient:
         return devices.index(input_device), devices.index(output_device)
 
     def audio_output_callback(self, outdata, frames, time, status):
-        """Handle audio output"""
+        """Copy out the next decoded frame; runs on the audio thread, so nothing here blocks"""
         if status:
-            print(f"Output status: {status}")
-        
-        try:
-            data = self.sock.recv(self.buffer_size * 4)
-            if not data:
-                raise RuntimeError("Server connection closed")
-            
-            audio_array = np.frombuffer(data, dtype=np.float32)
-            outdata[:] = audio_array.reshape(-1, self.channels)
-            
-        except Exception as e:
-            print(f"Output error: {e}")
-            outdata.fill(0)
+            self.output_xruns += 1
+        if outdata.size != self.playback.frame_size or not self.playback.pop(outdata.reshape(-1)):
+            outdata.fill(0)  # the receiver fell behind: counted as a playback underrun
 
     def audio_input_callback(self, indata, frames, time, status):
-        """Handle audio input"""
+        """Copy the captured frame to the sender thread; runs on the audio thread"""
         if status:
-            print(f"Input status: {status}")
-            
+            self.input_xruns += 1
+        if not self.gate.is_open:
+            return  # nothing leaves the device while the gate is closed
+        if indata.size == self.capture.frame_size and self.capture.push(indata.reshape(-1)):
+            self.captured.set()
+
+    def gate_changed(self, is_open):
+        # Called from key and GUI threads: only wake the sender, which owns the socket
+        self.captured.set()
+
+    def send_loop(self):
+        """Sender thread: encode and send captured frames as the input callback queues them.
+
+        Talk state changes are sent from here too, in order with the audio,
+        so control and media writes never interleave on the TCP stream.
+        """
+        samples = np.zeros(self.capture.frame_size, dtype=np.float32)
+        while self.running:
+            try:
+                if len(self.capture):
+                    self.capture.pop(samples)
+                    with self.send_lock:
+                        if not self.talk_state:
+                            self.send_talk_state(True)
+                        self.send_audio(samples)
+                elif self.gate.is_open != self.talk_state:
+                    # Frames captured before the gate closed have gone out; now stop
+                    with self.send_lock:
+                        self.send_talk_state(self.gate.is_open)
+                else:
+                    self.captured.wait(0.1)
+                    self.captured.clear()
+            except OSError as e:
+                if self.running:
+                    print(f"Send error: {e}")
+                    self.running = False
+
+    def send_talk_state(self, talking):
+        self.talk_state = talking
+        self.talking = False  # a new talk spurt starts when the gate reopens
+        self.sock.sendall(framing.pack_json(framing.CONTROL, {'op': 'talk_state', 'talking': talking}))
+
+    def send_audio(self, samples):
+        if self.suppress_silence and not self.vad.is_speech(samples):
+            if not self.talking:
+                return
+            # End of a talk spurt: one marker, then nothing until speech resumes
+            self.talking = False
+            self.tx_seq += 1
+            frame = framing.pack_frame(framing.SILENCE, b'', self.tx_seq)
+        else:
+            self.talking = True
+            audio_data = self.codec.encode(samples)
+            self.tx_seq += 1
+            frame = framing.pack_frame(framing.AUDIO, audio_data, self.tx_seq)
+        if self.media_sock is not None:
+            self.send_media(frame)
+        else:
+            self.sock.sendall(frame)
+
+    def receive_loop(self):
+        """Receiver thread: fill the jitter buffer from the network and keep playback fed"""
+        poll = self.buffer_size / self.sample_rate / 4
+        while self.running:
+            sockets = [self.sock] if self.media_sock is None else [self.sock, self.media_sock]
+            try:
+                readable, _, _ = select.select(sockets, [], [], poll)
+                if self.media_sock in readable:
+                    self.receive_media()
+                if self.sock in readable:
+                    self.receive_stream()
+            except (OSError, ValueError, RuntimeError, framing.ProtocolError) as e:
+                if self.running:
+                    print(f"Receive error: {e}")
+                    self.running = False
+                return
+            # One concealed or time-stretched frame per frame the output callback consumed
+            while len(self.playback) < self.PLAYBACK_LEAD:
+                self.smoother.next(self.frame)
+                self.playback.push(self.frame)
+
+    def stats(self):
+        """Audio thread health alongside the playout jitter buffer's counters"""
+        return dict(self.playout.stats(), **self.smoother.stats(),
+                    capture_overruns=self.capture.overruns,
+                    playback_underruns=self.playback.underruns,
+                    input_xruns=self.input_xruns,
+                    output_xruns=self.output_xruns)
+
+    def open_stream(self):
+        """Fresh TCP control/stream socket, needed again after a redirect"""
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = framing.FrameReader(self.sock)
+
+    def wait_for_join(self, host):
+        """Read control frames until the server acknowledges the join.
+
+        Returns None once joined, or the (host, port) of the node that owns
+        the channel if this server redirects us there.
+        """
+        while True:
+            frame = self.reader.read_frame()
+            if frame is None:
+                raise RuntimeError("Server closed the connection during join")
+            if frame.type == framing.CONTROL:
+                message = frame.json()
+                if message.get('op') == 'joined':
+                    self.codec = self.rx_codec = create_codec(message.get('codec', 'f32'))
+                    stream_format = (message.get('sample_rate', self.sample_rate),
+                                     message.get('frame_size', self.buffer_size))
+                    if stream_format != (self.sample_rate, self.buffer_size):
+                        print(f"Warning: server streams {stream_format[0]} Hz in {stream_format[1]}-sample frames, "
+                              f"not our {self.sample_rate} Hz in {self.buffer_size}")
+                    self.playout = self.new_playout()
+                    self.suppress_silence = self.vad is not None and message.get('silence_suppression', False)
+                    if message.get('transport') == 'udp':
+                        self.open_media(host, message['udp_port'], message['token'])
+                    return None
+                if message.get('op') == 'redirect':
+                    return message['host'], message['port']
+
+    def open_media(self, host, port, token):
+        """Start the UDP media path; TCP stays open for control"""
+        self.media_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.media_sock.connect((host, port))
+        self.media_sock.setblocking(False)
+        self.media_token = token
+        self.send_media(framing.pack_frame(framing.KEEPALIVE))
+
+    def send_media(self, frame):
         try:
-            audio_data = indata.tobytes()
-            self.sock.sendall(audio_data)
-        except Exception as e:
-            print(f"Input error: {e}")
+            self.media_sock.send(framing.pack_datagram(self.media_token, frame))
+        except OSError:
+            pass  # a dropped datagram is loss, not an error
+        self.last_media_send = time.monotonic()
+
+    def new_playout(self):
+        # Concealment and time-stretching cover late frames, so the buffer keeps
+        # only one jitter's worth of headroom and leaves excess depth to drain
+        playout = JitterBuffer(self.buffer_size / self.sample_rate, frame_size=self.playback.frame_size,
+                               store=self.decode_into, headroom=1.0, max_excess=4)
+        self.smoother = PlayoutSmoother(playout, self.playback.frame_size, self.sample_rate)
+        return playout
+
+    def decode_into(self, payload, row):
+        self.rx_codec.decode_into(payload, row)
+
+    def play(self, frame):
+        """Queue an audio frame for playout, decoding with the codec named in its header flags"""
+        name = CODEC_NAMES.get(frame.flags)
+        if name is not None and name != self.rx_codec.name:
+            print(f"Server switched our stream to {name}")
+            self.rx_codec = create_codec(name)
+        # Decoded by the jitter buffer straight into its ring; a frame of the wrong size is dropped
+        if len(frame.payload) == self.rx_codec.payload_size(self.playback.frame_size):
+            self.playout.put(frame.seq, frame.timestamp, frame.payload)
+
+    def receive_stream(self):
+        """Move whatever TCP frames have arrived into the playout buffer without blocking"""
+        while True:
+            frame = self.reader.next_frame()
+            if frame is None:
+                readable, _, _ = select.select([self.sock], [], [], 0)
+                if not readable:
+                    return
+                if not self.reader.fill():
+                    raise RuntimeError("Server connection closed")
+                continue
+            if frame.type == framing.AUDIO:
+                self.play(frame)
+            elif frame.type == framing.CONTROL:
+                message = frame.json()
+                if message.get('op') == 'redirect':
+                    self.move(message['host'], message['port'])
+                    return
+
+    def move(self, host, port):
+        """Rejoin our channel on the node that now owns it; the sender waits until we are in"""
+        print(f"Channel {self.channel_key} moved to {host}:{port}, rejoining")
+        with self.send_lock:
+            if self.media_sock is not None:
+                self.media_sock.close()
+                self.media_sock = None
+            self.join(host, port)
+            self.talk_state = True  # the new node assumes we talk, like any join
+
+    def receive_media(self):
+        """Drain queued datagrams into the playout jitter buffer"""
+        while True:
+            try:
+                size = self.media_sock.recv_into(self.media_buffer)
+            except OSError:
+                return  # drained (BlockingIOError) or socket closed
+            try:
+                token, frame = framing.parse_datagram(self.media_view, size)
+            except framing.ProtocolError:
+                continue
+            if token == self.media_token and frame.type == framing.AUDIO:
+                self.play(frame)
 
     def connect(self):
-        """Connect to server with retry logic"""
+        """Connect to server with retry logic.
+
+        The server that last accepted this channel is tried straight away
+        while discovery runs in the background, so a normal launch joins in
+        one round trip. Discovery only runs again after its answer fails.
+        """
         max_retries = 5
         retry_count = 0
+        started = time.monotonic()
+        search = self.search_server()
+        cached = self.server_cache.load(self.channel_key)
+        if cached is not None:
+            try:
+                host, port = self.join(*cached)
+                print(f"Rejoined last server {host}:{port} in {(time.monotonic() - started) * 1000:.0f} ms "
+                      f"(codec: {self.codec.name})")
+                return True
+            except Exception as e:
+                print(f"Last server {cached[0]}:{cached[1]} unavailable ({e}), waiting for discovery")
         
         while retry_count < max_retries:
             try:
-                # Discover server
-                host, port = self.discover_server()
+                host, port = search.result()
                 print(f"Found server at {host}:{port}")
-                
-                # Connect to server
-                self.sock.connect((host, port))
-                print(f"Connected to server at {host}:{port}")
+                host, port = self.join(host, port)
+                print(f"Connected to server at {host}:{port} in {(time.monotonic() - started) * 1000:.0f} ms "
+                      f"(codec: {self.codec.name})")
                 return True
             except Exception as e:
                 retry_count += 1
                 print(f"Connection attempt {retry_count}/{max_retries} failed: {e}")
                 time.sleep(1)
+                search = self.search_server()
         
         raise RuntimeError("Failed to connect to server")
 
+    def join(self, host, port):
+        """Join our channel at host:port, following redirects; returns the server that accepted us"""
+        # Connect to server, following redirects to the node that owns the channel
+        for _ in range(self.MAX_REDIRECTS + 1):
+            self.open_stream()
+            self.sock.settimeout(self.CONNECT_TIMEOUT)
+            self.sock.connect((host, port))
+            self.sock.settimeout(self.JOIN_TIMEOUT)
+            # The server resamples to and from its mix rate, so we send in the device's own format
+            self.sock.sendall(framing.pack_json(framing.JOIN, {'channel': self.channel_key,
+                                                                'codecs': self.codecs,
+                                                                'transport': self.transport,
+                                                                'sample_rate': self.sample_rate,
+                                                                'frame_size': self.buffer_size}))
+            redirect = self.wait_for_join(host)
+            if redirect is None:
+                break
+            print(f"Channel {self.channel_key} is hosted on {redirect[0]}:{redirect[1]}, redirecting")
+            host, port = redirect
+        else:
+            raise RuntimeError("Too many redirects")
+        self.sock.settimeout(None)
+        self.server_cache.save(self.channel_key, host, port)
+        return host, port
+
     def run(self):
         """Run the audio client"""
         try:
@@ -142,6 +386,8 @@ class AudioClient:
             
             # Connect to server
             self.connect()
+            threading.Thread(target=self.receive_loop, daemon=True).start()
+            threading.Thread(target=self.send_loop, daemon=True).start()
             
             # Start audio streams
             with sd.InputStream(device=input_device_id,
@@ -158,6 +404,9 @@ class AudioClient:
                 print("Audio streams started")
                 while self.running:
                     time.sleep(0.1)
+                    if (self.media_sock is not None and
+                            time.monotonic() - self.last_media_send > self.KEEPALIVE_INTERVAL):
+                        self.send_media(framing.pack_frame(framing.KEEPALIVE))
                     
         except Exception as e:
             print(f"Error: {e}")
@@ -167,8 +416,14 @@ class AudioClient:
     def stop(self):
         """Stop the client and clean up"""
         self.running = False
+        self.captured.set()
+        if self.media_sock is not None:
+            self.media_sock.close()
         self.sock.close()
-        print("Client stopped")
+        stats = self.stats()
+        print(f"Client stopped ({stats['playback_underruns']} playback underruns, "
+              f"{stats['capture_overruns']} capture overruns, "
+              f"{stats['input_xruns'] + stats['output_xruns']} device xruns)")
 
 if __name__ == "__main__":
     client = AudioClient()
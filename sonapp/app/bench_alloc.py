@@ -0,0 +1,151 @@
+import argparse
+import selectors
+import socket
+import sys
+import tracemalloc
+
+import numpy as np
+
+import framing
+from audio_codecs import CODECS
+from bench_codecs import speech_like
+from event_server import EventLoopAudioServer
+
+
+class LoopbackClient:
+    """One channel member wired to the server over a socketpair, or UDP for media.
+
+    The client side reuses one preallocated frame and only rewrites its
+    header each tick, so whatever tracemalloc sees is the server's doing.
+    """
+
+    def __init__(self, server, channel, codec, udp=False):
+        self.server = server
+        self.peer, sock = socket.socketpair()
+        self.peer.setblocking(False)
+        conn = {'address': sock.getsockname() or ('loopback', 0), 'reader': framing.FrameReader(sock),
+                'client_id': None}
+        sock.setblocking(False)
+        server.selector.register(sock, selectors.EVENT_READ, conn)
+        conn['client_id'], self.data = server.add_client(sock, conn['address'], channel, codec)
+        self.sock, self.conn = sock, conn
+
+        samples = speech_like(server.buffer_size, server.sample_rate, seed=self.data['id'] % 1000)
+        payload = self.data['codec'].encode(samples)
+        start = framing.TOKEN.size
+        self.frame = bytearray(start + framing.HEADER.size + len(payload))
+        self.frame[start + framing.HEADER.size:] = payload
+        self.frame_view = memoryview(self.frame)
+        self.seq = 0
+
+        self.media = None
+        if udp:
+            self.data['token'] = token = self.data['id'] & 0xFFFFFFFF
+            server.media_tokens[token] = self.data['id']
+            framing.TOKEN.pack_into(self.frame, 0, token)
+            self.media = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.media.bind(('127.0.0.1', 0))
+            self.media.setblocking(False)
+            self.media.connect(server.media_socket.getsockname())
+            self.data['udp_addr'] = self.media.getsockname()
+        self.sink = bytearray(1 << 20)
+
+    def send(self):
+        self.seq += 1
+        length = len(self.frame) - framing.TOKEN.size - framing.HEADER.size
+        framing.pack_header_into(self.frame, framing.TOKEN.size, framing.AUDIO, length, self.seq)
+        if self.media is not None:
+            self.media.send(self.frame_view)
+        else:
+            self.peer.send(self.frame_view[framing.TOKEN.size:])
+
+    def drain(self):
+        for sock in (self.peer, self.media):
+            while sock is not None:
+                try:
+                    if not sock.recv_into(self.sink):
+                        break
+                except (BlockingIOError, InterruptedError):
+                    break
+
+
+def build(buffer_size, members, codec, udp_members):
+    server = EventLoopAudioServer(buffer_size=buffer_size, metrics_port=None)
+    server.media_socket.bind(('127.0.0.1', 0))
+    server.media_socket.setblocking(False)
+    clients = [LoopbackClient(server, 'alloc', codec, udp=i < udp_members) for i in range(members)]
+    return server, clients
+
+
+def tick(server, clients):
+    for client in clients:
+        client.send()
+    server.read_datagrams()
+    for client in clients:
+        server.read_frames(client.sock, client.conn)
+    server.mix_tick()
+    for client in clients:
+        client.drain()
+
+
+def measure(buffer_size, members, codec, udp_members, warmup, ticks):
+    """Traced memory over `ticks` steady-state ticks: (largest transient, growth, frames played)"""
+    server, clients = build(buffer_size, members, codec, udp_members)
+    try:
+        for _ in range(warmup):
+            tick(server, clients)
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            for _ in range(ticks // 2):
+                tick(server, clients)
+            halfway = tracemalloc.get_traced_memory()[0]
+            for _ in range(ticks - ticks // 2):
+                tick(server, clients)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        played = sum(c.data['buffer'].played for c in clients)
+        # The first half of the run settles the live ints and dict entries every
+        # client keeps; anything still growing after that is a leak. The peak above
+        # the live set is the largest thing allocated and freed within a tick.
+        return peak - current, current - halfway, played
+    finally:
+        server.stop()
+        for client in clients:
+            client.peer.close()
+            if client.media is not None:
+                client.media.close()
+
+
+def run(buffer_size, members, codecs, udp_members, warmup, ticks):
+    """Steady-state receive, mix and send must never hold a frame-sized allocation"""
+    frame_bytes = buffer_size * np.dtype(np.float32).itemsize
+    failures = []
+    print(f"{members} members ({udp_members} on UDP), {buffer_size} samples, {ticks} ticks after {warmup} warmup")
+    print(f"{'codec':>6} | {'transient':>10} | {'growth':>10} | {'played':>7}")
+    print("-" * 44)
+    for codec in codecs:
+        transient, growth, played = measure(buffer_size, members, codec, udp_members, warmup, ticks)
+        # ADPCM's per-sample loop builds Python lists by design; it is reported, not gated
+        ok = codec == 'adpcm' or (transient < frame_bytes and growth < frame_bytes)
+        if not ok:
+            failures.append(codec)
+        print(f"{codec:>6} | {transient:>10} | {growth:>10} | {played:>7}{'' if ok else '  FAIL'}")
+    print(f"\nGate: largest transient and second-half growth each below one frame ({frame_bytes} bytes)")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="tracemalloc check that the server audio path does not allocate")
+    parser.add_argument('--buffer-size', type=int, default=1024)
+    parser.add_argument('--members', type=int, default=4)
+    parser.add_argument('--udp-members', type=int, default=1)
+    parser.add_argument('--codecs', nargs='+', default=list(CODECS), choices=list(CODECS))
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--ticks', type=int, default=500)
+    args = parser.parse_args()
+    failures = run(args.buffer_size, args.members, args.codecs, args.udp_members, args.warmup, args.ticks)
+    if failures:
+        print(f"Allocating codecs: {', '.join(failures)}")
+    sys.exit(1 if failures else 0)
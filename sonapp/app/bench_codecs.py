@@ -0,0 +1,47 @@
+import argparse
+import timeit
+
+import numpy as np
+
+from audio_codecs import CODECS, create_codec
+
+
+def speech_like(buffer_size, sample_rate, seed=0):
+    """Harmonic tone with a syllable-rate envelope and a little noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(buffer_size) / sample_rate
+    voice = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 8))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+    return (0.2 * voice * envelope + rng.normal(0, 0.01, buffer_size)).astype(np.float32)
+
+
+def run(buffer_size, sample_rate, repeat):
+    samples = speech_like(buffer_size, sample_rate)
+    frames_per_sec = sample_rate / buffer_size
+    print(f"Frame size: {buffer_size} samples @ {sample_rate} Hz ({frames_per_sec:.1f} frames/s per stream)")
+    print(f"{'codec':>6} | {'bytes/frame':>11} | {'kbit/s':>8} | {'vs f32':>6} | "
+          f"{'enc frames/s':>12} | {'dec frames/s':>12} | {'SNR dB':>6}")
+    print("-" * 80)
+    for name in CODECS:
+        encoder = create_codec(name)
+        decoder = create_codec(name)
+        payload = encoder.encode(samples)
+        decoded = decoder.decode(payload)
+        noise = np.sum((samples - decoded) ** 2)
+        snr = 10 * np.log10(np.sum(samples ** 2) / noise) if noise > 0 else float('inf')
+
+        encode = min(timeit.repeat(lambda: encoder.encode(samples), number=repeat, repeat=3))
+        decode = min(timeit.repeat(lambda: decoder.decode(payload), number=repeat, repeat=3))
+        kbps = len(payload) * frames_per_sec * 8 / 1000
+        ratio = len(payload) / (buffer_size * 4)
+        print(f"{name:>6} | {len(payload):>11} | {kbps:>8.1f} | {ratio:>6.3f} | "
+              f"{repeat / encode:>12.0f} | {repeat / decode:>12.0f} | {snr:>6.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Wire codec throughput and bandwidth")
+    parser.add_argument('--buffer-size', type=int, default=1024)
+    parser.add_argument('--sample-rate', type=int, default=48000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    run(args.buffer_size, args.sample_rate, args.repeat)
@@ -0,0 +1,60 @@
+import argparse
+import timeit
+
+import numpy as np
+
+from channel_mixer import ChannelMixer
+
+
+def legacy_mix_tick(frames, buffer_size):
+    """Per-listener mix as CentralAudioServer.mix_audio used to compute it"""
+    mixes = []
+    for current in range(len(frames)):
+        mixed = np.zeros(buffer_size, dtype=np.float32)
+        active_clients = 0
+        for i, audio_array in enumerate(frames):
+            if i != current:
+                mixed += audio_array
+                active_clients += 1
+        if active_clients > 0:
+            mixed /= active_clients
+            mixed = np.clip(mixed, -1.0, 1.0)
+        mixes.append(mixed.tobytes())
+    return mixes
+
+
+def kernel_mix_tick(mixer, frames):
+    matrix = mixer.load(len(frames))
+    for i, audio_array in enumerate(frames):
+        matrix[i] = audio_array
+    own, _ = mixer.mix(len(frames))
+    return own
+
+
+def run(member_counts, buffer_size, repeat):
+    rng = np.random.default_rng(0)
+    print(f"Frame size: {buffer_size} samples, {repeat} ticks per measurement, every member talking")
+    print(f"{'members':>8} | {'legacy us/tick':>15} | {'kernel us/tick':>15} | {'speedup':>8}")
+    print("-" * 56)
+    for count in member_counts:
+        frames = [rng.uniform(-0.5, 0.5, buffer_size).astype(np.float32) for _ in range(count)]
+        mixer = ChannelMixer(buffer_size, capacity=count)
+
+        expected = np.frombuffer(b''.join(legacy_mix_tick(frames, buffer_size)), dtype=np.float32)
+        actual = kernel_mix_tick(mixer, frames).ravel()
+        assert np.allclose(expected, actual, atol=1e-5), "kernel output diverged from legacy mix"
+
+        legacy = min(timeit.repeat(lambda: legacy_mix_tick(frames, buffer_size), number=repeat, repeat=3))
+        kernel = min(timeit.repeat(lambda: kernel_mix_tick(mixer, frames), number=repeat, repeat=3))
+        legacy_us = legacy / repeat * 1e6
+        kernel_us = kernel / repeat * 1e6
+        print(f"{count:>8} | {legacy_us:>15.1f} | {kernel_us:>15.1f} | {legacy_us / kernel_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Channel mixer cost per tick")
+    parser.add_argument('--members', type=int, nargs='+', default=[2, 5, 10, 20, 50])
+    parser.add_argument('--buffer-size', type=int, default=1024)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    run(args.members, args.buffer_size, args.repeat)
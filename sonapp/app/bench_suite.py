@@ -0,0 +1,275 @@
+import argparse
+import fnmatch
+import json
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+import numpy as np
+
+import framing
+import metrics
+from audio_codecs import CODECS, create_codec
+from bench_codecs import speech_like
+from bench_mixer import legacy_mix_tick, kernel_mix_tick
+from channel_mixer import ChannelMixer
+from level_meter import LevelMeter
+from resampler import FrameResampler, PolyphaseResampler
+from vad import VoiceActivityDetector
+
+FRAME_SIZES = [256, 512, 1024, 2048, 4096]
+RATE_PAIRS = [(44100, 48000), (48000, 44100), (16000, 48000), (48000, 16000)]
+MEMBER_COUNTS = [2, 5, 10, 20, 50]
+DTYPES = ['float32', 'int16', 'float64']
+SAMPLE_RATE = 48000
+
+
+def case_key(name, params):
+    return name + ''.join(f"[{k}={v}]" for k, v in params.items())
+
+
+def mixer_cases(frame_sizes, member_counts):
+    rng = np.random.default_rng(0)
+    for size in frame_sizes:
+        for members in member_counts:
+            frames = [rng.uniform(-0.5, 0.5, size).astype(np.float32) for _ in range(members)]
+            mixer = ChannelMixer(size, capacity=members)
+            params = {'frame': size, 'members': members}
+            yield 'mix.legacy', params, lambda f=frames, s=size: legacy_mix_tick(f, s)
+            yield 'mix.kernel', params, lambda m=mixer, f=frames: kernel_mix_tick(m, f)
+            # Typical conversation: roughly a third of the channel talking at once
+            speakers = frames[:max(1, round(members * 0.3))]
+            yield 'mix.kernel_sparse', params, lambda m=mixer, f=speakers: kernel_mix_tick(m, f)
+
+
+def legacy_audio_level(audio_data):
+    """Per-packet level as calculate_audio_level used to compute it"""
+    audio_array = np.frombuffer(audio_data, dtype=np.float32)
+    rms = np.sqrt(np.mean(np.square(audio_array)))
+    db = 20 * np.log10(rms) if rms > 0 else -100
+    return max(-100, db)
+
+
+def level_cases(frame_sizes, member_counts):
+    vad = VoiceActivityDetector()
+    for size in frame_sizes:
+        samples = speech_like(size, SAMPLE_RATE)
+        data = samples.tobytes()
+        params = {'frame': size}
+        yield 'level.calculate_audio_level', params, lambda d=data: legacy_audio_level(d)
+        yield 'level.vad_level_db', params, lambda s=samples: vad.level_db(s)
+        for members in member_counts:
+            # One meter pass per channel tick versus one legacy call per member frame
+            frames = np.stack([speech_like(size, SAMPLE_RATE, seed=i) for i in range(members)])
+            payloads = [row.tobytes() for row in frames]
+            meter = LevelMeter()
+            ids = list(range(members))
+            channel = {'frame': size, 'members': members}
+            yield 'level.legacy_channel', channel, lambda p=payloads: [legacy_audio_level(d) for d in p]
+            yield 'level.meter_update', channel, lambda m=meter, i=ids, f=frames: m.update(i, f)
+
+
+def conversion_cases(frame_sizes, dtypes):
+    for size in frame_sizes:
+        for dtype in dtypes:
+            samples = (speech_like(size, SAMPLE_RATE) * 32767 if dtype == 'int16'
+                       else speech_like(size, SAMPLE_RATE)).astype(dtype)
+            data = samples.tobytes()
+            params = {'frame': size, 'dtype': dtype}
+            yield 'convert.frombuffer', params, lambda d=data, t=dtype: np.frombuffer(d, dtype=t)
+            yield 'convert.tobytes', params, lambda s=samples: s.tobytes()
+            yield 'convert.roundtrip', params, lambda d=data, t=dtype: np.frombuffer(d, dtype=t).tobytes()
+
+
+def codec_cases(frame_sizes):
+    for size in frame_sizes:
+        samples = speech_like(size, SAMPLE_RATE)
+        for name in CODECS:
+            encoder, decoder = create_codec(name), create_codec(name)
+            payload = encoder.encode(samples)
+            params = {'frame': size, 'codec': name}
+            out = memoryview(bytearray(len(payload)))
+            row = np.empty(size, dtype=np.float32)
+            yield 'codec.encode', params, lambda c=encoder, s=samples: c.encode(s)
+            yield 'codec.encode_into', params, lambda c=encoder, s=samples, o=out: c.encode_into(s, o)
+            yield 'codec.decode', params, lambda c=decoder, p=payload: c.decode(p)
+            yield 'codec.decode_into', params, lambda c=decoder, p=payload, r=row: c.decode_into(p, r)
+
+
+def legacy_resample(samples, rate_in, rate_out):
+    """Stateless linear interpolation, the obvious per-frame alternative"""
+    count = len(samples) * rate_out // rate_in
+    return np.interp(np.arange(count) * (rate_in / rate_out), np.arange(len(samples)), samples)
+
+
+def resample_cases(frame_sizes):
+    for size in frame_sizes:
+        for rate_in, rate_out in RATE_PAIRS:
+            samples = speech_like(size, rate_in)
+            resampler = PolyphaseResampler(rate_in, rate_out)
+            out = np.empty(resampler.max_output(size), dtype=np.float32)
+            # Full per-client cost: resampling plus reframing into fixed frames
+            framer = FrameResampler(rate_in, rate_out, size, size)
+
+            def reframe(f=framer, s=samples):
+                f.push(s)
+                while f.pull() is not None:
+                    pass
+
+            params = {'frame': size, 'rates': f"{rate_in}-{rate_out}"}
+            yield 'resample.interp', params, lambda s=samples, a=rate_in, b=rate_out: legacy_resample(s, a, b)
+            yield 'resample.polyphase', params, lambda r=resampler, s=samples, o=out: r.process(s, o)
+            yield 'resample.reframe', params, reframe
+
+
+def framing_cases(frame_sizes, batch=64):
+    for size in frame_sizes:
+        payload = speech_like(size, SAMPLE_RATE).tobytes()
+        frame = framing.pack_frame(framing.AUDIO, payload, 1)
+        datagram = bytearray(framing.pack_datagram(1, frame))
+        view = memoryview(datagram)
+        reader = framing.FrameReader(None)
+        frames = min(batch, len(reader.buffer) // len(frame))
+        stream = frame * frames
+        params = {'frame': size}
+
+        def parse_stream(r=reader, s=stream):
+            r.prime(s)
+            while r.next_frame() is not None:
+                pass
+
+        yield 'framing.pack_frame', params, lambda p=payload: framing.pack_frame(framing.AUDIO, p, 1)
+        yield 'framing.header_unpack', params, lambda f=frame: framing.HEADER.unpack_from(f)
+        # Cost of draining one receive buffer holding `frames` frames
+        yield 'framing.reader_drain', dict(params, batch=frames), parse_stream
+        yield 'framing.parse_datagram', params, lambda v=view, n=len(datagram): framing.parse_datagram(v, n)
+
+
+def metrics_cases():
+    """Hot-path instrumentation, to compare against the mix.* cost of one tick"""
+    registry = metrics.MetricsRegistry()
+    counter = registry.counter('bench_total', "Benchmark counter")
+    histogram = registry.histogram('bench_seconds', "Benchmark histogram", metrics.MIX_BUCKETS)
+    yield 'metrics.counter_inc', {}, counter.inc
+    yield 'metrics.histogram_observe', {}, lambda: histogram.observe(0.0007)
+
+
+def collect_cases(frame_sizes, member_counts, dtypes):
+    yield from mixer_cases(frame_sizes, member_counts)
+    yield from level_cases(frame_sizes, member_counts)
+    yield from conversion_cases(frame_sizes, dtypes)
+    yield from codec_cases(frame_sizes)
+    yield from resample_cases(frame_sizes)
+    yield from framing_cases(frame_sizes)
+    yield from metrics_cases()
+
+
+def measure(func, repeat, min_time):
+    """Per-call time in microseconds: (best, median) over `repeat` calibrated runs"""
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(number, int(number * min_time / max(elapsed, 1e-9)))
+    runs = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    return min(runs), float(np.median(runs)), number
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(patterns, frame_sizes, member_counts, dtypes, repeat, min_time):
+    results = []
+    print(f"{'benchmark':<58} | {'best us':>10} | {'median us':>10}")
+    print("-" * 84)
+    for name, params, func in collect_cases(frame_sizes, member_counts, dtypes):
+        key = case_key(name, params)
+        if patterns and not any(fnmatch.fnmatch(key, p) for p in patterns):
+            continue
+        best, median, number = measure(func, repeat, min_time)
+        results.append({'key': key, 'name': name, 'params': params,
+                        'best_us': best, 'median_us': median, 'loops': number})
+        print(f"{key:<58} | {best:>10.2f} | {median:>10.2f}")
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Print per-benchmark change; returns the keys that regressed beyond threshold"""
+    base = {r['key']: r for r in baseline['results']}
+    regressions = []
+    print(f"Baseline {baseline['meta'].get('revision')} vs current {current['meta'].get('revision')}, "
+          f"threshold {threshold:.0%} on best time")
+    print(f"{'benchmark':<58} | {'base us':>10} | {'now us':>10} | {'change':>8} |")
+    print("-" * 100)
+    for result in current['results']:
+        old = base.get(result['key'])
+        if old is None:
+            continue
+        change = result['best_us'] / old['best_us'] - 1
+        if change > threshold:
+            verdict = 'REGRESSION'
+            regressions.append(result['key'])
+        elif change < -threshold:
+            verdict = 'faster'
+        else:
+            verdict = ''
+        print(f"{result['key']:<58} | {old['best_us']:>10.2f} | {result['best_us']:>10.2f} | "
+              f"{change:>+8.1%} | {verdict}")
+    missing = set(base) - {r['key'] for r in current['results']}
+    if missing:
+        print(f"{len(missing)} baseline benchmarks were not run this time")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the server hot paths")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run benchmarks and optionally save JSON results")
+    run_parser.add_argument('patterns', nargs='*', help="glob filters on benchmark keys, e.g. 'mix.*'")
+    run_parser.add_argument('--frame-sizes', type=int, nargs='+', default=FRAME_SIZES)
+    run_parser.add_argument('--members', type=int, nargs='+', default=MEMBER_COUNTS)
+    run_parser.add_argument('--dtypes', nargs='+', default=DTYPES)
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--min-time', type=float, default=0.05, help="seconds per timing run")
+    run_parser.add_argument('--output', metavar='PATH', help="write results as JSON")
+
+    compare_parser = commands.add_parser('compare', help="flag regressions between two result files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help="relative slowdown that counts as a regression")
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        report = run(args.patterns, args.frame_sizes, args.members, args.dtypes, args.repeat, args.min_time)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"\nWrote {len(report['results'])} results to {args.output}")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s)")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class ChannelMixer:
+    """Sum-minus-self mixing kernel for one channel.
+
+    Only members that are actually talking are stacked into the preallocated
+    (speakers, samples) matrix, so silent members cost nothing. The channel
+    sum is computed once; each speaker hears the sum minus their own row and
+    every silent member hears the same shared full mix. A tick therefore
+    costs O(speakers) frame operations instead of the O(N^2) of summing every
+    other member per listener. Normalization and clipping happen in place in
+    reusable output buffers.
+    """
+
+    def __init__(self, buffer_size=1024, capacity=10):
+        self.buffer_size = buffer_size
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.frames = np.zeros((capacity, self.buffer_size), dtype=np.float32)
+        self.output = np.zeros((capacity, self.buffer_size), dtype=np.float32)
+        self.shared = np.zeros(self.buffer_size, dtype=np.float32)
+
+    def load(self, count):
+        """Return a frame matrix with room for count speakers this tick"""
+        if count > self.capacity:
+            self._allocate(max(count, self.capacity * 2))
+        return self.frames[:count]
+
+    def mix(self, speakers):
+        """Mix the first `speakers` rows loaded this tick.
+
+        Returns (own, shared): own[i] is what speaker i hears (everyone but
+        themselves, only meaningful with two or more speakers) and shared is
+        what every non-speaking member hears.
+        """
+        frames = self.frames[:speakers]
+        own = self.output[:speakers]
+        shared = self.shared
+
+        np.sum(frames, axis=0, out=shared)
+        if speakers > 1:
+            # Broadcast copy then a same-shape subtract: a broadcasting subtract
+            # would make numpy allocate an iterator buffer every tick
+            np.copyto(own, shared)
+            np.subtract(own, frames, out=own)
+            # Each listener is normalized by the number of *other* speakers.
+            np.multiply(own, 1.0 / (speakers - 1), out=own)
+            np.clip(own, -1.0, 1.0, out=own)
+        if speakers > 0:
+            np.multiply(shared, 1.0 / speakers, out=shared)
+            np.clip(shared, -1.0, 1.0, out=shared)
+        return own, shared
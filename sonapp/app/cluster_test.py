@@ -0,0 +1,213 @@
+import argparse
+import random
+import socket
+import sys
+import threading
+import time
+
+import framing
+from directory import DirectoryClient, DirectoryService, RingSnapshot
+from event_server import EventLoopAudioServer
+from test_server_central import CentralAudioServer
+
+SERVERS = {
+    'central': CentralAudioServer,
+    'event': EventLoopAudioServer,
+}
+
+
+class Node:
+    """One server node on localhost, running on its own thread"""
+
+    def __init__(self, kind, port, directory, heartbeat):
+        self.server = SERVERS[kind](discovery_port=0, directory=directory, metrics_port=None, stream_port=port)
+        self.server.HEARTBEAT_INTERVAL = heartbeat
+        self.server.host = '127.0.0.1'
+        self.port = port
+        self.thread = threading.Thread(target=self.server.start, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.running = False
+        try:
+            self.server.stop()
+        except OSError:
+            pass
+
+
+class Member:
+    """A channel member that only joins and then holds its connection open"""
+
+    def __init__(self, channel, timeout):
+        self.channel = channel
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+        self.port = None
+        self.redirects = 0
+
+    def join(self, port, max_redirects=3):
+        """Join through the node at port, following redirects; returns seconds until the ack"""
+        started = time.perf_counter()
+        for _ in range(max_redirects + 1):
+            sock = socket.create_connection(('127.0.0.1', port), timeout=self.timeout)
+            sock.sendall(framing.pack_json(framing.JOIN, {'channel': self.channel, 'codecs': ['pcm16']}))
+            reader = framing.FrameReader(sock)
+            while True:
+                frame = reader.read_frame()
+                if frame is None:
+                    raise ConnectionError(f"node {port} closed the connection during join")
+                if frame.type != framing.CONTROL:
+                    continue
+                ack = frame.json()
+                if ack.get('op') in ('joined', 'redirect'):
+                    break
+            if ack['op'] == 'joined':
+                self.close()
+                self.sock, self.port, self.reader = sock, port, reader
+                return time.perf_counter() - started
+            sock.close()
+            self.redirects += 1
+            port = ack['port']
+        raise ConnectionError(f"too many redirects for {self.channel}")
+
+    def follow(self):
+        """Rejoin wherever the node has moved our channel since; True if it had"""
+        self.sock.setblocking(False)
+        try:
+            while True:
+                for frame in self.reader.frames():
+                    if frame.type == framing.CONTROL and frame.json().get('op') == 'redirect':
+                        self.sock.setblocking(True)
+                        self.join(frame.json()['port'])
+                        return True
+                if not self.reader.fill():
+                    raise ConnectionError(f"node {self.port} closed the connection")
+        except (BlockingIOError, InterruptedError):
+            self.sock.setblocking(True)
+            return False
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+
+
+def wait_for_rings(nodes, count, timeout):
+    """Block until every node's ring snapshot lists `count` members"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(len(node.server.ring.members) == count for node in nodes):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def join_all(members, nodes, rng):
+    """Join every member through a random node; returns the join times"""
+    return [member.join(rng.choice(nodes).port) for member in members]
+
+
+def split_channels(members):
+    """Channels whose members did not all land on the same node"""
+    homes = {}
+    for member in members:
+        homes.setdefault(member.channel, set()).add(member.port)
+    return sorted(channel for channel, ports in homes.items() if len(ports) > 1)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    directory = DirectoryService(ttl=max(3 * args.heartbeat, 1))
+    nodes = [Node(args.server, args.port + i, directory, args.heartbeat).start() for i in range(args.nodes)]
+    members = []
+    failures = []
+    try:
+        if not wait_for_rings(nodes, args.nodes, args.timeout):
+            failures.append("nodes never saw the full ring")
+        channels = [f"cluster_{i}" for i in range(args.channels)]
+
+        # 1: every channel's members meet on the node that owns it on the ring
+        first = [Member(channel, args.timeout) for channel in channels for _ in range(args.members)]
+        times = join_all(first, nodes, rng)
+        members.extend(first)
+        ring = RingSnapshot(directory.members())
+        misplaced = sum(1 for m in first if ring.lookup(m.channel)['port'] != m.port)
+        redirects = sum(m.redirects for m in first)
+        print(f"{args.nodes} nodes, {len(channels)} channels x {args.members} members")
+        print(f"  join p50 {percentile(times, 0.5) * 1000:.2f} ms, p99 {percentile(times, 0.99) * 1000:.2f} ms, "
+              f"{redirects} redirects, {misplaced} members off their ring owner")
+        if misplaced:
+            failures.append(f"{misplaced} members joined a node that does not own their channel")
+
+        # 2: a node joins while every channel is occupied; its channels move over
+        # whole, and latecomers arriving through any node find their team there
+        added = Node(args.server, args.port + args.nodes, directory, args.heartbeat).start()
+        nodes.append(added)
+        if not wait_for_rings(nodes, len(nodes), args.timeout):
+            failures.append("nodes never saw the added node")
+        ring = RingSnapshot(directory.members())
+        moved = [c for c in channels if ring.lookup(c)['port'] == added.port]
+        late = [Member(channel, args.timeout) for channel in channels]
+        times = join_all(late, nodes, rng)
+        members.extend(late)
+        time.sleep(args.settle)  # the old owners rehome on their next listener review
+        followed = sum(member.follow() for member in members)
+        split = split_channels(members)
+        print(f"  after adding node {added.port}: {len(moved)} channels now map to it, "
+              f"{followed} members moved, {len(split)} split, join p99 {percentile(times, 0.99) * 1000:.2f} ms")
+        if split:
+            failures.append(f"channels split across nodes: {', '.join(split[:5])}")
+
+        # 3: a fresh channel on the new ring goes to its new owner
+        fresh = [Member(c + '_fresh', args.timeout) for c in channels]
+        join_all(fresh, nodes, rng)
+        members.extend(fresh)
+        misplaced = sum(1 for m in fresh if ring.lookup(m.channel)['port'] != m.port)
+        if misplaced:
+            failures.append(f"{misplaced} new channels missed their new owner")
+
+        # 4: joins stay fast when the directory stops answering
+        dead = Node(args.server, args.port + len(nodes), DirectoryClient('127.0.0.1', args.dead_port),
+                    args.heartbeat).start()
+        nodes.append(dead)
+        time.sleep(0.2)
+        slowest = max(Member(f"dead_{i}", args.timeout).join(dead.port) for i in range(10))
+        print(f"  unreachable directory: slowest of 10 joins {slowest * 1000:.2f} ms")
+        if slowest > args.max_join:
+            failures.append(f"a join took {slowest * 1000:.0f} ms with the directory down")
+    finally:
+        for member in members:
+            member.close()
+        for node in nodes:
+            node.stop()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Localhost multi-node check of directory routing")
+    parser.add_argument('--server', choices=sorted(SERVERS), default='event')
+    parser.add_argument('--nodes', type=int, default=3)
+    parser.add_argument('--channels', type=int, default=30)
+    parser.add_argument('--members', type=int, default=2, help="members per channel before a node is added")
+    parser.add_argument('--port', type=int, default=47100, help="first node's stream port; nodes count up")
+    parser.add_argument('--dead-port', type=int, default=47099, help="a UDP port where no directory answers")
+    parser.add_argument('--heartbeat', type=float, default=0.2, help="directory heartbeat interval in seconds")
+    parser.add_argument('--timeout', type=float, default=5)
+    parser.add_argument('--settle', type=float, default=1.5,
+                        help="seconds for old owners to redirect the channels they lost")
+    parser.add_argument('--max-join', type=float, default=0.1, help="fail if a join takes longer, in seconds")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    failures = run(args)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,22 @@
+import json
+import socket
+
+
+def request_json(address, message, timeout=0.5, retries=3, service='Service'):
+    """Send message as a JSON datagram to address and return the decoded JSON reply.
+
+    Each try waits `timeout` seconds for the answer before sending again;
+    once `retries` tries have gone unanswered a RuntimeError names the
+    service and its address.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        payload = json.dumps(message).encode()
+        for _ in range(retries):
+            try:
+                sock.sendto(payload, address)
+                data, _ = sock.recvfrom(4096)
+                return json.loads(data.decode())
+            except socket.timeout:
+                continue
+    raise RuntimeError(f"{service} at {address[0]}:{address[1]} did not answer")
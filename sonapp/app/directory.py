@@ -0,0 +1,195 @@
+import bisect
+import hashlib
+import json
+import socket
+import threading
+import time
+
+from datagram import request_json
+
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes.
+
+    Adding or removing a node only moves the keys whose ring positions fall
+    next to that node's virtual points, roughly 1/N of all channels.
+    """
+
+    def __init__(self, replicas=100):
+        self.replicas = replicas
+        self.points = []  # sorted ring positions
+        self.owners = {}  # ring position -> node_id
+        self.nodes = set()
+
+    def add(self, node_id):
+        if node_id in self.nodes:
+            return
+        self.nodes.add(node_id)
+        for i in range(self.replicas):
+            point = ring_hash(f"{node_id}#{i}")
+            self.owners[point] = node_id
+            bisect.insort(self.points, point)
+
+    def remove(self, node_id):
+        if node_id not in self.nodes:
+            return
+        self.nodes.discard(node_id)
+        for i in range(self.replicas):
+            point = ring_hash(f"{node_id}#{i}")
+            if self.owners.get(point) == node_id:
+                del self.owners[point]
+                self.points.pop(bisect.bisect_left(self.points, point))
+
+    def lookup(self, key):
+        if not self.points:
+            return None
+        index = bisect.bisect(self.points, ring_hash(key)) % len(self.points)
+        return self.owners[self.points[index]]
+
+
+class DirectoryService:
+    """Maps channel keys to live server nodes.
+
+    Nodes register with their host and stream port and must re-register
+    (heartbeat) within `ttl` seconds or they drop off the ring. This object
+    is the in-process directory; DirectoryServer exposes it over UDP and
+    DirectoryClient is the matching remote stand-in with the same methods.
+    """
+
+    def __init__(self, ttl=15, replicas=100):
+        self.ttl = ttl
+        self.ring = HashRing(replicas)
+        self.nodes = {}  # node_id -> {'host', 'port', 'seen'}
+        self.lock = threading.Lock()
+
+    def register(self, node_id, host, port):
+        with self.lock:
+            self.nodes[node_id] = {'host': host, 'port': port, 'seen': time.monotonic()}
+            self.ring.add(node_id)
+        return True
+
+    def unregister(self, node_id):
+        with self.lock:
+            self.nodes.pop(node_id, None)
+            self.ring.remove(node_id)
+        return True
+
+    def expire(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            for node_id, node in list(self.nodes.items()):
+                if now - node['seen'] > self.ttl:
+                    del self.nodes[node_id]
+                    self.ring.remove(node_id)
+
+    def lookup(self, channel_key):
+        self.expire()
+        with self.lock:
+            node_id = self.ring.lookup(channel_key)
+            if node_id is None:
+                return None
+            node = self.nodes[node_id]
+            return {'node': node_id, 'host': node['host'], 'port': node['port']}
+
+    def members(self):
+        """Live nodes as {node_id: {'host', 'port'}}, for nodes that route from their own ring"""
+        self.expire()
+        with self.lock:
+            return {node_id: {'host': node['host'], 'port': node['port']} for node_id, node in self.nodes.items()}
+
+
+class RingSnapshot:
+    """A node's local copy of the directory's ring, so routing a join needs no network I/O"""
+
+    def __init__(self, members=None, replicas=100):
+        self.members = members or {}
+        self.ring = HashRing(replicas)
+        for node_id in self.members:
+            self.ring.add(node_id)
+
+    def lookup(self, channel_key):
+        node_id = self.ring.lookup(channel_key)
+        if node_id is None:
+            return None
+        node = self.members[node_id]
+        return {'node': node_id, 'host': node['host'], 'port': node['port']}
+
+
+class DirectoryServer:
+    """Serves a DirectoryService as JSON request/response datagrams"""
+
+    def __init__(self, service=None, host='0.0.0.0', port=65430):
+        self.service = service or DirectoryService()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.running = True
+
+    def handle(self, request):
+        op = request.get('op')
+        if op == 'register':
+            return {'ok': self.service.register(request['node'], request['host'], request['port'])}
+        if op == 'unregister':
+            return {'ok': self.service.unregister(request['node'])}
+        if op == 'lookup':
+            return {'owner': self.service.lookup(request['channel'])}
+        if op == 'members':
+            return {'members': self.service.members()}
+        return {'error': f"unknown op {op!r}"}
+
+    def serve_forever(self):
+        print(f"Directory service running on port {self.sock.getsockname()[1]}")
+        while self.running:
+            try:
+                data, address = self.sock.recvfrom(4096)
+                reply = self.handle(json.loads(data.decode()))
+                self.sock.sendto(json.dumps(reply).encode(), address)
+            except (ValueError, KeyError):
+                continue
+            except OSError:
+                if not self.running:
+                    return
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.sock.close()
+
+
+class DirectoryClient:
+    """Remote directory with the DirectoryService interface"""
+
+    def __init__(self, host, port=65430, timeout=0.5, retries=3):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.retries = retries
+
+    def request(self, message):
+        return request_json(self.address, message, self.timeout, self.retries, 'Directory')
+
+    def register(self, node_id, host, port):
+        return self.request({'op': 'register', 'node': node_id, 'host': host, 'port': port}).get('ok', False)
+
+    def unregister(self, node_id):
+        return self.request({'op': 'unregister', 'node': node_id}).get('ok', False)
+
+    def lookup(self, channel_key):
+        return self.request({'op': 'lookup', 'channel': channel_key}).get('owner')
+
+    def members(self):
+        return self.request({'op': 'members'}).get('members', {})
+
+
+if __name__ == "__main__":
+    server = DirectoryServer()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,143 @@
+import ipaddress
+import json
+import os
+import socket
+import threading
+import time
+
+try:
+    import netifaces
+except ImportError:
+    netifaces = None
+
+GLOBAL_BROADCAST = '255.255.255.255'
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.sonapp', 'servers.json')
+
+
+def broadcast_addresses():
+    """Directed broadcast address of every IPv4 interface, plus the global broadcast.
+
+    The global broadcast only leaves through the default route's interface,
+    so a machine on several networks needs each subnet's own address too.
+    Without netifaces only the default route's interface is known, and its
+    subnet is taken to be a /24.
+    """
+    addresses = []
+    if netifaces is not None:
+        for interface in netifaces.interfaces():
+            for addr in netifaces.ifaddresses(interface).get(netifaces.AF_INET, []):
+                if addr.get('addr', '').startswith('127.'):
+                    continue
+                broadcast = addr.get('broadcast')
+                if broadcast is None and addr.get('netmask'):
+                    network = ipaddress.IPv4Network(f"{addr['addr']}/{addr['netmask']}", strict=False)
+                    broadcast = str(network.broadcast_address)
+                if broadcast and broadcast not in addresses:
+                    addresses.append(broadcast)
+    else:
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                s.connect(('8.8.8.8', 80))  # picks the outgoing interface; nothing is sent
+                ip = s.getsockname()[0]
+            if not ip.startswith('127.'):
+                addresses.append(str(ipaddress.IPv4Network(f"{ip}/24", strict=False).broadcast_address))
+        except OSError:
+            pass
+    addresses.append(GLOBAL_BROADCAST)
+    return addresses
+
+
+def discover(port, request, timeout=3.0, resend=0.1, addresses=None):
+    """Broadcast a discovery request on every interface at once; first valid reply wins.
+
+    Requests go out to all addresses together and are repeated with
+    backoff, starting at `resend` seconds, until a server answers with its
+    host and port or `timeout` runs out. Returns (host, port).
+    """
+    addresses = broadcast_addresses() if addresses is None else addresses
+    payload = json.dumps(request).encode()
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        deadline = time.monotonic() + timeout
+        next_send, interval = 0.0, resend
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                raise RuntimeError("Could not find audio server")
+            if now >= next_send:
+                for address in addresses:
+                    try:
+                        sock.sendto(payload, (address, port))
+                    except OSError:
+                        pass  # interface down or no route; the others may still answer
+                next_send, interval = now + interval, min(interval * 2, 1.0)
+            sock.settimeout(min(next_send, deadline) - now)
+            try:
+                data, _ = sock.recvfrom(1024)
+                info = json.loads(data.decode())
+                return info['host'], int(info['port'])
+            except socket.timeout:
+                continue
+            except (ValueError, KeyError, TypeError):
+                continue  # not a discovery reply
+
+
+class ServerSearch:
+    """Discovery running on a background thread while the caller tries something faster"""
+
+    def __init__(self, port, request, timeout=3.0):
+        self.port = port
+        self.request = request
+        self.timeout = timeout
+        self.done = threading.Event()
+        self.address = None
+        self.error = None
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def run(self):
+        try:
+            self.address = discover(self.port, self.request, self.timeout)
+        except Exception as e:
+            self.error = e
+        self.done.set()
+
+    def result(self):
+        """Block until discovery finishes; returns (host, port) or raises its error"""
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.address
+
+
+class ServerCache:
+    """Last server that accepted each channel, kept on disk across launches"""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+
+    def load(self, channel_key):
+        try:
+            with open(self.path) as f:
+                host, port = json.load(f)[channel_key]
+            return host, int(port)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, channel_key, host, port):
+        try:
+            with open(self.path) as f:
+                servers = json.load(f)
+        except (OSError, ValueError):
+            servers = {}
+        if not isinstance(servers, dict):
+            servers = {}
+        servers[channel_key] = [host, port]
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump(servers, f)
+        except OSError as e:
+            print(f"Could not save server cache: {e}")
@@ -0,0 +1,230 @@
+import selectors
+import socket
+
+import framing
+from jitter_buffer import JitterBuffer
+from metrics import family
+from test_server_central import CentralAudioServer
+
+
+class EventLoopAudioServer(CentralAudioServer):
+    """Single-threaded CentralAudioServer engine built on selectors.
+
+    Every client socket is non-blocking and multiplexed on one loop, so a
+    process holds thousands of connections without a thread per client.
+    Channel and discovery behavior is inherited unchanged.
+    """
+
+    MEDIA = 'media'
+    JITTER_BUFFER = JitterBuffer  # frames are read and mixed on the one loop thread
+
+    def __init__(self, buffer_size=1024, discovery_port=65431, sample_rate=48000, directory=None,
+                 metrics_port=9464, stream_port=65432):
+        super().__init__(buffer_size, discovery_port, sample_rate, directory, metrics_port, stream_port)
+        self.selector = selectors.DefaultSelector()
+        self.pending = {}  # socket -> connection state until the join frame is read
+
+    def accept_clients(self):
+        while True:
+            try:
+                sock, addr = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            self.add_connection(sock, addr)
+
+    def add_connection(self, sock, addr, initial=b''):
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.SEND_BUFFER)
+        conn = {'address': addr, 'reader': framing.FrameReader(sock), 'client_id': None}
+        self.pending[sock] = conn
+        self.selector.register(sock, selectors.EVENT_READ, conn)
+        if initial:
+            conn['reader'].prime(initial)
+            self.process_frames(sock, conn)
+
+    def read_frames(self, sock, conn):
+        reader = conn['reader']
+        try:
+            received = reader.fill()
+        except (BlockingIOError, InterruptedError):
+            return
+        if not received:
+            if conn['client_id'] is None:
+                self.drop_pending(sock)
+            else:
+                self.remove_client(conn['client_id'])
+            return
+        self.process_frames(sock, conn)
+
+    def process_frames(self, sock, conn):
+        for frame in conn['reader'].frames():
+            if conn['client_id'] is None:
+                self.join(sock, conn, frame)
+                if conn['client_id'] is None:
+                    return
+            else:
+                self.handle_frame(conn['client_id'], frame)
+
+    def join(self, sock, conn, frame):
+        del self.pending[sock]
+        try:
+            self.admit(sock, conn, frame)
+        except Exception as e:
+            # One bad join must not stop the loop every other client shares
+            print(f"Rejected join from {conn['address']}: {e!r}")
+            self.abandon(sock)
+
+    def abandon(self, sock):
+        """Close a connection whose join failed, wherever in joining it got to"""
+        self.discard_client(id(sock))
+        try:
+            self.selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        sock.close()
+
+    def admit(self, sock, conn, frame):
+        info = self.parse_join(frame)
+        if info is None or self.redirect(sock, conn, info):
+            self.selector.unregister(sock)
+            sock.close()
+            return
+
+        conn['client_id'], _ = self.join_client(sock, conn['address'], info)
+
+    def redirect(self, sock, conn, info):
+        owner = self.route(info['channel'])
+        if owner is None:
+            return False
+        print(f"[>] {conn['address']} redirected to {owner['host']}:{owner['port']} for {info['channel']}")
+        try:
+            sock.send(self.redirect_frame(info['channel'], owner))
+        except OSError:
+            pass
+        return True
+
+    def read_datagrams(self):
+        while True:
+            try:
+                size, address = self.media_socket.recvfrom_into(self.media_buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue  # e.g. ICMP port unreachable surfaced on Windows
+            self.handle_datagram(size, address)
+
+    def drop_pending(self, sock):
+        self.pending.pop(sock, None)
+        self.selector.unregister(sock)
+        sock.close()
+
+    def send_mix(self, client_data, payload):
+        queue = client_data['send_queue']
+        if queue:
+            if not queue.put(payload):
+                self.send_drops.inc()  # listener is not draining; their oldest mix went
+            return
+        # Nothing queued: send from the caller's buffer and queue only if the socket refused some
+        try:
+            sent = client_data['socket'].send(payload)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError as e:
+            print(f"Send error {client_data['address']}: {e}")
+            self.remove_client(client_data['id'])
+            return
+        if sent < len(payload):
+            queue.put(payload, sent)
+            self.watch_writes(client_data)
+
+    def collect_metrics(self, detail=True):
+        families = super().collect_metrics(detail)
+        queued = sum(client_data['send_queue'].bytes for client_data in list(self.clients.values()))
+        families.append(family('sonapp_send_queue_bytes', "Bytes waiting in client send queues", 'gauge',
+                               [({}, queued)]))
+        return families
+
+    def flush(self, client_data):
+        client_data['send_queue'].write_to(client_data['socket'])
+        self.watch_writes(client_data)
+
+    def watch_writes(self, client_data):
+        """Poll the socket for writability only while output is queued"""
+        sock = client_data['socket']
+        events = selectors.EVENT_READ | selectors.EVENT_WRITE if client_data['send_queue'] else selectors.EVENT_READ
+        key = self.selector.get_key(sock)
+        if key.events != events:
+            self.selector.modify(sock, events, key.data)
+
+    def remove_client(self, client_id):
+        client_data = self.clients.get(client_id)
+        if client_data is not None:
+            try:
+                self.selector.unregister(client_data['socket'])
+            except (KeyError, ValueError):
+                pass
+        super().remove_client(client_id)
+
+    def handle_event(self, sock, conn, mask):
+        client_id = conn['client_id']
+        try:
+            if mask & selectors.EVENT_WRITE and client_id is not None:
+                self.flush(self.clients[client_id])
+            if mask & selectors.EVENT_READ:
+                self.read_frames(sock, conn)
+        except (OSError, ValueError, framing.ProtocolError) as e:
+            print(f"Client error {conn['address']}: {e}")
+            client_id = conn['client_id']
+            if client_id is None:
+                self.drop_pending(sock)
+            else:
+                self.remove_client(client_id)
+
+    def dispatch(self, key, mask):
+        if key.data is None:
+            self.accept_clients()
+        elif key.data is self.MEDIA:
+            self.read_datagrams()
+        else:
+            self.handle_event(key.fileobj, key.data, mask)
+
+    def register_media(self):
+        self.bind_media()
+        self.media_socket.setblocking(False)
+        self.selector.register(self.media_socket, selectors.EVENT_READ, self.MEDIA)
+
+    def start(self):
+        self.start_services()
+        self.server_socket.bind((self.host, self.stream_port))
+        self.server_socket.listen(socket.SOMAXCONN)
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ, None)
+        self.register_media()
+        print(f"Event loop server started on {self.host}:{self.stream_port}")
+        self.run_loop()
+
+    def run_loop(self):
+        self.clock.start()
+        while self.running:
+            for key, mask in self.selector.select(timeout=self.clock.time_until_tick()):
+                self.dispatch(key, mask)
+            if self.clock.due():
+                self.clock.tick()
+                self.mix_tick()
+
+    def stop(self):
+        for client_id in list(self.clients):
+            self.remove_client(client_id)
+        for sock in list(self.pending):
+            self.drop_pending(sock)
+        super().stop()
+        self.selector.close()
+
+
+if __name__ == "__main__":
+    server = EventLoopAudioServer()
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,49 @@
+import threading
+
+import numpy as np
+
+
+class FrameRing:
+    """Bounded FIFO of audio frames in one preallocated (capacity, frame_size) array.
+
+    A replacement for deque(maxlen=capacity) of frame bytes: put() has
+    store(payload, row) write the frame straight into its row (a codec's
+    decode_into, say) and pop() hands rows back, so steady-state traffic
+    allocates nothing. When full, put() overwrites the oldest frame like a
+    bounded deque. A popped row stays valid until `capacity` more puts.
+    """
+
+    def __init__(self, capacity, frame_size, dtype=np.float32):
+        self.capacity = capacity
+        self.frames = np.zeros((capacity, frame_size), dtype=dtype)
+        self.rows = list(self.frames)
+        self.head = 0  # index of the oldest frame
+        self.count = 0
+        self.overwritten = 0
+        self.lock = threading.Lock()  # other clients' threads pop while the owner pushes
+
+    def __len__(self):
+        return self.count
+
+    def put(self, store, payload):
+        """Write one frame with store(payload, row), dropping the oldest when full"""
+        with self.lock:
+            full = self.count == self.capacity
+            row = self.rows[self.head if full else (self.head + self.count) % self.capacity]
+            store(payload, row)
+            if full:
+                self.head = (self.head + 1) % self.capacity
+                self.overwritten += 1
+            else:
+                self.count += 1
+            return row
+
+    def pop(self):
+        """Oldest frame's row, or None when empty"""
+        with self.lock:
+            if not self.count:
+                return None
+            row = self.rows[self.head]
+            self.head = (self.head + 1) % self.capacity
+            self.count -= 1
+            return row
@@ -0,0 +1,146 @@
+import json
+import struct
+import time
+
+# type, flags, payload length, sequence number, timestamp (microseconds mod 2**32)
+HEADER = struct.Struct('!BBHII')
+MAX_PAYLOAD = 0xFFFF
+# Media datagrams prefix one frame with the session token from the join ack
+TOKEN = struct.Struct('!I')
+MAX_DATAGRAM = TOKEN.size + HEADER.size + MAX_PAYLOAD
+
+JOIN = 1
+AUDIO = 2
+CONTROL = 3
+KEEPALIVE = 4
+SILENCE = 5  # sender stopped talking; empty payload, consumes a sequence number
+
+TYPE_NAMES = {JOIN: 'join', AUDIO: 'audio', CONTROL: 'control', KEEPALIVE: 'keepalive', SILENCE: 'silence'}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def timestamp_us():
+    return int(time.perf_counter() * 1_000_000) & 0xFFFFFFFF
+
+
+def pack_frame(msg_type, payload=b'', seq=0, flags=0, timestamp=None):
+    if len(payload) > MAX_PAYLOAD:
+        raise ProtocolError(f"Payload too large: {len(payload)} bytes")
+    if timestamp is None:
+        timestamp = timestamp_us()
+    return HEADER.pack(msg_type, flags, len(payload), seq & 0xFFFFFFFF, timestamp) + payload
+
+
+def pack_header_into(buffer, offset, msg_type, length, seq=0, flags=0, timestamp=None):
+    """Write the header for a payload already placed after it; returns the frame size"""
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f"Payload too large: {length} bytes")
+    if timestamp is None:
+        timestamp = timestamp_us()
+    HEADER.pack_into(buffer, offset, msg_type, flags, length, seq & 0xFFFFFFFF, timestamp)
+    return HEADER.size + length
+
+
+def pack_json(msg_type, message, seq=0):
+    return pack_frame(msg_type, json.dumps(message).encode(), seq)
+
+
+class Frame:
+    __slots__ = ('type', 'flags', 'seq', 'timestamp', 'payload')
+
+    def __init__(self, msg_type, flags, seq, timestamp, payload):
+        self.type = msg_type
+        self.flags = flags
+        self.seq = seq
+        self.timestamp = timestamp
+        self.payload = payload
+
+    def json(self):
+        return json.loads(bytes(self.payload).decode())
+
+
+def pack_datagram(token, frame):
+    return TOKEN.pack(token) + frame
+
+
+def parse_datagram(view, size):
+    """Split a received datagram into (token, Frame); payload aliases view"""
+    if size < TOKEN.size + HEADER.size:
+        raise ProtocolError(f"Short datagram: {size} bytes")
+    (token,) = TOKEN.unpack_from(view)
+    msg_type, flags, length, seq, timestamp = HEADER.unpack_from(view, TOKEN.size)
+    body = TOKEN.size + HEADER.size
+    if body + length != size:
+        raise ProtocolError(f"Datagram length mismatch: {size} bytes for {length} byte payload")
+    return token, Frame(msg_type, flags, seq, timestamp, view[body:size])
+
+
+class FrameReader:
+    """Reassembles frames from a stream socket.
+
+    Data is received with recv_into a single reusable buffer, so TCP
+    segmentation never splits or merges frames. A frame's payload is a
+    memoryview into that buffer and is only valid until the next fill().
+    Works with blocking and non-blocking sockets.
+    """
+
+    def __init__(self, sock, max_payload=MAX_PAYLOAD):
+        self.sock = sock
+        self.buffer = bytearray(2 * (HEADER.size + max_payload))
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def prime(self, data):
+        """Load bytes already read from the stream, e.g. by another process"""
+        pending = self.end - self.start
+        self.view[:pending] = self.view[self.start:self.end]
+        self.view[pending:pending + len(data)] = data
+        self.start, self.end = 0, pending + len(data)
+
+    def pending(self):
+        """Buffered bytes not yet returned as frames"""
+        return bytes(self.view[self.start:self.end])
+
+    def fill(self):
+        """Receive into the free tail of the buffer; returns 0 on EOF"""
+        if self.end == len(self.buffer):
+            pending = self.end - self.start
+            self.view[:pending] = self.view[self.start:self.end]
+            self.start, self.end = 0, pending
+        received = self.sock.recv_into(self.view[self.end:])
+        self.end += received
+        return received
+
+    def next_frame(self):
+        """Return the next complete buffered frame, or None"""
+        available = self.end - self.start
+        if available < HEADER.size:
+            return None
+        msg_type, flags, length, seq, timestamp = HEADER.unpack_from(self.buffer, self.start)
+        if available < HEADER.size + length:
+            return None
+        body = self.start + HEADER.size
+        self.start = body + length
+        if self.start == self.end:
+            self.start = self.end = 0
+        return Frame(msg_type, flags, seq, timestamp, self.view[body:body + length])
+
+    def frames(self):
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return
+            yield frame
+
+    def read_frame(self):
+        """Block until a full frame is available; returns None on EOF"""
+        while True:
+            frame = self.next_frame()
+            if frame is not None:
+                return frame
+            if not self.fill():
+                return None
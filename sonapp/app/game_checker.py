@@ -1,8 +1,11 @@
-import requests
 import json
+import os
+
+from presence import PresenceClient
+from riot_client import get_client
 
 # Riot API Details
-RIOT_API_KEY = "YOUR_RIOT_API_KEY"  # Replace with your Riot API key
+RIOT_API_KEY = os.getenv('RIOT_API_KEY')
 REGION = "na1"  # Set your Riot region
 
 def get_game_state(summoner_id):
@@ -15,29 +18,28 @@ def get_game_state(summoner_id):
     Returns:
         dict: Game information if in a game, None otherwise.
     """
-    url = f"https://{REGION}.api.riotgames.com/lol/spectator/v4/active-games/by-summoner/{summoner_id}"
-    headers = {"X-Riot-Token": RIOT_API_KEY}
-
     try:
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            return response.json()  # Returns game data if in a game
-        elif response.status_code == 404:
+        # Shared with riot_api: one pool, one cache and one rate limit per key and region
+        status, data = get_client(REGION, RIOT_API_KEY).active_game(summoner_id)
+        if status == 200:
+            return data  # Returns game data if in a game
+        elif status == 404:
             return None  # Summoner is not currently in a game
         else:
-            print(f"Error fetching game state: {response.status_code}")
+            print(f"Error fetching game state: {status}")
             return None
     except Exception as e:
         print(f"Error in get_game_state: {e}")
         return None
 
-def get_team_members_with_app(game_data, app_users):
+def get_team_members_with_app(game_data, presence, summoner_id):
     """
     Identify which teammates are also running the app based on the current game data.
     
     Args:
         game_data (dict): JSON data of the current game from Riot's API.
-        app_users (list): List of players known to have the app running.
+        presence: PresenceService or PresenceClient of the central server.
+        summoner_id (str): Riot summoner ID of the player whose team to report.
     
     Returns:
         list: List of summoner names of team members with the app.
@@ -45,37 +47,32 @@ def get_team_members_with_app(game_data, app_users):
     if not game_data:
         return []
 
-    summoner_names_with_app = []
+    # One pass builds the query and finds the user's team; the server answers
+    # with a lookup per participant instead of us shipping or scanning user lists
+    names = {}
+    query = []
+    user_team_id = None
     for participant in game_data['participants']:
-        summoner_name = participant['summonerName']
-        team_id = participant['teamId']
+        puuid = participant.get('puuid')  # the one id the app and the Riot API share
+        if participant.get('summonerId') == summoner_id:
+            user_team_id = participant['teamId']
+        if puuid:
+            names[puuid] = participant['summonerName']
+            query.append((puuid, participant['teamId']))
 
-        # Check if this summoner is running the app
-        if summoner_name in app_users:
-            summoner_names_with_app.append({
-                "summonerName": summoner_name,
-                "teamId": team_id
-            })
-
-    # Filter by the user’s team only
-    user_team_id = next(
-        (participant['teamId'] for participant in game_data['participants'] if participant['summonerName'] in app_users),
-        None
-    )
-    if user_team_id:
-        return [member for member in summoner_names_with_app if member["teamId"] == user_team_id]
-    return []
+    if user_team_id is None:
+        return []
+    return [{"summonerName": names[user_id], "teamId": team_id}
+            for user_id, team_id in presence.online(query) if team_id == user_team_id]
 
-def fetch_app_users():
+def presence_client():
     """
-    Mock function or placeholder for fetching a list of users who have the app running.
+    Presence service of the central server, which tracks the players running the app.
     
     Returns:
-        list: List of summoner names of players running the app.
+        PresenceClient: Remote presence service at VC_SERVER_HOST.
     """
-    # This would likely query a central server or use a peer-to-peer discovery mechanism
-    # For now, we return a static list for testing
-    return ["Summoner1", "Summoner2", "Summoner3"]
+    return PresenceClient(os.getenv('VC_SERVER_HOST', '127.0.0.1'), int(os.getenv('VC_DISCOVERY_PORT', 65431)))
 
 # Example usage
 if __name__ == "__main__":
@@ -84,8 +81,7 @@ if __name__ == "__main__":
     game_data = get_game_state(test_summoner_id)
 
     if game_data:
-        app_users = fetch_app_users()  # List of app users, normally fetched dynamically
-        teammates_with_app = get_team_members_with_app(game_data, app_users)
+        teammates_with_app = get_team_members_with_app(game_data, presence_client(), test_summoner_id)
         print("Teammates with the app running:", teammates_with_app)
     else:
         print("User is not currently in a game.")
@@ -1,15 +1,25 @@
 import tkinter as tk
 import threading
-import subprocess
 import socket
 import sounddevice as sd
 import numpy as np
 
+import ptt_manager
+from audio_handler import AudioClient
+from transmit_gate import OPEN, PUSH_TO_TALK, TOGGLE, TransmitGate
+
 # Server configuration
 HOST = '127.0.0.1'
 PORT = 65432
 BUFFER_SIZE = 4096  # Match the buffer size used in server.py
 
+# Talk modes offered in the GUI; the hotkey is ptt_manager's default
+MODE_LABELS = {
+    OPEN: "Open mic",
+    PUSH_TO_TALK: "Push to talk (Ctrl)",
+    TOGGLE: "Toggle talk (Ctrl)",
+}
+
 clients = []
 
 def handle_client(conn):
@@ -83,11 +93,17 @@ class AudioApp:
         self.mute_button = tk.Button(master, text="Mute", command=self.mute_audio, state=tk.DISABLED)
         self.mute_button.pack(pady=20)
 
+        self.mode = tk.StringVar(master, value=MODE_LABELS[OPEN])
+        self.mode_menu = tk.OptionMenu(master, self.mode, *MODE_LABELS.values())
+        self.mode_menu.pack(pady=20)
+
         self.status_label = tk.Label(master, text="Server not started.")
         self.status_label.pack(pady=20)
 
         self.muted = False
-        self.audio_handler_process = None
+        self.client = None
+        self.remove_keys = []  # undo the hotkeys installed for the running client
+        self.mute_poll = None
 
     def start_server(self):
         """Starts the audio server and updates the GUI."""
@@ -106,19 +122,35 @@ class AudioApp:
         self.connect_button.config(state=tk.NORMAL)
 
     def connect_to_audio_handler(self):
-        """Runs audio_handler.py in a separate process."""
+        """Runs the audio client on a background thread so its gate can be driven from here."""
         self.connect_button.config(state=tk.DISABLED)
         self.disconnect_button.config(state=tk.NORMAL)
         self.mute_button.config(state=tk.NORMAL)
-
-        # Start audio_handler.py
-        self.audio_handler_process = subprocess.Popen(['python', 'audio_handler.py'])
+        self.mode_menu.config(state=tk.DISABLED)
+
+        mode = next(mode for mode, label in MODE_LABELS.items() if label == self.mode.get())
+        gate = TransmitGate(mode)
+        gate.set_muted(self.muted)
+        self.client = AudioClient(gate=gate)
+        try:
+            # Ctrl drives push-to-talk or toggle, Ctrl+M mutes in every mode
+            self.remove_keys = [ptt_manager.setup_ptt_key(gate), ptt_manager.setup_mute_key(gate)]
+        except ImportError as e:
+            # keyboard needs root on Linux; the Mute button still works
+            print(f"Hotkeys unavailable: {e}")
+        threading.Thread(target=self.client.run, daemon=True).start()
+        self.follow_mute_key()
 
     def disconnect(self):
         """Disconnects from the audio handler and cleans up."""
-        if self.audio_handler_process:
-            self.audio_handler_process.terminate()  # Stop the audio handler
-            self.audio_handler_process = None
+        if self.client:
+            for remove in self.remove_keys:
+                remove()
+            self.remove_keys = []
+            self.master.after_cancel(self.mute_poll)
+            self.client.stop()  # Stop the audio handler
+            self.client = None
+            self.mode_menu.config(state=tk.NORMAL)
             self.status_label.config(text="Disconnected from audio handler.")
             self.connect_button.config(state=tk.NORMAL)
             self.disconnect_button.config(state=tk.DISABLED)
@@ -127,12 +159,25 @@ class AudioApp:
     def mute_audio(self):
         """Mutes/unmutes the audio input."""
         self.muted = not self.muted
+        if self.client:
+            # Gated in the capture path, and the server drops us from the mix straight away
+            self.client.gate.set_muted(self.muted)
+        self.show_mute()
+
+    def follow_mute_key(self):
+        """Keeps the Mute button in step with the Ctrl+M hotkey while connected."""
+        if self.client is None:
+            return
+        if self.client.gate.muted != self.muted:
+            self.muted = self.client.gate.muted
+            self.show_mute()
+        self.mute_poll = self.master.after(200, self.follow_mute_key)
+
+    def show_mute(self):
         if self.muted:
-            sd.default.device = (1, None)  # Mute the input
             self.mute_button.config(text="Unmute")
             self.status_label.config(text="Microphone is muted.")
         else:
-            sd.default.device = (0, None)  # Reset to default input device
             self.mute_button.config(text="Mute")
             self.status_label.config(text="Microphone is unmuted.")
 
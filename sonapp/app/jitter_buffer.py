@@ -0,0 +1,207 @@
+import math
+import threading
+
+import numpy as np
+
+import framing
+
+SEQ_MOD = 1 << 32
+SEQ_HALF = 1 << 31
+
+# Payload queued for a silence marker frame; pop() returns it once when the
+# talk spurt ends, then reports idle (not underruns) until audio resumes.
+SILENCE = object()
+
+
+def seq_diff(a, b):
+    """Signed distance from sequence number b to a, modulo 2**32"""
+    return (a - b + SEQ_HALF) % SEQ_MOD - SEQ_HALF
+
+
+class JitterBuffer:
+    """Per-client playout buffer keyed by sequence number.
+
+    Frames are reordered by sequence, duplicates and frames that arrive after
+    their playout slot are discarded, and interarrival jitter is tracked
+    RFC 3550 style from the sender timestamps. The target depth follows the
+    measured jitter: it grows when arrivals get noisy and shrinks back on a
+    clean link, dropping a frame when the buffer runs well above target so
+    standing latency does not accumulate.
+
+    Given frame_size and store, accepted payloads are decoded by
+    store(payload, row) straight into one preallocated (capacity, frame_size)
+    ring, row seq % capacity, and pop() returns that row. Every buffered
+    sequence lies within capacity of next_seq, so rows never collide, and a
+    row stays valid until a frame `capacity` sequence numbers later arrives.
+
+    The target depth keeps `headroom` times the measured jitter queued, and
+    a frame is skipped once `max_excess` frames pile up beyond it. A
+    consumer that conceals losses and time-stretches, like PlayoutSmoother,
+    can run with less headroom and leave the excess for it to drain.
+    """
+
+    JITTER_GAIN = 1 / 16
+
+    def __init__(self, frame_period, min_depth=1, max_depth=8, capacity=32, frame_size=None, store=None,
+                 headroom=2.0, max_excess=2):
+        self.frame_period = frame_period
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.headroom = headroom
+        self.max_excess = max_excess
+        self.capacity = capacity
+        self.slots = {}
+        self.store = store
+        self.ring = None if frame_size is None else np.zeros((capacity, frame_size), dtype=np.float32)
+        self.rows = [] if self.ring is None else list(self.ring)
+        self.next_seq = None
+        self.highest_seq = None
+        self.target_depth = min_depth
+        self.buffering = True
+        self.idle = False
+
+        self.jitter = 0.0
+        self.last_transit = None
+
+        self.received = 0
+        self.played = 0
+        self.late = 0
+        self.lost = 0
+        self.duplicated = 0
+        self.dropped = 0
+        self.underruns = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def depth(self):
+        if self.next_seq is None or self.highest_seq is None:
+            return 0
+        return max(0, seq_diff(self.highest_seq, self.next_seq) + 1)
+
+    def put(self, seq, timestamp, payload, arrival=None):
+        arrival = framing.timestamp_us() if arrival is None else arrival
+        self.received += 1
+        if self.next_seq is None:
+            self.next_seq = seq
+            self.highest_seq = seq
+
+        distance = seq_diff(seq, self.next_seq)
+        if distance < 0:
+            self.late += 1
+            return False
+        if seq in self.slots:
+            self.duplicated += 1
+            return False
+        if distance >= self.capacity:
+            # Sender restarted or we fell far behind: resynchronize on this frame.
+            self.dropped += len(self.slots)
+            self.slots.clear()
+            self.next_seq = self.highest_seq = seq
+            self.buffering = True
+
+        if self.ring is not None and payload is not SILENCE:
+            row = self.rows[seq % self.capacity]
+            self.store(payload, row)
+            payload = row
+        self.slots[seq] = payload
+        if payload is not SILENCE:
+            self.idle = False
+        if seq_diff(seq, self.highest_seq) > 0:
+            self.highest_seq = seq
+        self.update_jitter(timestamp, arrival)
+        return True
+
+    def update_jitter(self, timestamp, arrival):
+        transit = (arrival - timestamp) % SEQ_MOD
+        if self.last_transit is not None:
+            d = abs(seq_diff(transit, self.last_transit)) / 1_000_000
+            self.jitter += (d - self.jitter) * self.JITTER_GAIN
+        self.last_transit = transit
+
+        wanted = 1 + math.ceil(self.headroom * self.jitter / self.frame_period)
+        self.target_depth = min(self.max_depth, max(self.min_depth, wanted))
+
+    def skip(self):
+        if self.slots.pop(self.next_seq, None) is not None:
+            self.dropped += 1
+        else:
+            self.lost += 1
+        self.next_seq = (self.next_seq + 1) % SEQ_MOD
+
+    def pop(self):
+        """Return the payload due for this tick, or None to play a gap"""
+        if self.next_seq is None or self.idle:
+            return None
+        depth = self.depth()
+        if self.buffering:
+            if depth < self.target_depth:
+                return None
+            self.buffering = False
+        if not self.slots:
+            self.underruns += 1
+            self.buffering = True
+            return None
+
+        if depth > self.target_depth + self.max_excess:
+            self.skip()
+
+        payload = self.slots.pop(self.next_seq, None)
+        if payload is None:
+            self.lost += 1
+        elif payload is SILENCE:
+            if not self.slots:
+                self.idle = True
+                self.buffering = True
+        else:
+            self.played += 1
+        self.next_seq = (self.next_seq + 1) % SEQ_MOD
+        return payload
+
+    def reset(self):
+        """Discard everything queued and wait for a fresh stream; counters are kept"""
+        self.dropped += len(self.slots)
+        self.slots.clear()
+        self.next_seq = self.highest_seq = None
+        self.buffering = True
+        self.idle = False
+
+    def stats(self):
+        return {
+            'depth': self.depth(),
+            'target_depth': self.target_depth,
+            'jitter_ms': self.jitter * 1000,
+            'received': self.received,
+            'played': self.played,
+            'late': self.late,
+            'lost': self.lost,
+            'duplicated': self.duplicated,
+            'dropped': self.dropped,
+            'underruns': self.underruns,
+        }
+
+
+class LockedJitterBuffer(JitterBuffer):
+    """JitterBuffer for a client whose frames arrive on one thread and are mixed on another.
+
+    put(), pop() and reset() take one lock, so a frame read by a client or
+    media thread cannot interleave with the mix loop's pop and corrupt the
+    slots or sequence state. The single-threaded event loop server keeps
+    the plain JitterBuffer.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+
+    def put(self, seq, timestamp, payload, arrival=None):
+        with self.lock:
+            return super().put(seq, timestamp, payload, arrival)
+
+    def pop(self):
+        with self.lock:
+            return super().pop()
+
+    def reset(self):
+        with self.lock:
+            super().reset()
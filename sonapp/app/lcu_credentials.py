@@ -0,0 +1,118 @@
+import base64
+import os
+import re
+
+import psutil
+
+CLIENT_PROCESSES = ('LeagueClientUx.exe', 'LeagueClient.exe', 'RiotClientUx.exe', 'RiotClientServices.exe',
+                    'LeagueClientUx', 'LeagueClient')
+# Where the client writes its lockfile when nothing tells us better
+LOCKFILE_DIRS = (
+    os.getenv('LEAGUE_PATH', ''),
+    r'C:\Riot Games\League of Legends',
+    '/Applications/League of Legends.app/Contents/LoL',
+)
+PORT_ARG = re.compile(r'--app-port=(\d+)')
+TOKEN_ARG = re.compile(r'--remoting-auth-token=([^\s"]+)')
+
+
+class LcuCredentials:
+    """Port and token of a running League client, and the process they belong to"""
+
+    def __init__(self, port, token, process, source):
+        self.port = str(port)
+        self.token = token
+        self.process = process
+        self.source = source  # 'lockfile' or the name of the process whose command line held them
+        auth = base64.b64encode(f"riot:{token}".encode()).decode()
+        self.headers = {'Authorization': f'Basic {auth}', 'Content-Type': 'application/json'}
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+
+def parse_lockfile(path):
+    """(pid, port, token) from a lockfile's name:pid:port:password:protocol, or None"""
+    try:
+        with open(path) as f:
+            fields = f.read().strip().split(':')
+        return int(fields[1]), fields[2], fields[3]
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class LcuCredentialCache:
+    """Finds LCU credentials once and then only checks that their process is alive.
+
+    A lookup while the cached process is still running costs one
+    is_running() check, which also compares the creation time so a reused
+    PID is not mistaken for the client. When it has gone, the lockfile is
+    tried first: it is one small read, and its directory is learned from
+    the first process found by a scan. Only when that fails too are the
+    processes walked, by name alone, with the command line fetched and
+    matched just for client processes.
+    """
+
+    def __init__(self, lockfile_dirs=LOCKFILE_DIRS):
+        self.lockfile_dirs = [d for d in lockfile_dirs if d]
+        self.credentials = None
+        self.scans = 0
+
+    def get(self):
+        """Current credentials, or None while no client is running"""
+        if self.credentials is not None and self.alive(self.credentials.process):
+            return self.credentials
+        self.credentials = self.from_lockfile() or self.from_processes()
+        return self.credentials
+
+    def invalidate(self):
+        """Forget the cached credentials, e.g. after the client rejected them"""
+        self.credentials = None
+
+    @staticmethod
+    def alive(process):
+        try:
+            return process.is_running() and process.status() != psutil.STATUS_ZOMBIE
+        except psutil.Error:
+            return False
+
+    def from_lockfile(self):
+        for directory in self.lockfile_dirs:
+            entry = parse_lockfile(os.path.join(directory, 'lockfile'))
+            if entry is None:
+                continue
+            pid, port, token = entry
+            try:
+                process = psutil.Process(pid)
+                if process.name() not in CLIENT_PROCESSES:
+                    continue  # stale lockfile whose PID has since been reused
+            except psutil.Error:
+                continue  # stale lockfile left by a client that crashed
+            return LcuCredentials(port, token, process, 'lockfile')
+        return None
+
+    def from_processes(self):
+        self.scans += 1
+        for proc in psutil.process_iter(['name']):
+            if proc.info['name'] not in CLIENT_PROCESSES:
+                continue
+            try:
+                cmdline = ' '.join(proc.cmdline())
+            except psutil.Error:
+                continue
+            port = PORT_ARG.search(cmdline)
+            token = TOKEN_ARG.search(cmdline)
+            if port and token:
+                if proc.info['name'].startswith('LeagueClient'):
+                    self.learn_install_dir(proc)  # the Riot Client's own lockfile is for a different API
+                return LcuCredentials(port.group(1), token.group(1), proc, proc.info['name'])
+        return None
+
+    def learn_install_dir(self, proc):
+        try:
+            directory = os.path.dirname(proc.exe())
+        except psutil.Error:
+            return
+        if directory and directory not in self.lockfile_dirs:
+            self.lockfile_dirs.insert(0, directory)
@@ -0,0 +1,245 @@
+import argparse
+import base64
+import hashlib
+import json
+import os
+import shutil
+import socket
+import ssl
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import psutil
+
+os.environ.setdefault('VC_SERVER_HOST', '127.0.0.1')
+os.environ.setdefault('VC_SERVER_PORT', '1')  # voice joins are recorded, never dialled
+import testserver  # reads the environment above when imported
+from lcu_credentials import LcuCredentials
+from lcu_events import EVENT, topic
+
+TOKEN = 'standin-token'
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+SUMMONER = {'displayName': 'StandIn', 'summonerLevel': 30, 'summonerId': 7, 'puuid': 'standin-puuid'}
+GAME = {'gameId': 99, 'participants': [{'summonerName': 'StandIn', 'teamId': 100}]}
+
+
+def self_signed_cert(directory):
+    """Write a throwaway localhost certificate with openssl; returns (cert, key) paths"""
+    if shutil.which('openssl') is None:
+        raise RuntimeError("openssl not found; pass --cert and --key")
+    cert, key = os.path.join(directory, 'lcu.crt'), os.path.join(directory, 'lcu.key')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=127.0.0.1', '-keyout', key, '-out', cert],
+                   check=True, capture_output=True)
+    return cert, key
+
+
+class StandInLcu:
+    """A League client's HTTPS REST API and WAMP WebSocket on localhost.
+
+    Serves the endpoints in `state` with the client's basic auth, keeps
+    connections alive like the real client, and pushes events to every
+    subscribed WebSocket. Counts TLS handshakes and REST requests so the
+    monitor's connection reuse shows up in the report.
+    """
+
+    def __init__(self, cert, key):
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(cert, key)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+        self.auth = 'Basic ' + base64.b64encode(f"riot:{TOKEN}".encode()).decode()
+        self.state = {'/lol-summoner/v1/current-summoner': SUMMONER, testserver.GAMEFLOW: {'phase': 'Lobby'}}
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.handshakes = 0
+        self.requests = 0
+
+    def start(self):
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+        return self
+
+    def accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+                conn = self.context.wrap_socket(conn, server_side=True)
+            except (ssl.SSLError, OSError):
+                continue
+            with self.lock:
+                self.handshakes += 1
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def serve(self, conn):
+        try:
+            while True:
+                request = b''
+                while b'\r\n\r\n' not in request:
+                    data = conn.recv(4096)
+                    if not data:
+                        return
+                    request += data
+                lines = request.decode().split('\r\n')
+                path = lines[0].split()[1]
+                headers = {k.lower(): v.strip() for k, _, v in (line.partition(':') for line in lines[1:] if line)}
+                if headers.get('authorization') != self.auth:
+                    conn.sendall(b"HTTP/1.1 401 Unauthorized\r\nContent-Length: 0\r\n\r\n")
+                    continue
+                if headers.get('upgrade', '').lower() == 'websocket':
+                    self.upgrade(conn, headers['sec-websocket-key'])
+                    return
+                with self.lock:
+                    self.requests += 1
+                    body = self.state.get(path)
+                data = json.dumps(body).encode() if body is not None else b'{}'
+                status = '200 OK' if body is not None else '404 Not Found'
+                conn.sendall(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+        except (ssl.SSLError, OSError, IndexError, KeyError):
+            return
+        finally:
+            conn.close()
+
+    def upgrade(self, conn, key):
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        conn.sendall(f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode())
+        with self.lock:
+            self.subscribers.append(conn)
+        while conn.recv(4096):
+            pass  # subscriptions; every subscriber gets every event
+        with self.lock:
+            self.subscribers.remove(conn)
+
+    def push(self, uri, event_type, data):
+        """Change an endpoint and send its event the way the client does; returns the send time"""
+        message = json.dumps([EVENT, topic(uri), {'uri': uri, 'eventType': event_type, 'data': data}]).encode()
+        if len(message) < 126:
+            header = struct.pack('>BB', 0x81, len(message))
+        elif len(message) < 1 << 16:
+            header = struct.pack('>BBH', 0x81, 126, len(message))
+        else:
+            header = struct.pack('>BBQ', 0x81, 127, len(message))
+        with self.lock:
+            self.state[uri] = None if event_type == 'Delete' else data
+            subscribers = list(self.subscribers)
+        sent = time.perf_counter()
+        for conn in subscribers:
+            try:
+                conn.sendall(header + message)
+            except OSError:
+                pass
+        return sent
+
+    def stop(self):
+        self.sock.close()
+
+
+class StandInCredentials:
+    """Credential cache that always finds the stand-in, owned by this process"""
+
+    def __init__(self, port):
+        self.credentials = LcuCredentials(port, TOKEN, psutil.Process(), 'stand-in')
+
+    def get(self):
+        return self.credentials
+
+    def invalidate(self):
+        pass
+
+
+def wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def run(args):
+    tempdir = None
+    if args.cert:
+        cert, key = args.cert, args.key
+    else:
+        tempdir = tempfile.mkdtemp()
+        cert, key = self_signed_cert(tempdir)
+    lcu = StandInLcu(cert, key).start()
+    monitor = testserver.LoLClientMonitor()
+    monitor.credentials = StandInCredentials(lcu.port)
+    if args.mode == 'poll':
+        monitor.events_retry_at = float('inf')
+    voice = []  # (time, channel or None for a leave)
+    monitor.join_voice_channel = lambda channel: voice.append((time.perf_counter(), channel))
+    monitor.leave_voice_channel = lambda: voice.append((time.perf_counter(), None))
+    threading.Thread(target=monitor.monitor, daemon=True).start()
+
+    failures = []
+    results = []
+    try:
+        ready = (lambda: lcu.subscribers) if args.mode == 'events' else (lambda: monitor.current_summoner)
+        if not wait_for(ready, args.timeout):
+            return [f"the monitor never {'subscribed' if args.mode == 'events' else 'connected'}"], results, lcu
+        time.sleep(0.2)  # let the catch-up lookups after subscribing finish
+        steps = [
+            ('champ select', testserver.CHAMP_SELECT, 'Create', {'myTeam': [{'summonerId': 7, 'cellId': 2}]},
+             'champselect_team100_StandIn'),
+            ('champ select ends', testserver.CHAMP_SELECT, 'Delete', None, None),
+            ('game starts', testserver.GAMEFLOW, 'Update', {'phase': 'InProgress'}, 'game_99_team100'),
+            ('game ends', testserver.GAMEFLOW, 'Update', {'phase': 'EndOfGame'}, None),
+        ]
+        lcu.state['/lol-spectator/v1/current-game'] = GAME
+        for _ in range(args.rounds):
+            for name, uri, event_type, data, expected in steps:
+                seen = len(voice)
+                sent = lcu.push(uri, event_type, data)
+                if not wait_for(lambda: len(voice) > seen, args.timeout):
+                    failures.append(f"{name}: no voice {'join' if expected else 'leave'} within {args.timeout} s")
+                    continue
+                at, channel = voice[seen]
+                if channel != expected:
+                    failures.append(f"{name}: expected {expected or 'a leave'}, got {channel or 'a leave'}")
+                results.append((name, at - sent))
+                time.sleep(args.gap)
+    finally:
+        lcu.stop()
+        if tempdir:
+            shutil.rmtree(tempdir, ignore_errors=True)
+    return failures, results, lcu
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the client monitor against a stand-in League client")
+    parser.add_argument('--mode', choices=['events', 'poll'], default='events',
+                        help="follow the WebSocket, or keep it closed to measure REST polling")
+    parser.add_argument('--cert', help="PEM certificate for the stand-in; a throwaway one is made with openssl")
+    parser.add_argument('--key', help="PEM key for --cert")
+    parser.add_argument('--rounds', type=int, default=3, help="champ select and game cycles to run")
+    parser.add_argument('--gap', type=float, default=0.1, help="seconds between state changes")
+    parser.add_argument('--timeout', type=float, default=5)
+    parser.add_argument('--max-latency-ms', type=float, help="fail if a join or leave takes longer")
+    parser.add_argument('--max-handshakes', type=int, help="fail if the monitor opens more TLS connections")
+    args = parser.parse_args()
+    if bool(args.cert) != bool(args.key):
+        parser.error("--cert and --key go together")
+
+    failures, results, lcu = run(args)
+    for name in dict.fromkeys(name for name, _ in results):
+        latencies = sorted(latency * 1000 for n, latency in results if n == name)
+        print(f"{name:>18}: median {latencies[len(latencies) // 2]:.2f} ms, worst {latencies[-1]:.2f} ms")
+    print(f"{lcu.handshakes} TLS handshakes, {lcu.requests} REST requests")
+    worst = max((latency for _, latency in results), default=0.0) * 1000
+    if args.max_latency_ms is not None and worst > args.max_latency_ms:
+        failures.append(f"slowest reaction {worst:.0f} ms is over {args.max_latency_ms:.0f} ms")
+    if args.max_handshakes is not None and lcu.handshakes > args.max_handshakes:
+        failures.append(f"{lcu.handshakes} TLS handshakes, expected at most {args.max_handshakes}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
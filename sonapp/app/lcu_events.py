@@ -0,0 +1,77 @@
+import json
+import ssl
+
+try:
+    import websocket  # websocket-client
+except ImportError:
+    websocket = None
+
+# WAMP 1.0 opcodes the LCU speaks on its WebSocket
+SUBSCRIBE = 5
+EVENT = 8
+
+
+def topic(uri):
+    """Event topic of an LCU endpoint: /lol-gameflow/v1/session -> OnJsonApiEvent_lol-gameflow_v1_session"""
+    return 'OnJsonApiEvent' + uri.replace('/', '_')
+
+
+class LcuEventStream:
+    """Pushes LCU JSON API events for a few endpoints to a callback.
+
+    Opens the client's WebSocket with the same basic auth as its REST API,
+    subscribes to each uri's topic and calls on_event(uri, event_type,
+    data) from the calling thread as events arrive, where event_type is
+    'Create', 'Update' or 'Delete'. run() returns once the client closes
+    the socket, which is how a client exit or restart shows up, or once
+    close() is called. Needs the optional websocket-client package;
+    available() says whether it is installed.
+    """
+
+    CONNECT_TIMEOUT = 3.0
+
+    def __init__(self, port, headers, uris, on_event, host='127.0.0.1'):
+        self.url = f"wss://{host}:{port}/"
+        self.headers = [f"Authorization: {headers['Authorization']}"]
+        self.uris = list(uris)
+        self.on_event = on_event
+        self.ws = None
+
+    @staticmethod
+    def available():
+        return websocket is not None
+
+    def connect(self):
+        # The client serves a self-signed certificate on localhost
+        self.ws = websocket.create_connection(self.url, header=self.headers, timeout=self.CONNECT_TIMEOUT,
+                                              sslopt={'cert_reqs': ssl.CERT_NONE, 'check_hostname': False})
+        for uri in self.uris:
+            self.ws.send(json.dumps([SUBSCRIBE, topic(uri)]))
+        self.ws.settimeout(None)
+
+    def run(self):
+        """Dispatch events until the connection closes"""
+        wanted = {topic(uri): uri for uri in self.uris}
+        try:
+            while True:
+                message = self.ws.recv()
+                if not message:
+                    return
+                try:
+                    opcode, name, event = json.loads(message)
+                except (ValueError, TypeError):
+                    continue  # the empty acknowledgement of a subscribe, or something we do not use
+                if opcode != EVENT or name not in wanted or not isinstance(event, dict):
+                    continue
+                self.on_event(wanted[name], event.get('eventType'), event.get('data'))
+        except (websocket.WebSocketException, OSError):
+            return
+        finally:
+            self.close()
+
+    def close(self):
+        if self.ws is not None:
+            try:
+                self.ws.close()
+            except (websocket.WebSocketException, OSError):
+                pass
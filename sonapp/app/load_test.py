@@ -0,0 +1,674 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import selectors
+import signal
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+import psutil
+
+import framing
+from audio_codecs import create_codec
+from mix_clock import MixClock
+
+# Channel sizes making up one lobby of each layout
+LAYOUTS = {
+    'champ-select': [5],  # one team's lobby
+    'in-game': [5, 5],  # both teams of a match, each on its own channel
+    'all-chat': [10],  # a whole match on one channel
+}
+
+SERVERS = {
+    'central': ('test_server_central', 'CentralAudioServer'),
+    'event': ('event_server', 'EventLoopAudioServer'),
+    'sharded': ('sharded_server', 'ShardedAudioServer'),
+    'plain': ('server', 'AudioServer'),
+}
+
+# Latency probes: speaker slot s writes a reference sample at 2s and its
+# sequence number (mod SEQ_WINDOW) scaled by that reference at 2s + 1. Only
+# one speaker writes each slot, so the ratio survives summing, normalization
+# and lossless or 16-bit encoding.
+PROBE_SLOTS = 32
+PROBE_SAMPLES = 2 * PROBE_SLOTS
+PROBE_REF = 0.5
+SEQ_WINDOW = 256
+
+MEAN_TALK_SPURT = 1.5  # seconds
+SPEECH_BANK_FRAMES = 64
+MAX_BACKLOG_FRAMES = 8
+KEEPALIVE_INTERVAL = 5
+
+
+def build_layout(layout, lobbies, plain=False):
+    """Return one (channel, slot, peers) spec per client.
+
+    peers maps a probe slot back to the global index of the speaker that
+    owns it. The plain AudioServer has no channels, so every client shares
+    one room there and only the first PROBE_SLOTS clients carry probes.
+    """
+    channels = []
+    for lobby in range(lobbies):
+        for team, size in enumerate(LAYOUTS[layout]):
+            channels.append((f"load-{lobby}-{team}", size))
+    if plain:
+        channels = [('room', sum(size for _, size in channels))]
+
+    specs = []
+    for channel, size in channels:
+        peers = list(range(len(specs), len(specs) + min(size, PROBE_SLOTS)))
+        for slot in range(size):
+            specs.append({'index': len(specs), 'channel': channel, 'slot': slot,
+                          'members': size, 'peers': peers})
+    return specs
+
+
+def speech_bank(buffer_size, sample_rate, frames=SPEECH_BANK_FRAMES, seed=0):
+    """Voiced, syllable-rate modulated harmonics around -20 dBFS, probe region left clear"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(frames * buffer_size) / sample_rate
+    f0 = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voice = sum(np.sin(h * phase) / h for h in range(1, 7))
+    envelope = np.sqrt(np.abs(np.sin(2 * np.pi * 4 * t)))
+    signal_ = voice * envelope + rng.normal(0, 0.05, t.size)
+    signal_ *= 0.1 / np.sqrt(np.mean(signal_ ** 2))
+    bank = signal_.astype(np.float32).reshape(frames, buffer_size)
+    bank[:, :PROBE_SAMPLES] = 0
+    return bank
+
+
+def probe_frame(slot, seq):
+    probe = np.zeros(PROBE_SAMPLES, dtype=np.float32)
+    if slot < PROBE_SLOTS:
+        probe[2 * slot] = PROBE_REF
+        probe[2 * slot + 1] = PROBE_REF * (seq % SEQ_WINDOW) / SEQ_WINDOW
+    return probe
+
+
+def read_probes(samples):
+    """Return (slots, seqs) of every probe present in a received mix"""
+    ref = samples[0:PROBE_SAMPLES:2]
+    data = samples[1:PROBE_SAMPLES:2]
+    slots = np.flatnonzero(ref > 1e-3)
+    ratio = data[slots] / ref[slots] * SEQ_WINDOW
+    seqs = np.rint(ratio)
+    valid = np.abs(ratio - seqs) < 0.25
+    return slots[valid], seqs[valid].astype(np.int64) % SEQ_WINDOW
+
+
+class SimulatedClient:
+    """One headless voice client speaking the framed join protocol.
+
+    Talk spurts and pauses are exponentially distributed around the
+    configured talk ratio. Talking frames carry speech-like audio plus a
+    latency probe; silence is suppressed when the server's ack allows it
+    and sent as zero frames otherwise, like AudioClient.
+    """
+
+    def __init__(self, spec, config, rng):
+        self.index = spec['index']
+        self.channel = spec['channel']
+        self.slot = spec['slot']
+        self.peers = spec['peers']
+        self.config = config
+        self.rng = rng
+        self.sock = None
+        self.reader = None
+        self.media_sock = None
+        self.media_token = None
+        self.codec = None
+        self.suppress_silence = False
+        self.closed = False
+        self.outbuf = bytearray()
+        self.last_media_send = 0
+
+        self.tx_seq = 0
+        self.rx_seq = None
+        self.bank_pos = int(rng.integers(SPEECH_BANK_FRAMES))
+        ratio = config['talk_ratio']
+        self.talking = rng.random() < ratio
+        self.was_talking = False
+        self.frames_left = self.spurt_frames()
+
+        self.latencies = []
+        self.sent = 0
+        self.received = 0
+        self.lost = 0
+        self.stalled = 0
+
+    def spurt_frames(self):
+        ratio = self.config['talk_ratio']
+        if ratio <= 0 or ratio >= 1:
+            return float('inf')
+        mean = MEAN_TALK_SPURT if self.talking else MEAN_TALK_SPURT * (1 - ratio) / ratio
+        return max(1, round(self.rng.exponential(mean) / self.config['period']))
+
+    def join(self, host, port):
+        sock = socket.create_connection((host, port), timeout=self.config['join_timeout'])
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        self.reader = framing.FrameReader(sock)
+        request = {'channel': self.channel, 'codecs': [self.config['codec']]}
+        if self.config['transport'] == 'udp':
+            request['transport'] = 'udp'
+        sock.sendall(framing.pack_json(framing.JOIN, request))
+
+        while True:
+            frame = self.reader.read_frame()
+            if frame is None:
+                raise ConnectionError("server closed the connection during join")
+            if frame.type != framing.CONTROL:
+                continue
+            ack = frame.json()
+            if ack.get('op') == 'redirect':
+                raise ConnectionError(f"redirected to {ack['host']}:{ack['port']}")
+            if ack.get('op') == 'joined':
+                break
+
+        self.codec = create_codec(ack.get('codec', 'f32'))
+        self.suppress_silence = ack.get('silence_suppression', False)
+        if ack.get('transport') == 'udp':
+            self.media_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.media_sock.connect((host, ack['udp_port']))
+            self.media_sock.setblocking(False)
+            self.media_token = ack['token']
+            self.send(framing.pack_frame(framing.KEEPALIVE), time.perf_counter())
+        sock.setblocking(False)
+
+    def tick(self, worker, now, measuring):
+        if self.closed:
+            return
+        self.frames_left -= 1
+        if self.frames_left <= 0:
+            self.talking = not self.talking
+            self.frames_left = self.spurt_frames()
+
+        if self.talking:
+            self.tx_seq += 1
+            tail = worker.bank_payloads(self.codec)[self.bank_pos]
+            self.bank_pos = (self.bank_pos + 1) % SPEECH_BANK_FRAMES
+            payload = self.codec.encode(probe_frame(self.slot, self.tx_seq)) + tail
+            worker.send_times[self.index * SEQ_WINDOW + self.tx_seq % SEQ_WINDOW] = now
+            if measuring and self.slot < PROBE_SLOTS:
+                self.sent += 1
+            self.send(framing.pack_frame(framing.AUDIO, payload, self.tx_seq), now)
+        elif self.suppress_silence:
+            if self.was_talking:
+                self.tx_seq += 1
+                self.send(framing.pack_frame(framing.SILENCE, b'', self.tx_seq), now)
+        else:
+            self.tx_seq += 1
+            self.send(framing.pack_frame(framing.AUDIO, worker.silent_payload(self.codec), self.tx_seq), now)
+        self.was_talking = self.talking
+
+        if self.media_sock is not None and now - self.last_media_send > KEEPALIVE_INTERVAL:
+            self.send(framing.pack_frame(framing.KEEPALIVE), now)
+
+    def send(self, frame, now):
+        if self.media_sock is not None and self.media_token is not None:
+            try:
+                self.media_sock.send(framing.pack_datagram(self.media_token, frame))
+            except OSError:
+                pass
+            self.last_media_send = now
+            return
+        if len(self.outbuf) > MAX_BACKLOG_FRAMES * len(frame):
+            self.stalled += 1  # server is not reading; drop like a real sender would
+            return
+        self.outbuf += frame
+        self.flush()
+
+    def flush(self):
+        if not self.outbuf or self.closed:
+            return
+        try:
+            sent = self.sock.send(self.outbuf)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.closed = True
+            return
+        del self.outbuf[:sent]
+
+    def read_stream(self, worker, now, measuring):
+        while True:
+            frame = self.reader.next_frame()
+            if frame is None:
+                try:
+                    if not self.reader.fill():
+                        self.closed = True
+                        return
+                except BlockingIOError:
+                    return
+                except OSError:
+                    self.closed = True
+                    return
+                continue
+            if frame.type == framing.AUDIO:
+                self.on_audio(worker, frame, now, measuring)
+
+    def read_media(self, worker, now, measuring):
+        while True:
+            try:
+                size = self.media_sock.recv_into(worker.media_buffer)
+            except OSError:
+                return
+            try:
+                token, frame = framing.parse_datagram(worker.media_view, size)
+            except framing.ProtocolError:
+                continue
+            if token == self.media_token and frame.type == framing.AUDIO:
+                self.on_audio(worker, frame, now, measuring)
+
+    def on_audio(self, worker, frame, now, measuring):
+        if self.rx_seq is not None and measuring:
+            self.lost += max(0, frame.seq - self.rx_seq - 1)
+        self.rx_seq = frame.seq
+        if measuring:
+            self.received += 1
+
+        prefix = self.codec.decode(frame.payload[:int(PROBE_SAMPLES * self.codec.bytes_per_sample)])
+        slots, seqs = read_probes(prefix)
+        for slot, seq in zip(slots, seqs):
+            if slot >= len(self.peers) or self.peers[slot] == self.index:
+                continue
+            speaker = self.peers[slot]
+            sent_at = worker.send_times[speaker * SEQ_WINDOW + seq]
+            latency = now - sent_at
+            if sent_at < worker.measure_from or not 0 <= latency < worker.stale_after:
+                continue
+            self.latencies.append(latency * 1000)
+            worker.delivered[speaker] += 1
+
+    def close(self):
+        for sock in (self.sock, self.media_sock):
+            if sock is not None:
+                sock.close()
+
+    def summary(self):
+        result = {'index': self.index, 'channel': self.channel, 'sent': self.sent,
+                  'received': self.received, 'lost': self.lost, 'stalled': self.stalled,
+                  'probes': len(self.latencies)}
+        if self.latencies:
+            p50, p95, p99 = np.percentile(self.latencies, [50, 95, 99])
+            result.update(p50_ms=p50, p95_ms=p95, p99_ms=p99, max_ms=max(self.latencies))
+        return result
+
+
+class LoadWorker:
+    """Drives a slice of the simulated clients from one selector loop.
+
+    Sends are paced by the same MixClock the servers use, so a generator
+    that cannot keep up shows as missed ticks instead of silently sending
+    late. Send timestamps live in shared memory so a probe can be matched
+    to its speaker even when the speaker runs in another worker process.
+    """
+
+    def __init__(self, specs, config, send_times, total_clients):
+        self.specs = specs
+        self.config = config
+        self.send_times = np.frombuffer(send_times, dtype=np.float64)
+        self.delivered = np.zeros(total_clients, dtype=np.int64)
+        self.clients = []
+        self.failed = []
+        self.selector = selectors.DefaultSelector()
+        self.clock = MixClock(config['buffer_size'], config['sample_rate'])
+        self.bank = speech_bank(config['buffer_size'], config['sample_rate'])
+        self.bank_cache = {}
+        self.silent_cache = {}
+        self.media_buffer = bytearray(framing.MAX_DATAGRAM)
+        self.media_view = memoryview(self.media_buffer)
+        self.measure_from = float('inf')
+        self.stale_after = SEQ_WINDOW * config['period'] / 2
+
+    def bank_payloads(self, codec):
+        payloads = self.bank_cache.get(codec.name)
+        if payloads is None:
+            payloads = self.bank_cache[codec.name] = [codec.encode(frame[PROBE_SAMPLES:]) for frame in self.bank]
+        return payloads
+
+    def silent_payload(self, codec):
+        payload = self.silent_cache.get(codec.name)
+        if payload is None:
+            payload = self.silent_cache[codec.name] = codec.encode(np.zeros(self.config['buffer_size'], dtype=np.float32))
+        return payload
+
+    def connect(self):
+        host, port = self.config['host'], self.config['port']
+        for spec in self.specs:
+            client = SimulatedClient(spec, self.config, np.random.default_rng(spec['index']))
+            try:
+                client.join(host, port)
+            except (OSError, ValueError, framing.ProtocolError) as e:
+                self.failed.append({'index': spec['index'], 'error': str(e)})
+                client.close()
+                continue
+            self.clients.append(client)
+            self.selector.register(client.sock, selectors.EVENT_READ, (client, False))
+            if client.media_sock is not None:
+                self.selector.register(client.media_sock, selectors.EVENT_READ, (client, True))
+
+    def run(self):
+        start = time.perf_counter()
+        self.measure_from = start + self.config['warmup']
+        stop_sending = self.measure_from + self.config['duration']
+        stop = stop_sending + self.config['drain']
+        self.clock.start(start)
+
+        while True:
+            now = time.perf_counter()
+            if now >= stop:
+                break
+            timeout = self.clock.time_until_tick(now) if now < stop_sending else stop - now
+            for key, _ in self.selector.select(timeout):
+                client, media = key.data
+                now = time.perf_counter()
+                measuring = now >= self.measure_from
+                if media:
+                    client.read_media(self, now, measuring)
+                else:
+                    client.read_stream(self, now, measuring)
+                if client.closed:
+                    self.selector.unregister(key.fileobj)
+
+            now = time.perf_counter()
+            if now < stop_sending and self.clock.due(now):
+                self.clock.tick(now)
+                measuring = now >= self.measure_from
+                for client in self.clients:
+                    client.flush()
+                    client.tick(self, now, measuring)
+
+        for client in self.clients:
+            client.close()
+
+    def results(self):
+        return {
+            'clients': [client.summary() for client in self.clients],
+            'failed': self.failed,
+            'delivered': self.delivered.tolist(),
+            'clock': self.clock.stats(),
+            'disconnected': sum(client.closed for client in self.clients),
+        }
+
+
+def run_worker(specs, config, send_times, total_clients, barrier, results):
+    worker = LoadWorker(specs, config, send_times, total_clients)
+    worker.connect()
+    try:
+        barrier.wait(config['join_timeout'] * max(1, len(specs)))
+    except threading.BrokenBarrierError:
+        pass
+    worker.run()
+    results.put(worker.results())
+
+
+def serve(kind, port, buffer_size, shards, metrics_port, verbose):
+    """Run one of the repo's servers on localhost for the duration of a test"""
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    module_name, class_name = SERVERS[kind]
+    server_class = getattr(importlib.import_module(module_name), class_name)
+    options = {'buffer_size': buffer_size, 'discovery_port': 0, 'metrics_port': metrics_port}
+    if kind == 'sharded':
+        options['shards'] = shards
+    server = server_class(**options)
+    server.host = '127.0.0.1'
+    server.stream_port = port
+    try:
+        server.start()
+    finally:
+        server.running = False
+
+
+def wait_for_port(host, port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server at {host}:{port} did not come up within {timeout} s")
+
+
+class ResourceSampler:
+    """Samples CPU and RSS of a process tree (e.g. the sharded server and its workers)"""
+
+    def __init__(self, pid):
+        self.root = psutil.Process(pid)
+        self.tracked = {}
+        self.cpu = []
+        self.rss = []
+
+    def sample(self, record=True):
+        try:
+            processes = [self.root] + self.root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return
+        cpu, rss = 0.0, 0
+        for process in processes:
+            tracked = self.tracked.setdefault(process.pid, process)
+            try:
+                cpu += tracked.cpu_percent(None)
+                rss += tracked.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        if record:
+            self.cpu.append(cpu)
+            self.rss.append(rss)
+
+    def summary(self):
+        if not self.cpu:
+            return None
+        return {'cpu_mean_pct': float(np.mean(self.cpu)), 'cpu_max_pct': float(np.max(self.cpu)),
+                'rss_max_mb': max(self.rss) / 2 ** 20}
+
+
+def summarize(specs, outcomes, server_usage, generator_usage, config):
+    clients = [c for outcome in outcomes for c in outcome['clients']]
+    failed = [f for outcome in outcomes for f in outcome['failed']]
+    delivered = np.sum([outcome['delivered'] for outcome in outcomes], axis=0)
+
+    latencies = [c for c in clients if 'p99_ms' in c]
+    received = sum(c['received'] for c in clients)
+    lost = sum(c['lost'] for c in clients)
+    expected = sum(c['sent'] * (specs[c['index']]['members'] - 1) for c in clients)
+
+    report = {
+        'config': {k: v for k, v in config.items() if k != 'period'},
+        'clients': len(specs),
+        'channels': len({spec['channel'] for spec in specs}),
+        'joined': len(clients),
+        'join_failures': failed[:10],
+        'disconnected': sum(outcome['disconnected'] for outcome in outcomes),
+        'mix_frames_received': received,
+        'mix_frames_lost': lost,
+        'frame_loss': lost / (received + lost) if received + lost else 0.0,
+        'probe_delivery': float(delivered.sum()) / expected if expected else None,
+        'send_stalls': sum(c['stalled'] for c in clients),
+        'generator_missed_ticks': sum(outcome['clock']['missed'] for outcome in outcomes),
+        'server': server_usage,
+        'generator': generator_usage,
+    }
+    if latencies:
+        p99s = np.array([c['p99_ms'] for c in latencies])
+        worst = latencies[int(np.argmax(p99s))]
+        report['latency_ms'] = {
+            'client_p50_median': float(np.median([c['p50_ms'] for c in latencies])),
+            'client_p95_median': float(np.median([c['p95_ms'] for c in latencies])),
+            'client_p99_median': float(np.median(p99s)),
+            'client_p99_worst': float(p99s.max()),
+            'worst_client': {'index': worst['index'], 'channel': worst['channel']},
+            'max': float(max(c['max_ms'] for c in latencies)),
+        }
+    return report
+
+
+def print_report(report):
+    config = report['config']
+    print(f"\n=== Load test: {config['server']} server, {config['layout']} x {config['lobbies']} "
+          f"({report['clients']} clients, {report['channels']} channels) ===")
+    print(f"talk ratio {config['talk_ratio']:.2f} | codec {config['codec']} | {config['transport']} | "
+          f"{config['duration']:.0f} s measured after {config['warmup']:.0f} s warmup")
+    print("-" * 60)
+    print(f"Joined:             {report['joined']}/{report['clients']} "
+          f"({report['disconnected']} disconnected during the run)")
+    for failure in report['join_failures']:
+        print(f"  client {failure['index']}: {failure['error']}")
+    latency = report.get('latency_ms')
+    if latency:
+        print(f"Latency p50/p95/p99: {latency['client_p50_median']:.1f} / {latency['client_p95_median']:.1f} / "
+              f"{latency['client_p99_median']:.1f} ms (median over clients)")
+        print(f"Worst client p99:   {latency['client_p99_worst']:.1f} ms "
+              f"(client {latency['worst_client']['index']}, {latency['worst_client']['channel']}), "
+              f"max {latency['max']:.1f} ms")
+    else:
+        print("Latency:            no probes received")
+    print(f"Mix frames:         {report['mix_frames_received']} received, {report['mix_frames_lost']} lost "
+          f"({report['frame_loss']:.2%})")
+    if report['probe_delivery'] is not None:
+        print(f"Probe delivery:     {report['probe_delivery']:.2%} of speaker frames reached each listener")
+    for name in ('server', 'generator'):
+        usage = report[name]
+        if usage:
+            print(f"{name.capitalize() + ':':<20}CPU {usage['cpu_mean_pct']:.0f}% mean / "
+                  f"{usage['cpu_max_pct']:.0f}% max, RSS {usage['rss_max_mb']:.0f} MB")
+    if report['generator_missed_ticks'] or report['send_stalls']:
+        print(f"Warning: generator missed {report['generator_missed_ticks']} ticks and stalled "
+              f"{report['send_stalls']} sends; results understate the server")
+
+
+def check_gates(report, max_p99_ms=None, max_loss=None, min_delivery=None):
+    failures = []
+    if report['joined'] < report['clients']:
+        failures.append(f"{report['clients'] - report['joined']} clients failed to join")
+    latency = report.get('latency_ms')
+    if max_p99_ms is not None and (latency is None or latency['client_p99_median'] > max_p99_ms):
+        failures.append(f"p99 latency above {max_p99_ms} ms")
+    if max_loss is not None and report['frame_loss'] > max_loss:
+        failures.append(f"frame loss above {max_loss:.2%}")
+    if min_delivery is not None and (report['probe_delivery'] or 0) < min_delivery:
+        failures.append(f"probe delivery below {min_delivery:.2%}")
+    return failures
+
+
+def run(args):
+    plain = args.server == 'plain'
+    specs = build_layout(args.layout, args.lobbies, plain)
+    config = {
+        'server': args.server, 'layout': args.layout, 'lobbies': args.lobbies,
+        'host': args.host, 'port': args.port, 'codec': args.codec, 'transport': args.transport,
+        'talk_ratio': args.talk_ratio, 'duration': args.duration, 'warmup': args.warmup,
+        'drain': 0.5, 'buffer_size': args.buffer_size, 'sample_rate': 48000,
+        'join_timeout': 5.0, 'period': args.buffer_size / 48000,
+    }
+
+    server_process = None
+    server_pid = args.server_pid
+    if args.connect is None:
+        server_process = multiprocessing.Process(
+            target=serve, args=(args.server, args.port, args.buffer_size, args.shards, args.metrics_port,
+                                 args.verbose))
+        server_process.start()
+        server_pid = server_process.pid
+        wait_for_port(args.host, args.port)
+
+    procs = max(1, min(args.procs, len(specs)))
+    send_times = multiprocessing.RawArray('d', len(specs) * SEQ_WINDOW)
+    barrier = multiprocessing.Barrier(procs + 1)
+    results = multiprocessing.Queue()
+    workers = []
+    for i in range(procs):
+        process = multiprocessing.Process(
+            target=run_worker, args=(specs[i::procs], config, send_times, len(specs), barrier, results),
+            daemon=True)
+        process.start()
+        workers.append(process)
+
+    try:
+        print(f"Connecting {len(specs)} clients from {procs} process(es)...")
+        try:
+            barrier.wait(config['join_timeout'] * len(specs))
+        except threading.BrokenBarrierError:
+            pass
+
+        server_sampler = ResourceSampler(server_pid) if server_pid else None
+        generator_samplers = [ResourceSampler(process.pid) for process in workers]
+        started = time.monotonic()
+        while time.monotonic() - started < args.warmup + args.duration:
+            time.sleep(1)
+            measuring = time.monotonic() - started >= args.warmup
+            for sampler in [server_sampler] + generator_samplers:
+                if sampler is not None:
+                    sampler.sample(measuring)
+
+        outcomes = [results.get(timeout=config['join_timeout'] + 30) for _ in workers]
+    finally:
+        for process in workers:
+            process.join(timeout=5)
+        if server_process is not None:
+            server_process.terminate()
+            server_process.join(timeout=5)
+            if server_process.is_alive():
+                server_process.kill()
+
+    generator = [s.summary() for s in generator_samplers if s.summary()]
+    generator_usage = None
+    if generator:
+        generator_usage = {'cpu_mean_pct': sum(g['cpu_mean_pct'] for g in generator),
+                           'cpu_max_pct': sum(g['cpu_max_pct'] for g in generator),
+                           'rss_max_mb': sum(g['rss_max_mb'] for g in generator)}
+    report = summarize(specs, outcomes, server_sampler.summary() if server_sampler else None,
+                       generator_usage, config)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless load test for the voice servers")
+    parser.add_argument('--server', choices=sorted(SERVERS), default='event',
+                        help="server to spawn on localhost; with --connect, the protocol it speaks")
+    parser.add_argument('--connect', metavar='HOST:PORT', help="test an already running server instead")
+    parser.add_argument('--server-pid', type=int, help="pid of the --connect server for CPU/memory sampling")
+    parser.add_argument('--shards', type=int, default=None)
+    parser.add_argument('--layout', choices=sorted(LAYOUTS), default='in-game')
+    parser.add_argument('--lobbies', type=int, default=10)
+    parser.add_argument('--talk-ratio', type=float, default=0.3)
+    parser.add_argument('--codec', choices=['f32', 'pcm16'], default='pcm16',
+                        help="latency probes need a sample-exact codec")
+    parser.add_argument('--transport', choices=['tcp', 'udp'], default='tcp')
+    parser.add_argument('--buffer-size', type=int, default=1024)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--procs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--port', type=int, default=46432)
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="expose the spawned server's metrics endpoint on this port")
+    parser.add_argument('--json', metavar='PATH', help="also write the report as JSON")
+    parser.add_argument('--max-p99-ms', type=float, help="fail if median client p99 latency exceeds this")
+    parser.add_argument('--max-loss', type=float, help="fail if mix frame loss exceeds this fraction")
+    parser.add_argument('--min-delivery', type=float, help="fail if probe delivery falls below this fraction")
+    parser.add_argument('--verbose', action='store_true', help="show the spawned server's output")
+    args = parser.parse_args()
+    args.host = '127.0.0.1'
+    if args.connect:
+        args.host, port = args.connect.rsplit(':', 1)
+        args.port = int(port)
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    failures = check_gates(report, args.max_p99_ms, args.max_loss, args.min_delivery)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,220 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Mix tick durations from 50 us to one 21 ms period and beyond
+MIX_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.05)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{escape_label(v)}"' for k, v in labels.items()) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count.
+
+    Updates are plain increments with no lock: the event loop and shard
+    workers touch them from one thread, and a rare lost increment between
+    client threads is cheaper than locking the hot path.
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name, labels):
+        return [(name, labels, self.value)]
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is one bisect and two increments"""
+
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + [float('inf')], self.counts):
+            cumulative += count
+            samples.append((name + '_bucket', dict(labels, le=format_value(bound)), cumulative))
+        samples.append((name + '_sum', labels, self.sum))
+        samples.append((name + '_count', labels, cumulative))
+        return samples
+
+
+class MetricFamily:
+    """A named metric and its children, one per label value combination"""
+
+    def __init__(self, name, help_text, kind, labelnames, factory):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.children = {}
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self.factory()
+        return child
+
+    def collect(self):
+        samples = []
+        for values, child in list(self.children.items()):
+            samples.extend(child.samples(self.name, dict(zip(self.labelnames, values))))
+        return (self.name, self.help, self.kind, samples)
+
+
+def family(name, help_text, kind, values):
+    """Family tuple for scrape-time values given as [(labels, value)]"""
+    return (name, help_text, kind, [(name, labels, value) for labels, value in values])
+
+
+class MetricsRegistry:
+    """Hot-path counters and histograms plus collectors evaluated at scrape.
+
+    Server state that already exists (clients, channels, jitter buffers, the
+    mix clock) is read by collectors only when the endpoint is scraped, so
+    the mixer pays nothing for it. Families are plain tuples of
+    (name, help, type, [(sample name, labels, value)]) and survive a JSON
+    round trip, which is how shard workers ship theirs to the front.
+    """
+
+    def __init__(self):
+        self.static = []
+        self.collectors = []
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = MetricFamily(name, help_text, 'counter', labelnames, Counter)
+        self.static.append(metric)
+        return metric if labelnames else metric.labels()
+
+    def histogram(self, name, help_text, buckets, labelnames=()):
+        metric = MetricFamily(name, help_text, 'histogram', labelnames, lambda: Histogram(buckets))
+        self.static.append(metric)
+        return metric if labelnames else metric.labels()
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def families(self):
+        return [metric.collect() for metric in self.static]
+
+    def collect(self):
+        families = self.families()
+        for collector in self.collectors:
+            families.extend(collector())
+        return families
+
+    def render(self):
+        merged = {}
+        for name, help_text, kind, samples in self.collect():
+            entry = merged.setdefault(name, (help_text, kind, []))
+            entry[2].extend(samples)
+        lines = []
+        for name, (help_text, kind, samples) in merged.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{format_labels(labels)} {format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def with_labels(families, **extra):
+    """Copy of families with extra labels on every sample"""
+    return [(name, help_text, kind, [(sample, dict(labels, **extra), value) for sample, labels, value in samples])
+            for name, help_text, kind, samples in families]
+
+
+class MetricsServer:
+    """Serves a registry at /metrics in Prometheus text format"""
+
+    def __init__(self, registry, host='127.0.0.1', port=9464):
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split('?')[0] != '/metrics':
+                    handler.send_error(404)
+                    return
+                body = registry.render().encode()
+                handler.send_response(200)
+                handler.send_header('Content-Type', CONTENT_TYPE)
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def parse_text(text):
+    """Parse Prometheus text format into {sample name: [(labels, value)]}"""
+    metrics = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        head, _, value = line.rpartition(' ')
+        labels = {}
+        if '{' in head:
+            name, _, body = head.partition('{')
+            body = body.rstrip('}')
+            while body:
+                key, _, rest = body.partition('="')
+                raw, i = [], 0
+                while i < len(rest) and rest[i] != '"':
+                    if rest[i] == '\\' and i + 1 < len(rest):
+                        i += 1
+                        raw.append('\n' if rest[i] == 'n' else rest[i])
+                    else:
+                        raw.append(rest[i])
+                    i += 1
+                labels[key] = ''.join(raw)
+                body = rest[i + 1:].lstrip(',')
+        else:
+            name = head
+        metrics.setdefault(name, []).append((labels, float(value)))
+    return metrics
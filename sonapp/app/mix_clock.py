@@ -0,0 +1,70 @@
+import time
+
+
+class MixClock:
+    """Fixed-period tick scheduler for the channel mixer.
+
+    Deadlines advance by exactly one period per tick, so mixing cadence does
+    not depend on when packets arrive. A tick that fires after the following
+    deadline has already passed counts the skipped periods as misses and
+    re-anchors instead of bursting to catch up.
+    """
+
+    JITTER_GAIN = 1 / 16  # RFC 3550 style smoothing
+
+    def __init__(self, buffer_size=1024, sample_rate=48000):
+        self.period = buffer_size / sample_rate
+        self.next_deadline = None
+        self.last_tick = None
+        self.ticks = 0
+        self.missed = 0
+        self.jitter = 0.0
+        self.max_lateness = 0.0
+
+    def start(self, now=None):
+        now = time.perf_counter() if now is None else now
+        self.next_deadline = now + self.period
+        self.last_tick = None
+
+    def time_until_tick(self, now=None):
+        now = time.perf_counter() if now is None else now
+        if self.next_deadline is None:
+            self.start(now)
+        return max(0.0, self.next_deadline - now)
+
+    def wait(self):
+        """Sleep until the next deadline and record the tick"""
+        delay = self.time_until_tick()
+        if delay > 0:
+            time.sleep(delay)
+        return self.tick()
+
+    def due(self, now=None):
+        return self.time_until_tick(now) == 0.0
+
+    def tick(self, now=None):
+        now = time.perf_counter() if now is None else now
+        if self.next_deadline is None:
+            self.start(now)
+
+        lateness = now - self.next_deadline
+        self.max_lateness = max(self.max_lateness, lateness)
+        if self.last_tick is not None:
+            deviation = abs((now - self.last_tick) - self.period)
+            self.jitter += (deviation - self.jitter) * self.JITTER_GAIN
+        self.last_tick = now
+        self.ticks += 1
+
+        skipped = int(lateness // self.period) if lateness >= self.period else 0
+        self.missed += skipped
+        self.next_deadline += self.period * (skipped + 1)
+        return skipped
+
+    def stats(self):
+        return {
+            'period_ms': self.period * 1000,
+            'ticks': self.ticks,
+            'missed': self.missed,
+            'jitter_ms': self.jitter * 1000,
+            'max_lateness_ms': self.max_lateness * 1000,
+        }
@@ -0,0 +1,211 @@
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from jitter_buffer import SILENCE
+
+
+class PlayoutSmoother:
+    """Turns a jitter buffer into an unbroken stream of output frames.
+
+    Missing frames are concealed by repeating the last pitch period of the
+    last good frame, fading to silence over `conceal_frames` frames, and the
+    first frame after a loss is crossfaded in from that continuation, so
+    losses and underruns never click. Buffer depth is corrected by time
+    stretching instead of skipping frames: with too much queued, one pitch
+    period is overlap-added out of the stream (accelerate); running short,
+    one is overlap-added in (expand). Both keep pitch, and both only fire
+    where the signal actually repeats at that period, or is near silent.
+
+    Samples pass through a small FIFO so frames can be consumed at a rate
+    other than one per output frame. With stretch=False only concealment
+    runs and the FIFO holds one frame. Everything runs on preallocated
+    scratch: the period search is one einsum over a strided window view
+    plus running-sum energies, and the fades are in-place ramps.
+    """
+
+    LEVEL_GAIN = 1 / 8  # smoothing of the measured buffer level
+    MIN_CORRELATION = 0.6  # normalized correlation needed to cut or repeat a period
+
+    def __init__(self, buffer, frame_size, sample_rate=48000, stretch=True, conceal_frames=3, window_ms=5,
+                 min_pitch_hz=100, max_pitch_hz=400, crossfade_ms=2.5):
+        self.buffer = buffer
+        self.stretch = stretch
+        self.frame_size = frame_size
+        self.conceal_frames = conceal_frames
+        self.window = min(frame_size // 4, int(sample_rate * window_ms / 1000))
+        # Lags long enough for one period of the lowest pitch, but an expand must fit in a frame
+        self.max_lag = max(1, min(int(sample_rate / min_pitch_hz), frame_size // 2, frame_size - self.window))
+        self.min_lag = min(self.max_lag, max(1, int(sample_rate / max_pitch_hz)))
+        self.crossfade = max(1, min(frame_size, int(sample_rate * crossfade_ms / 1000)))
+
+        size = 2 * frame_size + self.max_lag + self.window
+        self.fifo = np.zeros(size, dtype=np.float32)
+        self.spare = np.zeros(size, dtype=np.float32)
+        self.count = 0
+        self.last = np.zeros(frame_size, dtype=np.float32)  # last good frame, source of concealment
+        self.period = frame_size
+        self.phase = 0
+        self.concealing = 0  # frames concealed since the last good one
+        self.level = 0.0
+
+        self.steps = np.arange(frame_size, dtype=np.float32)
+        self.ramp = self.steps / frame_size
+        self.offsets = np.arange(frame_size, dtype=np.intp)
+        self.index = np.empty(frame_size, dtype=np.intp)
+        self.gain = np.empty(frame_size, dtype=np.float32)
+        self.work = np.empty(frame_size, dtype=np.float32)
+        self.corr = np.empty(self.max_lag + 1, dtype=np.float32)
+        self.energy = np.empty(self.max_lag + 1, dtype=np.float32)
+        self.squares = np.empty(size + 1, dtype=np.float32)
+
+        self.concealed = 0
+        self.accelerated = 0
+        self.expanded = 0
+
+    def best_lag(self, x, max_lag):
+        """Lag in [min_lag, max_lag] at which x[:window] best repeats, or None.
+
+        A near-silent reference repeats at any lag and gets max_lag, so
+        silence is what stretching removes or adds most readily.
+        """
+        window = self.window
+        if max_lag < self.min_lag:
+            return None
+        reference = x[:window]
+        reference_energy = float(np.dot(reference, reference))
+        if reference_energy < 1e-8:
+            return max_lag
+        span = x[self.min_lag:max_lag + window]
+        lags = max_lag - self.min_lag + 1
+        corr = self.corr[:lags]
+        np.einsum('ij,j->i', sliding_window_view(span, window), reference, out=corr)
+        # Energy of every candidate window from one running sum of squares
+        squares = self.squares[:len(span) + 1]
+        squares[0] = 0
+        np.square(span, out=squares[1:])
+        np.cumsum(squares, out=squares)
+        energy = self.energy[:lags]
+        np.subtract(squares[window:window + lags], squares[:lags], out=energy)
+        np.maximum(energy, 1e-12, out=energy)
+        np.sqrt(energy, out=energy)
+        np.divide(corr, energy, out=corr)
+        best = int(np.argmax(corr))
+        if corr[best] / math.sqrt(reference_energy) < self.MIN_CORRELATION:
+            return None
+        return self.min_lag + best
+
+    def conceal(self, out):
+        """Fill out with the last good frame's final period, repeated and fading out"""
+        size = self.frame_size
+        if self.concealing == 0:
+            # The period that ends the frame: search backwards from its last sample
+            self.period = self.best_lag(self.last[::-1], self.max_lag) or self.max_lag
+            self.phase = 0
+        start = 1 - self.concealing / self.conceal_frames
+        end = max(0.0, 1 - (self.concealing + 1) / self.conceal_frames)
+        self.concealing += 1
+        if start <= 0:
+            out.fill(0)
+            return
+        self.concealed += 1
+        self.repeat(out, size)
+        np.multiply(self.ramp, end - start, out=self.gain)
+        np.add(self.gain, start, out=self.gain)
+        np.multiply(out, self.gain, out=out)
+
+    def repeat(self, out, count):
+        """Next count samples of the concealment loop, continuing from the last call"""
+        index = self.index[:count]
+        np.add(self.offsets[:count], self.phase, out=index)
+        np.remainder(index, self.period, out=index)
+        np.add(index, self.frame_size - self.period, out=index)
+        np.take(self.last, index, out=out, mode='wrap')
+        self.phase = (self.phase + count) % self.period
+
+    def recover(self, frame):
+        """Crossfade the first good frame after a loss in from the concealment it replaces"""
+        gain = 1 - self.concealing / self.conceal_frames
+        if gain <= 0:
+            return
+        fade = self.crossfade
+        continuation = self.work[:fade]
+        self.repeat(continuation, fade)
+        up = self.gain[:fade]
+        np.multiply(self.steps[:fade], 1.0 / fade, out=up)
+        np.multiply(frame[:fade], up, out=frame[:fade])
+        np.subtract(1.0, up, out=up)
+        np.multiply(up, gain, out=up)
+        np.multiply(continuation, up, out=continuation)
+        np.add(frame[:fade], continuation, out=frame[:fade])
+
+    def pull(self, need, lookahead=False):
+        """Top the FIFO up to need samples; lookahead only takes frames already queued"""
+        size = self.frame_size
+        while self.count < need:
+            if lookahead and not len(self.buffer):
+                return False
+            payload = self.buffer.pop()
+            dest = self.fifo[self.count:self.count + size]
+            if payload is None or payload is SILENCE:
+                self.conceal(dest)
+            else:
+                dest[:] = payload
+                if self.concealing:
+                    self.recover(dest)
+                    self.concealing = 0
+                self.last[:] = payload
+            self.count += size
+        return True
+
+    def crossfade_into(self, out, first, second, length):
+        """out[:length] = first faded out plus second faded in"""
+        up = self.gain[:length]
+        np.multiply(self.steps[:length], 1.0 / length, out=up)
+        work = self.work[:length]
+        np.multiply(second, up, out=work)
+        np.subtract(1.0, up, out=up)
+        np.multiply(first, up, out=out[:length])
+        np.add(out[:length], work, out=out[:length])
+
+    def next(self, out):
+        """Write the next output frame into out"""
+        size = self.frame_size
+        self.pull(size)
+        ahead = self.buffer.depth() + (self.count - size) / size
+        self.level += (ahead - self.level) * self.LEVEL_GAIN
+        target = self.buffer.target_depth
+        consumed = size
+        fifo = self.fifo
+        if self.stretch and not self.concealing and not self.buffer.buffering:
+            # Accelerating needs a window past the longest period; a lost frame on the way cancels it
+            if (self.level > target + 0.5 and self.pull(size + self.max_lag + self.window, lookahead=True)
+                    and not self.concealing):
+                lag = self.best_lag(fifo, self.max_lag)
+                if lag is not None:
+                    # Accelerate: fade the period at lag into the start, dropping lag samples
+                    self.crossfade_into(out, fifo[:lag], fifo[lag:2 * lag], lag)
+                    out[lag:] = fifo[2 * lag:size + lag]
+                    consumed = size + lag
+                    self.accelerated += 1
+            elif self.level < target - 1.5:
+                lag = self.best_lag(fifo, min(self.max_lag, self.count - self.window))
+                if lag is not None:
+                    # Expand: play the first period, then crossfade it in again, adding lag samples
+                    out[:lag] = fifo[:lag]
+                    self.crossfade_into(out[lag:], fifo[lag:2 * lag], fifo[:lag], lag)
+                    out[2 * lag:] = fifo[lag:size - lag]
+                    consumed = size - lag
+                    self.expanded += 1
+        if consumed == size:
+            out[:] = fifo[:size]
+        else:
+            self.level += (size - consumed) / size
+        self.count -= consumed
+        # Shift the remainder through the spare array rather than an overlapping copy
+        self.spare[:self.count] = fifo[consumed:consumed + self.count]
+        self.fifo, self.spare = self.spare, self.fifo
+
+    def stats(self):
+        return {'concealed': self.concealed, 'accelerated': self.accelerated, 'expanded': self.expanded}
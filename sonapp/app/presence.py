@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import defaultdict
+
+from datagram import request_json
+
+
+class PresenceService:
+    """Which app users are online, by PUUID.
+
+    Clients heartbeat every id they go by and drop out `ttl` seconds after
+    their last one. Each id maps to its expiry second, so a query costs one
+    dict lookup per participant whatever the number of users online, and
+    ids sit in per-second expiry buckets so a heartbeat moves one id between
+    two sets and a sweep only touches ids that actually expired. This is
+    the in-process service; the central server answers it on its discovery
+    port and PresenceClient is the matching remote stand-in.
+
+    Nothing authenticates a heartbeat, but each id remembers the host its
+    last heartbeat came from and a remote leave is only honored from that
+    host, so one user cannot take another offline. Callers in-process pass
+    no source and are trusted.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.expiry = {}  # user id -> second its presence runs out
+        self.buckets = defaultdict(set)  # expiry second -> user ids
+        self.sources = {}  # user id -> host of its last remote heartbeat
+        self.swept = int(time.monotonic())  # buckets before this second are empty
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.expiry)
+
+    def heartbeat(self, ids, now=None, source=None):
+        now = time.monotonic() if now is None else now
+        expires = int(now + self.ttl) + 1
+        with self.lock:
+            for user_id in ids:
+                if source is not None:
+                    self.sources[user_id] = source
+                previous = self.expiry.get(user_id)
+                if previous == expires:
+                    continue
+                if previous is not None:
+                    self.buckets[previous].discard(user_id)
+                self.buckets[expires].add(user_id)
+                self.expiry[user_id] = expires
+            self.sweep(now)
+        return True
+
+    def leave(self, ids, source=None):
+        with self.lock:
+            for user_id in ids:
+                if source is not None and self.sources.get(user_id) != source:
+                    continue  # not the host that keeps this id online
+                self.sources.pop(user_id, None)
+                expires = self.expiry.pop(user_id, None)
+                if expires is not None:
+                    self.buckets[expires].discard(user_id)
+        return True
+
+    def sweep(self, now):
+        """Drop every id whose bucket has run out; called with the lock held"""
+        second = int(now)
+        for expired in range(self.swept, second + 1):
+            for user_id in self.buckets.pop(expired, ()):
+                del self.expiry[user_id]
+                self.sources.pop(user_id, None)
+        self.swept = max(self.swept, second + 1)
+
+    def online(self, participants, now=None):
+        """The (id, team) pairs of participants whose user is online, in the order given"""
+        now = time.monotonic() if now is None else now
+        expiry = self.expiry
+        return [(user_id, team) for user_id, team in participants if expiry.get(user_id, 0) > now]
+
+
+class PresenceClient:
+    """Remote presence service with the PresenceService interface"""
+
+    def __init__(self, host, port=65431, timeout=0.5, retries=3):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.retries = retries
+
+    def request(self, message):
+        return request_json(self.address, message, self.timeout, self.retries, 'Presence service')
+
+    def heartbeat(self, ids):
+        return self.request({'op': 'presence_heartbeat', 'ids': list(ids)}).get('ok', False)
+
+    def leave(self, ids):
+        return self.request({'op': 'presence_leave', 'ids': list(ids)}).get('ok', False)
+
+    def online(self, participants):
+        reply = self.request({'op': 'presence_query', 'participants': [list(p) for p in participants]})
+        return [tuple(p) for p in reply.get('online', [])]
+
+
+class PresenceHeartbeat:
+    """Keeps a user's ids online at a presence service until stopped"""
+
+    def __init__(self, presence, ids, interval=20):
+        self.presence = presence
+        self.ids = [user_id for user_id in ids if user_id]
+        self.interval = interval  # a third of the default ttl, so two lost datagrams are survivable
+        self.stopped = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.presence.heartbeat(self.ids)
+            except (RuntimeError, OSError) as e:
+                print(f"Presence heartbeat failed: {e}")
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        try:
+            self.presence.leave(self.ids)
+        except (RuntimeError, OSError):
+            pass  # the ids expire on their own
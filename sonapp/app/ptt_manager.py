@@ -1,14 +1,33 @@
 # app/ptt_manager.py
 import keyboard
 
-is_ptt_active = False
+from transmit_gate import PUSH_TO_TALK, TOGGLE
 
-def toggle_ptt():
-    """Toggle Push-to-Talk status."""
-    global is_ptt_active
-    is_ptt_active = not is_ptt_active
-    print("PTT is now", "Active" if is_ptt_active else "Inactive")
 
-def setup_ptt_key():
-    """Set up the key for Push-to-Talk."""
-    keyboard.add_hotkey('ctrl', toggle_ptt)
+def setup_ptt_key(gate, key='ctrl'):
+    """Drive a client's TransmitGate from a global hotkey.
+
+    In push-to-talk mode the gate is open while the key is held; in toggle
+    mode each press flips it. Returns a function that removes the hooks.
+    """
+    if gate.mode == PUSH_TO_TALK:
+        hooks = [keyboard.on_press_key(key, lambda event: gate.press()),
+                 keyboard.on_release_key(key, lambda event: gate.release())]
+
+        def remove():
+            for hook in hooks:
+                keyboard.unhook(hook)
+        return remove
+    if gate.mode == TOGGLE:
+        hotkey = keyboard.add_hotkey(key, gate.toggle)
+        return lambda: keyboard.remove_hotkey(hotkey)
+    return lambda: None
+
+
+def setup_mute_key(gate, key='ctrl+m'):
+    """Flip the gate's mute with a global hotkey, whatever the talk mode.
+
+    Returns a function that removes the hotkey.
+    """
+    hotkey = keyboard.add_hotkey(key, lambda: gate.set_muted(not gate.muted))
+    return lambda: keyboard.remove_hotkey(hotkey)
@@ -0,0 +1,186 @@
+import functools
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from jitter_buffer import SILENCE
+
+
+@functools.lru_cache(maxsize=32)
+def design(up, down, taps):
+    """Polyphase bank for resampling by up/down, shared by every stream of that rate pair.
+
+    A Kaiser-windowed sinc lowpass of up * taps coefficients, cut off below
+    the lower of the two Nyquist rates, is split into `up` phases of `taps`
+    coefficients each. Rows are reversed so that output sample n is a plain
+    dot product of its phase row with the `taps` input samples ending at
+    floor(n * down / up).
+    """
+    length = up * taps
+    cutoff = 0.5 / max(up, down) * 0.92  # cycles per sample at the upsampled rate
+    n = np.arange(length) - (length - 1) / 2
+    prototype = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, 8.0) * up
+    bank = np.ascontiguousarray(prototype.reshape(taps, up).T[:, ::-1], dtype=np.float32)
+    bank.setflags(write=False)
+    return bank
+
+
+class PolyphaseResampler:
+    """Stateful rational-ratio resampler for one audio stream.
+
+    Frames are processed in one vectorized pass: output positions for the
+    whole frame come from a cached step table, the input windows and the
+    phase rows they need are gathered into reused scratch matrices and the
+    outputs are a single row-wise dot product, so a frame costs a handful of
+    numpy calls and no allocation. The last taps - 1 input
+    samples and the fractional position carry over between calls, so
+    consecutive frames resample as one continuous signal. Coefficients are
+    cached per rate pair by design(); only this small state is per stream.
+    """
+
+    def __init__(self, rate_in, rate_out, taps=32):
+        common = math.gcd(rate_in, rate_out)
+        self.rate_in = rate_in
+        self.rate_out = rate_out
+        self.up = rate_out // common
+        self.down = rate_in // common
+        self.taps = taps
+        self.bank = design(self.up, self.down, taps)
+        self.position = 0  # next output's input position, in 1/up samples from the current frame start
+        self.history = np.zeros(taps - 1, dtype=np.float32)
+        self.frame_size = None
+
+    def max_output(self, frame_size):
+        return -(-frame_size * self.up // self.down) + 1
+
+    def _allocate(self, frame_size):
+        outputs = self.max_output(frame_size)
+        self.frame_size = frame_size
+        self.buffer = np.zeros(self.taps - 1 + frame_size, dtype=np.float32)
+        self.buffer[:self.taps - 1] = self.history
+        self.windows = sliding_window_view(self.buffer, self.taps)
+        self.window_rows = np.empty((frame_size, self.taps), dtype=np.float32)
+        self.steps = np.arange(outputs, dtype=np.intp) * self.down
+        self.index = np.empty(outputs, dtype=np.intp)
+        self.phase = np.empty(outputs, dtype=np.intp)
+        self.gathered = np.empty((outputs, self.taps), dtype=np.float32)
+        self.coefficients = np.empty((outputs, self.taps), dtype=np.float32)
+
+    def process(self, samples, out):
+        """Resample one frame into out; returns how many output samples were written"""
+        size = len(samples)
+        if size != self.frame_size:
+            self._allocate(size)
+        history = self.taps - 1
+        self.buffer[history:] = samples
+
+        count = max(0, -(-(size * self.up - self.position) // self.down))
+        index, phase = self.index[:count], self.phase[:count]
+        np.add(self.steps[:count], self.position, out=index)
+        np.remainder(index, self.up, out=phase)
+        np.floor_divide(index, self.up, out=index)
+        gathered, coefficients = self.gathered[:count], self.coefficients[:count]
+        # Materializing every window first is cheaper than gathering from the
+        # strided view, which numpy would copy into a temporary on every call
+        np.copyto(self.window_rows, self.windows)
+        np.take(self.window_rows, index, axis=0, out=gathered, mode='wrap')
+        np.take(self.bank, phase, axis=0, out=coefficients, mode='wrap')
+        np.einsum('ij,ij->i', gathered, coefficients, out=out[:count])
+
+        self.position += count * self.down - size * self.up
+        self.buffer[:history] = self.buffer[size:]
+        self.history = self.buffer[:history]
+        return count
+
+    def reset(self):
+        self.position = 0
+        self.history[:] = 0
+
+
+class FrameResampler:
+    """Resamples a stream of fixed-size frames into fixed-size frames at another rate.
+
+    Input and output frame boundaries drift against each other, so resampled
+    samples collect in a small preallocated FIFO and pull() hands out a
+    frame whenever one is complete: some pushes yield no frame, some two.
+    """
+
+    def __init__(self, rate_in, rate_out, frame_in, frame_out, taps=32):
+        self.resampler = PolyphaseResampler(rate_in, rate_out, taps)
+        self.frame_out = frame_out
+        size = frame_out + self.resampler.max_output(frame_in)
+        self.fifo = np.zeros(size, dtype=np.float32)
+        self.spare = np.zeros(size, dtype=np.float32)
+        self.count = 0
+        self.frame = np.zeros(frame_out, dtype=np.float32)
+
+    def push(self, samples):
+        self.count += self.resampler.process(samples, self.fifo[self.count:])
+
+    def ready(self):
+        return self.count >= self.frame_out
+
+    def pull(self):
+        """Next complete output frame, valid until the following pull(); None if there is none yet"""
+        if self.count < self.frame_out:
+            return None
+        self.frame[:] = self.fifo[:self.frame_out]
+        self.count -= self.frame_out
+        # Shift the remainder through the spare array: an overlapping in-place
+        # copy would make numpy allocate a temporary
+        self.spare[:self.count] = self.fifo[self.frame_out:self.frame_out + self.count]
+        self.fifo, self.spare = self.spare, self.fifo
+        return self.frame
+
+    def flush(self):
+        """Zero-pad whatever is buffered into a last frame, or None if empty"""
+        if not self.count:
+            return None
+        self.fifo[self.count:self.frame_out] = 0
+        self.count = self.frame_out
+        frame = self.pull()
+        self.resampler.reset()
+        return frame
+
+    def reset(self):
+        """Drop everything buffered and the filter history"""
+        self.count = 0
+        self.resampler.reset()
+
+
+class ResampledSource:
+    """Feeds the mixer frames at the server's rate from a client's jitter buffer.
+
+    Stands in for the buffer in the mix loop: pop() pulls client frames only
+    as the FIFO needs them, so a 44.1 kHz client's ~43 frames/s turn into one
+    48 kHz frame per mix tick. Gaps and silence markers flush the partial
+    frame, zero-padded, before they are passed on.
+    """
+
+    def __init__(self, buffer, rate_in, rate_out, frame_in, frame_out):
+        self.buffer = buffer
+        self.frames = FrameResampler(rate_in, rate_out, frame_in, frame_out)
+        self.pending = None
+
+    def pop(self):
+        if self.pending is not None:
+            payload, self.pending = self.pending, None
+            return payload
+        while not self.frames.ready():
+            payload = self.buffer.pop()
+            if payload is None or payload is SILENCE:
+                # A gap or the end of a talk spurt: play out what is buffered first
+                frame = self.frames.flush()
+                if frame is None:
+                    return payload
+                self.pending = payload
+                return frame
+            self.frames.push(payload)
+        return self.frames.pull()
+
+    def reset(self):
+        """Discard the client's queued audio here and in the buffer, as JitterBuffer.reset() does"""
+        self.buffer.reset()
+        self.frames.reset()
+        self.pending = None
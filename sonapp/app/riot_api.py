@@ -1,19 +1,17 @@
 # app/riot_api.py
-import requests
+import os
 
-RIOT_API_KEY = 'RGAPI-a9f0641b-d5ff-4cd1-be8f-b46793263221'  # Replace with your actual API key
+from riot_client import get_client
+
+RIOT_API_KEY = os.getenv('RIOT_API_KEY')
 BASE_URL = 'https://na1.api.riotgames.com'
 
 def get_summoner_by_name(summoner_name):
-    """Fetch summoner details by name."""
-    url = f"{BASE_URL}/lol/summoner/v4/summoners/by-name/{summoner_name}"
-    headers = {'X-Riot-Token': RIOT_API_KEY}
-    response = requests.get(url, headers=headers)
-    return response.json() if response.status_code == 200 else None
+    """Fetch summoner details by name; cached for an hour by the shared client."""
+    status, data = get_client('na1', RIOT_API_KEY, BASE_URL).summoner_by_name(summoner_name)
+    return data if status == 200 else None
 
 def get_current_game(summoner_id):
-    """Fetch current game details."""
-    url = f"{BASE_URL}/lol/spectator/v4/active-games/by-summoner/{summoner_id}"
-    headers = {'X-Riot-Token': RIOT_API_KEY}
-    response = requests.get(url, headers=headers)
-    return response.json() if response.status_code == 200 else None
+    """Fetch current game details; cached for a few seconds by the shared client."""
+    status, data = get_client('na1', RIOT_API_KEY, BASE_URL).active_game(summoner_id)
+    return data if status == 200 else None
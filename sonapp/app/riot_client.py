@@ -0,0 +1,242 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+SUMMONER_TTL = 3600  # summoner ids and names rarely change
+ACTIVE_GAME_TTL = 5  # short enough that a 10 s poll always sees a fresh answer
+DEV_KEY_LIMITS = '20:1,100:120'  # assumed until the first response reports the key's real limits
+
+
+class RateLimit:
+    """Token buckets for one Riot rate-limit scope: the whole key, or one method.
+
+    Riot limits are fixed windows that open at the first request, given as
+    "count:seconds,..." in the X-*-Rate-Limit headers. Each window is a
+    bucket of `count` tokens refilled all at once when it ends, so the
+    scheduler never sends more than a window allows. Counts reported by
+    the server pull our tokens down when another process shares the key,
+    and a 429's Retry-After blocks the scope outright.
+    """
+
+    def __init__(self, spec=None):
+        self.spec = None
+        self.buckets = []  # [limit, window, tokens, resets_at]
+        self.blocked_until = 0.0
+        if spec:
+            self.configure(spec)
+
+    @staticmethod
+    def parse(spec):
+        pairs = []
+        for part in spec.split(','):
+            count, window = part.split(':')
+            pairs.append((int(count), float(window)))
+        return pairs
+
+    def configure(self, spec):
+        if spec == self.spec:
+            return
+        try:
+            pairs = self.parse(spec)
+        except ValueError:
+            return
+        self.spec = spec
+        self.buckets = [[limit, window, limit, 0.0] for limit, window in pairs]
+
+    def sync(self, counts, now):
+        """Apply an X-*-Rate-Limit-Count header, which includes the request just answered"""
+        try:
+            used = dict((window, count) for count, window in self.parse(counts))
+        except ValueError:
+            return
+        for bucket in self.buckets:
+            limit, window = bucket[0], bucket[1]
+            if window in used:
+                if bucket[3] <= now:
+                    bucket[2], bucket[3] = limit, now + window
+                bucket[2] = min(bucket[2], max(0, limit - used[window]))
+
+    def delay(self, now):
+        """Seconds until a request in this scope may go out"""
+        wait = self.blocked_until - now
+        for limit, window, tokens, resets_at in self.buckets:
+            if tokens < 1 and resets_at > now:
+                wait = max(wait, resets_at - now)
+        return wait
+
+    def take(self, now):
+        for bucket in self.buckets:
+            if bucket[3] <= now:
+                bucket[2] = bucket[0]
+                bucket[3] = now + bucket[1]  # the window opens with its first request
+            bucket[2] -= 1
+
+    def block(self, until):
+        self.blocked_until = max(self.blocked_until, until)
+
+
+class RiotClient:
+    """Shared Riot API client for one key and region.
+
+    Requests go through one pooled keep-alive session. Answers, including
+    404s such as "not in a game", are cached for a ttl chosen per call, and
+    identical requests in flight are coalesced so concurrent callers share
+    one HTTP round trip. Before each request the scheduler waits until both
+    the key's application limit and the method's limit have a token, and a
+    429 blocks the scope it names for Retry-After seconds before retrying.
+    """
+
+    MAX_RETRIES = 3
+    TIMEOUT = 5
+    MAX_CACHE = 1024
+
+    def __init__(self, api_key, region='na1', base_url=None, pool_size=8):
+        self.base_url = base_url or f"https://{region}.api.riotgames.com"
+        self.session = requests.Session()
+        self.session.headers['X-Riot-Token'] = api_key
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.lock = threading.Lock()
+        self.app_limit = RateLimit(DEV_KEY_LIMITS)
+        self.method_limits = {}
+        self.cache = {}  # path -> (expires, status, data)
+        self.inflight = {}  # path -> Future of (status, data)
+        self.requests_sent = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.throttled = 0
+
+    def get(self, path, method, ttl):
+        """(status, data) for a GET of path; data is the decoded JSON body, or None.
+
+        `method` names the endpoint for its rate limit. Transport errors
+        that outlast the retries are raised as requests.RequestException.
+        """
+        with self.lock:
+            now = time.monotonic()
+            cached = self.cache.get(path)
+            if cached is not None and cached[0] > now:
+                self.cache_hits += 1
+                return cached[1], cached[2]
+            future = self.inflight.get(path)
+            owner = future is None
+            if owner:
+                future = self.inflight[path] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            status, data = self.fetch(path, method)
+        except BaseException as e:
+            with self.lock:
+                del self.inflight[path]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            del self.inflight[path]
+            if status in (200, 404):
+                self.store(path, time.monotonic() + ttl, status, data)
+        future.set_result((status, data))
+        return status, data
+
+    def store(self, path, expires, status, data):
+        if len(self.cache) >= self.MAX_CACHE:
+            now = time.monotonic()
+            for key in [key for key, entry in self.cache.items() if entry[0] <= now]:
+                del self.cache[key]
+            if len(self.cache) >= self.MAX_CACHE:
+                self.cache.clear()
+        self.cache[path] = (expires, status, data)
+
+    def schedule(self, method_limit):
+        """Wait for a token in both the application and the method scope, then take them"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = max(self.app_limit.delay(now), method_limit.delay(now))
+                if wait <= 0:
+                    self.app_limit.take(now)
+                    method_limit.take(now)
+                    return
+                self.throttled += 1
+            time.sleep(wait)
+
+    def fetch(self, path, method):
+        with self.lock:
+            method_limit = self.method_limits.setdefault(method, RateLimit())
+        for attempt in range(self.MAX_RETRIES + 1):
+            self.schedule(method_limit)
+            try:
+                response = self.session.get(self.base_url + path, timeout=self.TIMEOUT)
+            except requests.RequestException:
+                if attempt == self.MAX_RETRIES:
+                    raise
+                time.sleep(attempt + 1)
+                continue
+            self.requests_sent += 1
+            self.update_limits(response, method_limit)
+            if response.status_code == 429 or response.status_code >= 500:
+                if attempt == self.MAX_RETRIES:
+                    return response.status_code, None
+                self.back_off(response, method_limit, attempt)
+                continue
+            try:
+                data = response.json() if response.status_code == 200 else None
+            except ValueError:
+                data = None
+            return response.status_code, data
+
+    def update_limits(self, response, method_limit):
+        headers = response.headers
+        now = time.monotonic()
+        with self.lock:
+            for limit, prefix in ((self.app_limit, 'X-App-Rate-Limit'), (method_limit, 'X-Method-Rate-Limit')):
+                if prefix in headers:
+                    limit.configure(headers[prefix])
+                if prefix + '-Count' in headers:
+                    limit.sync(headers[prefix + '-Count'], now)
+
+    def back_off(self, response, method_limit, attempt):
+        try:
+            retry_after = float(response.headers.get('Retry-After', ''))
+        except ValueError:
+            retry_after = float(attempt + 1)  # no Retry-After: the underlying service is struggling
+        until = time.monotonic() + retry_after
+        with self.lock:
+            if response.headers.get('X-Rate-Limit-Type') == 'application':
+                self.app_limit.block(until)
+            else:
+                method_limit.block(until)  # method or service limit: other endpoints are unaffected
+
+    def stats(self):
+        return {'requests': self.requests_sent, 'cache_hits': self.cache_hits,
+                'coalesced': self.coalesced, 'throttled': self.throttled}
+
+    def summoner_by_name(self, summoner_name):
+        return self.get(f"/lol/summoner/v4/summoners/by-name/{summoner_name}", 'summoner-by-name', SUMMONER_TTL)
+
+    def active_game(self, summoner_id):
+        return self.get(f"/lol/spectator/v4/active-games/by-summoner/{summoner_id}", 'active-game',
+                        ACTIVE_GAME_TTL)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(region='na1', api_key=None, base_url=None):
+    """The process-wide client for a key and region, whose rate limits it shares"""
+    api_key = api_key or os.getenv('RIOT_API_KEY')
+    base_url = base_url or f"https://{region}.api.riotgames.com"  # so the default and its spelled-out URL share
+    with _clients_lock:
+        client = _clients.get((region, api_key, base_url))
+        if client is None:
+            client = _clients[(region, api_key, base_url)] = RiotClient(api_key, region, base_url)
+        return client
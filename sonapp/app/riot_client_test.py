@@ -0,0 +1,164 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from riot_client import RiotClient
+
+WINDOW_SLACK = 0.02  # seconds
+
+
+class MockRiot(ThreadingHTTPServer):
+    """Riot API stand-in on localhost with the real rate-limit headers.
+
+    Summoner and active-game lookups answer after `latency` seconds; an
+    active game for a summoner id ending in "nogame" is a 404. The first
+    `throttle` lookups of the summoner "limited" get a method 429 with
+    Retry-After. Every request is logged with its arrival time and the
+    client port, which shows whether connections are reused.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency, app_limit, method_limit, throttle, retry_after):
+        super().__init__(('127.0.0.1', 0), MockRiotHandler)
+        self.latency = latency
+        self.app_limit = app_limit
+        self.method_limit = method_limit
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.hits = []  # (arrival, path, client port)
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def reset(self):
+        with self.lock:
+            self.hits.clear()
+
+
+class MockRiotHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, as the real API
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits.append((time.monotonic(), self.path, self.client_address[1]))
+            limited = self.path.endswith('/by-name/limited') and server.throttle > 0
+            if limited:
+                server.throttle -= 1
+        time.sleep(server.latency)
+        if limited:
+            self.send_response(429)
+            self.send_header('Retry-After', str(server.retry_after))
+            self.send_header('X-Rate-Limit-Type', 'method')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if '/active-games/' in self.path and self.path.endswith('nogame'):
+            self.send_response(404)
+            body = b'{"status": {"status_code": 404}}'
+        else:
+            self.send_response(200)
+            body = json.dumps({'id': self.path.rsplit('/', 1)[1], 'gameId': 1}).encode()
+        self.send_header('X-App-Rate-Limit', server.app_limit)
+        self.send_header('X-Method-Rate-Limit', server.method_limit)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def in_threads(count, target):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run(args):
+    riot = MockRiot(args.latency, f"{args.app_rate}:1,100:120", '50:10', 1, args.retry_after).start()
+    client = RiotClient('mock-key', base_url=riot.url, pool_size=args.pool)
+    failures = []
+    try:
+        # 1: concurrent identical lookups share one request
+        answers = []
+        in_threads(args.callers, lambda i: answers.append(client.summoner_by_name('alice')))
+        sent = len(riot.hits)
+        print(f"{args.callers} concurrent lookups of one summoner: {sent} request(s), "
+              f"{client.coalesced} coalesced")
+        if sent != 1 or len(set(map(str, answers))) != 1:
+            failures.append(f"identical concurrent lookups sent {sent} requests")
+
+        # 2: repeats within the ttl, found or 404, come from the cache
+        client.active_game('nogame')
+        riot.reset()
+        for _ in range(args.repeats):
+            client.summoner_by_name('alice')
+            client.active_game('nogame')
+        print(f"{2 * args.repeats} repeated lookups: {len(riot.hits)} requests, {client.cache_hits} cache hits")
+        if riot.hits:
+            failures.append(f"{len(riot.hits)} cached lookups reached the API")
+
+        # 3: distinct lookups are paced to the application limit over pooled connections
+        time.sleep(1)  # so the one-second window the lookups above opened has closed
+        riot.reset()
+        started = time.monotonic()
+        in_threads(args.distinct, lambda i: client.summoner_by_name(f"user{i}"))
+        arrivals = sorted(at - started for at, _, _ in riot.hits)
+        # Riot's windows are fixed and open with the first request; a little slack
+        # absorbs the difference between when the client sent and when we logged
+        windows = {}
+        for t in arrivals:
+            window = int(t - arrivals[0] + WINDOW_SLACK)
+            windows[window] = windows.get(window, 0) + 1
+        busiest = max(windows.values())
+        ports = len({port for _, _, port in riot.hits})
+        print(f"{args.distinct} distinct lookups at {args.app_rate}/s: busiest window held {busiest}, "
+              f"last sent at {arrivals[-1]:.2f} s over {ports} connections")
+        if busiest > args.app_rate:
+            failures.append(f"{busiest} requests in one window against a limit of {args.app_rate}")
+        if ports >= len(riot.hits):
+            failures.append(f"{len(riot.hits)} requests opened {ports} connections; none was reused")
+
+        # 4: a 429 is retried once Retry-After has passed
+        riot.reset()
+        started = time.monotonic()
+        status, _ = client.summoner_by_name('limited')
+        waited = time.monotonic() - started
+        print(f"throttled lookup: status {status} after {waited:.2f} s and {len(riot.hits)} requests")
+        if status != 200 or waited < args.retry_after:
+            failures.append(f"429 handling returned {status} after {waited:.2f} s")
+        print(f"client stats: {client.stats()}")
+    finally:
+        riot.shutdown()
+        riot.server_close()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the shared Riot client against a mock API")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds the mock takes per request")
+    parser.add_argument('--app-rate', type=int, default=5, help="application limit per second the mock reports")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After of the mock's 429")
+    parser.add_argument('--callers', type=int, default=20, help="threads asking for the same summoner")
+    parser.add_argument('--repeats', type=int, default=100)
+    parser.add_argument('--distinct', type=int, default=12, help="different summoners looked up at once")
+    parser.add_argument('--pool', type=int, default=8, help="client connection pool size")
+    args = parser.parse_args()
+
+    failures = run(args)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
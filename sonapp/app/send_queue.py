@@ -0,0 +1,191 @@
+import threading
+import time
+
+DEGRADE = 'degrade'
+EVICT = 'evict'
+
+
+class SendQueue:
+    """Bounded per-listener queue of outgoing frames that drops the oldest when full.
+
+    Audio goes stale quickly, so when a listener falls behind the newest mix
+    replaces the oldest queued one instead of queueing more latency. Frames
+    are copied into preallocated slots that only grow to the largest frame
+    seen, so queueing allocates nothing in steady state. A frame that a
+    sender has started writing to a stream socket is never dropped, since
+    cutting it would break the framing; the next oldest goes instead.
+
+    One thread may put() while a sender thread runs drain() on a blocking
+    socket, or a single event loop can do both with write_to().
+    """
+
+    def __init__(self, max_frames=8):
+        if max_frames < 2:
+            raise ValueError("A send queue needs two slots: one may be pinned by a frame in flight")
+        self.slots = [bytearray() for _ in range(max_frames)]
+        self.lengths = [0] * max_frames
+        self.head = 0
+        self.count = 0
+        self.offset = 0  # bytes of the head frame already sent
+        self.busy = False  # head frame is being written and must not be dropped
+        self.bytes = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+        self.offered = 0
+        self.dropped = 0
+        self.last_progress = time.monotonic()  # last write, or when the queue last filled from empty
+
+        # Slow-consumer bookkeeping, owned by SlowConsumerPolicy
+        self.window_start = self.last_progress
+        self.window_offered = 0
+        self.window_dropped = 0
+        self.strikes = 0
+
+    def __len__(self):
+        return self.count
+
+    def put(self, frame, offset=0):
+        """Queue a copy of frame; returns False if an older frame was dropped to make room.
+
+        offset marks bytes of frame already written by the caller, which is
+        only meaningful when the queue is empty.
+        """
+        with self.cond:
+            if self.closed:
+                return True
+            self.offered += 1
+            dropped = self.count == len(self.slots)
+            if dropped:
+                self.drop_oldest()
+            elif not self.count:
+                self.last_progress = time.monotonic()
+            index = (self.head + self.count) % len(self.slots)
+            size = len(frame)
+            self.slots[index][:size] = frame
+            self.lengths[index] = size
+            self.count += 1
+            self.bytes += size
+            if offset and self.count == 1:
+                self.offset = offset
+                self.busy = True
+                self.bytes -= offset
+            self.cond.notify()
+            return not dropped
+
+    def drop_oldest(self):
+        if self.busy:
+            # Keep the frame in flight at the head and drop the one behind it
+            n = len(self.slots)
+            second = (self.head + 1) % n
+            self.bytes -= self.lengths[second]
+            self.slots[self.head], self.slots[second] = self.slots[second], self.slots[self.head]
+            self.lengths[self.head], self.lengths[second] = self.lengths[second], self.lengths[self.head]
+            self.head = second
+        else:
+            self.bytes -= self.lengths[self.head]
+            self.head = (self.head + 1) % len(self.slots)
+        self.count -= 1
+        self.dropped += 1
+
+    def peek(self):
+        """Unsent part of the head frame, or None; the frame is pinned until advance()"""
+        with self.cond:
+            if not self.count:
+                return None
+            self.busy = True
+            return memoryview(self.slots[self.head])[self.offset:self.lengths[self.head]]
+
+    def wait(self, timeout=None):
+        """Block until a frame is queued or the queue closes, then peek()"""
+        with self.cond:
+            if not self.count and not self.closed:
+                self.cond.wait(timeout)
+            return None if self.closed else self.peek()
+
+    def advance(self, sent):
+        """Record that sent bytes of the head frame went out"""
+        with self.cond:
+            if sent:
+                self.last_progress = time.monotonic()
+            self.bytes -= sent
+            self.offset += sent
+            if self.offset >= self.lengths[self.head]:
+                self.head = (self.head + 1) % len(self.slots)
+                self.count -= 1
+                self.offset = 0
+            self.busy = self.offset > 0
+
+    def write_to(self, sock):
+        """Send as much as a non-blocking socket takes; returns bytes sent"""
+        total = 0
+        while True:
+            view = self.peek()
+            if view is None:
+                return total
+            size = len(view)
+            try:
+                sent = sock.send(view)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            finally:
+                view.release()
+            self.advance(sent)
+            total += sent
+            if sent < size:
+                return total
+
+    def drain(self, sock):
+        """Sender thread body: write frames to a blocking socket as they are queued until close()"""
+        while not self.closed:
+            view = self.wait(timeout=1.0)
+            if view is None:
+                continue
+            try:
+                sent = sock.send(view)
+            finally:
+                view.release()
+            self.advance(sent)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class SlowConsumerPolicy:
+    """Flags listeners that persistently cannot keep up with their stream.
+
+    Every `window` seconds a queue that had to drop more than
+    `max_drop_ratio` of the frames offered to it takes a strike; a clean
+    window clears them. `strikes` strikes in a row return DEGRADE, after
+    which the count starts over, so a listener that stays slow is degraded
+    again or, once the server has nothing cheaper to send, evicted. A queue
+    holding data that made no progress for `stall_timeout` seconds means a
+    dead or wedged connection and returns EVICT straight away.
+    """
+
+    def __init__(self, window=1.0, max_drop_ratio=0.05, strikes=3, stall_timeout=5.0):
+        self.window = window
+        self.max_drop_ratio = max_drop_ratio
+        self.strikes = strikes
+        self.stall_timeout = stall_timeout
+
+    def assess(self, queue, now=None):
+        """Return None, DEGRADE or EVICT for one listener's queue"""
+        now = time.monotonic() if now is None else now
+        if queue.count and now - queue.last_progress > self.stall_timeout:
+            return EVICT
+        if now - queue.window_start < self.window:
+            return None
+        offered = queue.offered - queue.window_offered
+        dropped = queue.dropped - queue.window_dropped
+        queue.window_start, queue.window_offered, queue.window_dropped = now, queue.offered, queue.dropped
+        if offered and dropped / offered > self.max_drop_ratio:
+            queue.strikes += 1
+        else:
+            queue.strikes = 0
+        if queue.strikes >= self.strikes:
+            queue.strikes = 0
+            return DEGRADE
+        return None
@@ -1,15 +1,23 @@
 import socket
 import threading
 import numpy as np
-from collections import deque
 import time
 import json
 import netifaces
 import wave
-import os
+
+import framing
+from audio_codecs import CODEC_IDS, cheaper_codec, create_codec, negotiate
+from frame_ring import FrameRing
+from level_meter import LevelMeter
+from metrics import MIX_BUCKETS, MetricsRegistry, MetricsServer, family
+from send_queue import DEGRADE, EVICT, SendQueue, SlowConsumerPolicy
 
 class AudioServer:
-    def __init__(self, channels=1, buffer_size=1024, discovery_port=65431):
+    MAX_PENDING_FRAMES = 8  # per-client send queue; older mixes are dropped beyond this
+    SEND_BUFFER = 64 * 1024  # cap the kernel's share of that backlog too
+
+    def __init__(self, channels=1, buffer_size=1024, discovery_port=65431, metrics_port=9464):
         self.channels = channels
         self.buffer_size = buffer_size
         self.discovery_port = discovery_port
@@ -17,8 +25,9 @@ class AudioServer:
         self.clients = {}
         self.running = True
         
-        # Add audio level monitoring
-        self.audio_levels = {}
+        # Audio levels are metered on demand from each client's latest frame
+        self.levels = LevelMeter()
+        self.slow_consumers = SlowConsumerPolicy()
         
         self.host = self.get_local_ip()
         print(f"\n=== Audio Server ===")
@@ -31,9 +40,19 @@ class AudioServer:
         self.discovery_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.discovery_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
         
-        # Start status display thread
-        self.status_thread = threading.Thread(target=self.display_status, daemon=True)
-        self.status_thread.start()
+        # Metrics endpoint; the console dashboard (status_console.py) reads it
+        self.metrics_port = metrics_port
+        self.metrics = MetricsRegistry()
+        self.frames_in = self.metrics.counter('sonapp_frames_received_total', "Frames received from clients", ('type',))
+        self.frames_out = self.metrics.counter('sonapp_frames_sent_total', "Frames sent to clients", ('type',))
+        self.bytes_in = self.metrics.counter('sonapp_bytes_received_total', "Frame bytes received from clients")
+        self.bytes_out = self.metrics.counter('sonapp_bytes_sent_total', "Frame bytes sent to clients")
+        self.mix_seconds = self.metrics.histogram('sonapp_mix_seconds', "Time to mix one packet", MIX_BUCKETS)
+        self.send_drops = self.metrics.counter('sonapp_frames_dropped_total', "Outgoing frames dropped",
+                                               ('reason',)).labels('send_queue')
+        self.slow_actions = self.metrics.counter('sonapp_slow_consumers_total',
+                                                 "Clients degraded or evicted for not keeping up", ('action',))
+        self.metrics.add_collector(self.collect_metrics)
 
     def get_local_ip(self):
         try:
@@ -52,35 +71,23 @@ class AudioServer:
             print(f"Error getting IP address: {e}")
             return '127.0.0.1'
 
-    def calculate_audio_level(self, audio_data):
-        """Calculate RMS audio level in dB"""
-        try:
-            audio_array = np.frombuffer(audio_data, dtype=np.float32)
-            rms = np.sqrt(np.mean(np.square(audio_array)))
-            db = 20 * np.log10(rms) if rms > 0 else -100
-            return max(-100, db)  # Limit minimum to -100 dB
-        except:
-            return -100
-
-    def display_status(self):
-        """Display server status and audio levels"""
-        while self.running:
-            os.system('cls' if os.name == 'nt' else 'clear')
-            print("\n=== Audio Server Status ===")
-            print(f"Server IP: {self.host}:{self.stream_port}")
-            print(f"Connected clients: {len(self.clients)}")
-            print("\nAudio Levels:")
-            print("-" * 50)
-            
-            for client_id, client_data in self.clients.items():
-                address = client_data['address']
-                level = self.audio_levels.get(client_id, -100)
-                bars = '█' * int((level + 100) // 5)  # Convert dB to visual bars
-                print(f"{address[0]}:{address[1]}")
-                print(f"Level: {bars} {level:.1f} dB")
-                print("-" * 50)
-            
-            time.sleep(0.1)
+    def collect_metrics(self):
+        clients = list(self.clients.items())
+        latest = [(cid, data['latest']) for cid, data in clients if 'latest' in data]
+        if latest:
+            self.levels.update([cid for cid, _ in latest], np.stack([row for _, row in latest]))
+        levels = self.levels.levels()
+        labels = [({'channel': 'room', 'client': f"{data['address'][0]}:{data['address'][1]}"}, cid)
+                  for cid, data in clients]
+        return [
+            family('sonapp_clients', "Connected clients", 'gauge', [({}, len(clients))]),
+            family('sonapp_channels', "Active channels", 'gauge', [({}, 1 if clients else 0)]),
+            family('sonapp_channel_members', "Clients per channel", 'gauge', [({'channel': 'room'}, len(clients))]),
+            family('sonapp_client_level_dbfs', "Smoothed RMS level per client", 'gauge',
+                   [(label, levels.get(cid, (-100.0, -100.0))[0]) for label, cid in labels]),
+            family('sonapp_client_peak_dbfs', "Held peak level per client", 'gauge',
+                   [(label, levels.get(cid, (-100.0, -100.0))[1]) for label, cid in labels]),
+        ]
 
     def handle_discovery(self):
         self.discovery_socket.bind(('', self.discovery_port))
@@ -99,61 +106,114 @@ class AudioServer:
                 if self.running:
                     print(f"Discovery error: {e}")
 
-    def mix_audio(self, current_client_id):
-        mixed = np.zeros(self.buffer_size, dtype=np.float32)
+    def mix_audio(self, current_client_id, mixed):
+        """Mix everyone else's oldest frame into the caller's reusable output row"""
+        mixed.fill(0)
         active_clients = 0
         
         for client_id, client_data in self.clients.items():
             if client_id != current_client_id and client_data['buffer']:
-                try:
-                    audio_data = client_data['buffer'].popleft()
-                    audio_array = np.frombuffer(audio_data, dtype=np.float32)
-                    if len(audio_array) == self.buffer_size:
-                        mixed += audio_array
-                        active_clients += 1
-                except IndexError:
-                    continue
+                audio_array = client_data['buffer'].pop()
+                if audio_array is not None:
+                    mixed += audio_array
+                    active_clients += 1
         
         if active_clients > 0:
             mixed /= active_clients
-            mixed = np.clip(mixed, -1.0, 1.0)
+            np.clip(mixed, -1.0, 1.0, out=mixed)
             
-        return mixed.tobytes()
+        return mixed
 
     def handle_client(self, client_socket, client_address):
         client_id = id(client_socket)
+        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.SEND_BUFFER)
+        # Replies go out through a sender thread, so a client on a bad link stalls
+        # only their own queue and never this thread's reads of their audio
+        send_queue = SendQueue(self.MAX_PENDING_FRAMES)
         self.clients[client_id] = {
             'socket': client_socket,
             'address': client_address,
-            'buffer': deque(maxlen=5)
+            'buffer': FrameRing(5, self.buffer_size),
+            'send_queue': send_queue
         }
+        threading.Thread(target=self.sender_loop, args=(client_socket, send_queue), daemon=True).start()
+        reader = framing.FrameReader(client_socket)
+        codec = tx_codec = create_codec('f32')
+        offered = None
+        tx_seq = 0
+        # Reused for every packet: the mix and one outgoing frame, header then payload
+        mixed = np.zeros(self.buffer_size, dtype=np.float32)
+        tx_buffer = bytearray(framing.HEADER.size + framing.MAX_PAYLOAD)
+        tx_view = memoryview(tx_buffer)
         
         print(f"\nNew client connected: {client_address}")
         
         try:
             while self.running:
-                data = client_socket.recv(self.buffer_size * 4)
-                if not data:
+                frame = reader.read_frame()
+                if frame is None:
                     break
+                self.frames_in.labels(framing.TYPE_NAMES.get(frame.type, 'unknown')).inc()
+                self.bytes_in.inc(framing.HEADER.size + len(frame.payload))
+                if frame.type == framing.JOIN:
+                    # Single room: the channel is ignored, only the codec is negotiated
+                    offered = frame.json().get('codecs')
+                    codec = tx_codec = create_codec(negotiate(offered))
+                    send_queue.put(framing.pack_json(framing.CONTROL, {'op': 'joined', 'codec': codec.name}))
+                    continue
+                if frame.type != framing.AUDIO:
+                    continue
+                if len(frame.payload) == codec.payload_size(self.buffer_size):
+                    # Decoded straight into the ring; the level meter reads the row at scrape
+                    row = self.clients[client_id]['buffer'].put(codec.decode_into, frame.payload)
+                    self.clients[client_id]['latest'] = row
                 
-                # Update audio level for this client
-                self.audio_levels[client_id] = self.calculate_audio_level(data)
+                started = time.perf_counter()
+                self.mix_audio(client_id, mixed)
+                self.mix_seconds.observe(time.perf_counter() - started)
+                tx_seq += 1
+                length = tx_codec.encode_into(mixed, tx_view[framing.HEADER.size:])
+                size = framing.pack_header_into(tx_buffer, 0, framing.AUDIO, length, tx_seq, CODEC_IDS[tx_codec.name])
+                self.frames_out.labels('audio').inc()
+                self.bytes_out.inc(size)
+                if not send_queue.put(tx_view[:size]):
+                    self.send_drops.inc()
                 
-                self.clients[client_id]['buffer'].append(data)
-                mixed_audio = self.mix_audio(client_id)
-                client_socket.sendall(mixed_audio)
+                action = self.slow_consumers.assess(send_queue)
+                cheaper = cheaper_codec(offered, tx_codec.name) if action == DEGRADE else None
+                if cheaper is not None:
+                    # Frames carry their codec id, so the client follows the switch by itself
+                    tx_codec = create_codec(cheaper)
+                    self.slow_actions.labels(DEGRADE).inc()
+                    print(f"\nClient {client_address} is not keeping up, sending {cheaper}")
+                elif action is not None:
+                    self.slow_actions.labels(EVICT).inc()
+                    print(f"\nClient {client_address} evicted for not keeping up")
+                    break
                 
         except Exception as e:
             print(f"Error handling client {client_address}: {e}")
         finally:
             print(f"\nClient disconnected: {client_address}")
-            if client_id in self.audio_levels:
-                del self.audio_levels[client_id]
+            self.levels.remove(client_id)
             del self.clients[client_id]
+            send_queue.close()
+            try:
+                client_socket.shutdown(socket.SHUT_RDWR)  # wakes the sender if it is blocked in send()
+            except OSError:
+                pass
             client_socket.close()
 
+    def sender_loop(self, client_socket, send_queue):
+        try:
+            send_queue.drain(client_socket)
+        except OSError:
+            send_queue.close()  # the reader thread sees the broken socket and cleans up
+
     def start(self):
         try:
+            if self.metrics_port is not None:
+                MetricsServer(self.metrics, port=self.metrics_port).start()
             discovery_thread = threading.Thread(target=self.handle_discovery, daemon=True)
             discovery_thread.start()
             
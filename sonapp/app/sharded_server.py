@@ -0,0 +1,228 @@
+import json
+import multiprocessing
+import os
+import selectors
+import socket
+import time
+import zlib
+
+import framing
+from directory import RingSnapshot
+from event_server import EventLoopAudioServer
+from metrics import MetricsRegistry, MetricsServer, family, with_labels
+
+HANDOFF_MAX = 1 << 18  # join frame plus whatever the client sent right behind it
+
+
+def shard_for(channel_key, shards):
+    """Stable channel -> shard mapping, identical in every process"""
+    return zlib.crc32(channel_key.encode()) % shards
+
+
+class ShardWorker(EventLoopAudioServer):
+    """Mixing process that owns every channel hashed to its shard.
+
+    Client sockets arrive from the acceptor over a Unix datagram socket with
+    fd passing, together with the bytes the acceptor already read (the join
+    frame and anything behind it), and then run exactly as if accepted here.
+    Each worker has its own UDP media port and reports its channel and
+    client counts and summary metrics back to the acceptor once a second;
+    the detailed per-channel metrics are served on the worker's own port.
+    """
+
+    HANDOFF = 'handoff'
+
+    def __init__(self, index, handoff_socket, media_port, buffer_size=1024, sample_rate=48000,
+                 metrics_port=None):
+        super().__init__(buffer_size, sample_rate=sample_rate, metrics_port=metrics_port)
+        self.index = index
+        self.handoff_socket = handoff_socket
+        self.media_port = media_port
+        self.report_every = max(1, round(1 / self.clock.period))
+
+    def receive_handoff(self):
+        while True:
+            try:
+                data, fds, _, _ = socket.recv_fds(self.handoff_socket, HANDOFF_MAX, 1)
+            except (BlockingIOError, InterruptedError):
+                return
+            if not fds:
+                self.receive_ring(data)
+                continue
+            sock = socket.socket(fileno=fds[0])
+            try:
+                self.add_connection(sock, sock.getpeername(), data)
+            except (OSError, ValueError, framing.ProtocolError) as e:
+                print(f"[shard {self.index}] Handoff error: {e}")
+                self.pending.pop(sock, None)
+                sock.close()
+
+    def receive_ring(self, data):
+        """Adopt the acceptor's ring snapshot, so this shard hands over channels it no longer owns"""
+        try:
+            message = json.loads(data.decode())
+        except ValueError:
+            return
+        if message.get('op') == 'ring':
+            self.node_id = message['node']
+            self.ring = RingSnapshot(message['members'])
+
+    def dispatch(self, key, mask):
+        if key.data is self.HANDOFF:
+            self.receive_handoff()
+        else:
+            super().dispatch(key, mask)
+
+    def mix_tick(self):
+        super().mix_tick()
+        if self.clock.ticks % self.report_every == 0:
+            self.report()
+
+    def report(self):
+        status = {
+            'shard': self.index,
+            'pid': os.getpid(),
+            'channels': len(self.channels),
+            'clients': len(self.clients),
+            'clock': self.clock.stats(),
+            'metrics': self.metrics.families() + self.collect_metrics(detail=False),
+        }
+        try:
+            self.handoff_socket.send(json.dumps(status).encode())
+        except OSError:
+            pass
+
+    def start(self):
+        self.handoff_socket.setblocking(False)
+        self.selector.register(self.handoff_socket, selectors.EVENT_READ, self.HANDOFF)
+        self.register_media()
+        if self.metrics_port is not None:
+            MetricsServer(self.metrics, port=self.metrics_port).start()
+        print(f"[shard {self.index}] pid {os.getpid()} ready, media port {self.media_port}")
+        self.run_loop()
+
+
+def run_worker(index, handoff_socket, host, media_port, buffer_size, sample_rate, metrics_port):
+    worker = ShardWorker(index, handoff_socket, media_port, buffer_size, sample_rate, metrics_port)
+    worker.host = host
+    try:
+        worker.start()
+    except KeyboardInterrupt:
+        pass
+
+
+class ShardedAudioServer(EventLoopAudioServer):
+    """Front acceptor that spreads channels over worker processes.
+
+    The acceptor only reads each client's join frame, hashes its channel key
+    to a shard and hands the socket to that worker, so every member of a
+    channel is mixed in the same process while separate channels use
+    separate cores. Discovery runs here, and the metrics endpoint republishes
+    each worker's summary metrics with a shard label.
+    Requires a Unix platform for fd passing.
+    """
+
+    WORKER = 'worker'
+
+    def __init__(self, shards=None, buffer_size=1024, discovery_port=65431, sample_rate=48000, directory=None,
+                 metrics_port=9464, stream_port=65432):
+        super().__init__(buffer_size, discovery_port, sample_rate, directory, metrics_port, stream_port)
+        self.shards = shards or os.cpu_count() or 1
+        self.workers = []  # (process, handoff socket)
+        self.worker_status = {}  # shard -> last report
+        self.shared_ring = None  # ring snapshot last sent to the workers
+        # The acceptor mixes nothing, so its endpoint carries only the workers' reports
+        self.metrics = MetricsRegistry()
+        self.metrics.add_collector(self.collect_shard_metrics)
+
+    def spawn_workers(self):
+        for index in range(self.shards):
+            parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+            process = multiprocessing.Process(
+                target=run_worker,
+                args=(index, child, self.host, self.stream_port + 1 + index,
+                      self.buffer_size, self.sample_rate, self.worker_metrics_port(index)),
+                daemon=True
+            )
+            process.start()
+            child.close()
+            parent.setblocking(False)
+            self.selector.register(parent, selectors.EVENT_READ, self.WORKER)
+            self.workers.append((process, parent))
+
+    def worker_metrics_port(self, index):
+        return None if self.metrics_port is None else self.metrics_port + 1 + index
+
+    def admit(self, sock, conn, frame):
+        info = self.parse_join(frame)
+        self.selector.unregister(sock)
+        if info is None or self.redirect(sock, conn, info):
+            sock.close()
+            return
+
+        shard = shard_for(info['channel'], self.shards)
+        initial = framing.pack_frame(framing.JOIN, bytes(frame.payload), frame.seq,
+                                     frame.flags, frame.timestamp) + conn['reader'].pending()
+        try:
+            socket.send_fds(self.workers[shard][1], [initial], [sock.fileno()])
+        except OSError as e:
+            print(f"Handoff to shard {shard} failed: {e}")
+        sock.close()  # the worker holds its own duplicate of the descriptor
+
+    def mix_tick(self):
+        super().mix_tick()
+        if self.ring is not self.shared_ring and self.node_id is not None:
+            self.share_ring()
+
+    def share_ring(self):
+        """Send the workers the ring the heartbeat last fetched; members live there, not here"""
+        self.shared_ring = self.ring
+        message = json.dumps({'op': 'ring', 'node': self.node_id, 'members': self.ring.members}).encode()
+        for _, handoff_socket in self.workers:
+            try:
+                handoff_socket.send(message)
+            except OSError as e:
+                print(f"Ring update to a shard failed: {e}")
+
+    def read_reports(self, handoff_socket):
+        while True:
+            try:
+                data = handoff_socket.recv(HANDOFF_MAX)
+            except (BlockingIOError, InterruptedError):
+                return
+            status = json.loads(data.decode())
+            status['received'] = time.monotonic()
+            self.worker_status[status['shard']] = status
+
+    def dispatch(self, key, mask):
+        if key.data is self.WORKER:
+            self.read_reports(key.fileobj)
+        else:
+            super().dispatch(key, mask)
+
+    def collect_shard_metrics(self):
+        families = []
+        now = time.monotonic()
+        for shard, status in sorted(self.worker_status.items()):
+            families.extend(with_labels(status['metrics'], shard=str(shard)))
+            families.append(family('sonapp_shard_report_age_seconds', "Seconds since the shard last reported",
+                                   'gauge', [({'shard': str(shard)}, now - status['received'])]))
+        return families
+
+    def start(self):
+        self.spawn_workers()
+        super().start()
+
+    def stop(self):
+        super().stop()
+        for process, handoff_socket in self.workers:
+            handoff_socket.close()
+            process.terminate()
+
+
+if __name__ == "__main__":
+    server = ShardedAudioServer()
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,48 @@
+import numpy as np
+
+
+class SpscRing:
+    """Single-producer/single-consumer ring of fixed-size audio frames.
+
+    Sits between a PortAudio callback and a network thread. Frames live in
+    one preallocated (capacity, frame_size) array and are copied in and
+    out, so neither side allocates or takes a lock: `tail` is only advanced
+    by the producer after its row is written and `head` only by the
+    consumer after its row is read, and each is a single attribute store.
+    The counters are unbounded ints, so full and empty never look alike.
+
+    push() on a full ring drops the new frame and counts an overrun; pop()
+    on an empty ring counts an underrun. A consumer that polls should check
+    len() first so an idle wait is not counted as a starved read.
+    """
+
+    def __init__(self, capacity, frame_size, dtype=np.float32):
+        self.capacity = capacity
+        self.frame_size = frame_size
+        self.frames = np.zeros((capacity, frame_size), dtype=dtype)
+        self.rows = list(self.frames)
+        self.head = 0  # frames read so far; written only by the consumer
+        self.tail = 0  # frames written so far; written only by the producer
+        self.overruns = 0
+        self.underruns = 0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def push(self, samples):
+        """Copy one frame in; returns False, dropping it, when the ring is full"""
+        if self.tail - self.head >= self.capacity:
+            self.overruns += 1
+            return False
+        self.rows[self.tail % self.capacity][:] = samples
+        self.tail += 1
+        return True
+
+    def pop(self, out):
+        """Copy the oldest frame into out; returns False, leaving out untouched, when empty"""
+        if self.tail == self.head:
+            self.underruns += 1
+            return False
+        out[:] = self.rows[self.head % self.capacity]
+        self.head += 1
+        return True
@@ -0,0 +1,120 @@
+import argparse
+import time
+import urllib.request
+
+from metrics import parse_text
+
+CLEAR = '\033[H\033[J'  # ANSI home + clear; no shell fork per refresh
+
+
+def fetch(url, timeout=2):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return parse_text(response.read().decode())
+
+
+def total(metrics, name, **match):
+    return sum(value for labels, value in metrics.get(name, [])
+               if all(labels.get(k) == v for k, v in match.items()))
+
+
+def histogram_quantile(metrics, name, quantile, previous=None):
+    """Upper bucket bound holding the quantile, over the interval since `previous`"""
+    buckets = {}
+    for labels, value in metrics.get(name + '_bucket', []):
+        buckets[labels['le']] = buckets.get(labels['le'], 0) + value
+    if previous is not None:
+        for labels, value in previous.get(name + '_bucket', []):
+            buckets[labels['le']] = buckets.get(labels['le'], 0) - value
+    ordered = sorted(buckets.items(), key=lambda item: float(item[0]))
+    if not ordered or ordered[-1][1] <= 0:
+        return None
+    target = quantile * ordered[-1][1]
+    for bound, count in ordered:
+        if count >= target:
+            return float(bound)
+    return None
+
+
+def render(metrics, previous, elapsed, url):
+    lines = ["=== Audio Server Status ===", f"Source: {url}"]
+    lines.append(f"Clients: {total(metrics, 'sonapp_clients'):.0f} | "
+                 f"Channels: {total(metrics, 'sonapp_channels'):.0f}")
+
+    if previous is not None and elapsed > 0:
+        def rate(name, **match):
+            return (total(metrics, name, **match) - total(previous, name, **match)) / elapsed
+        lines.append(f"In: {rate('sonapp_frames_received_total'):.0f} frames/s, "
+                     f"{rate('sonapp_bytes_received_total') * 8 / 1000:.0f} kbit/s | "
+                     f"Out: {rate('sonapp_frames_sent_total'):.0f} frames/s, "
+                     f"{rate('sonapp_bytes_sent_total') * 8 / 1000:.0f} kbit/s")
+        ticks = total(metrics, 'sonapp_mix_seconds_count') - total(previous, 'sonapp_mix_seconds_count')
+        if ticks > 0:
+            mean = (total(metrics, 'sonapp_mix_seconds_sum') - total(previous, 'sonapp_mix_seconds_sum')) / ticks
+            p99 = histogram_quantile(metrics, 'sonapp_mix_seconds', 0.99, previous)
+            p99_text = f"{p99 * 1000:.2f} ms" if p99 is not None and p99 != float('inf') else "> max bucket"
+            lines.append(f"Mix: {mean * 1000:.3f} ms mean, p99 <= {p99_text} | "
+                         f"missed ticks: {total(metrics, 'sonapp_mix_ticks_missed_total'):.0f} | "
+                         f"clock jitter: {total(metrics, 'sonapp_mix_clock_jitter_seconds') * 1000:.2f} ms")
+
+    events = {labels['event']: 0 for labels, _ in metrics.get('sonapp_jitter_buffer_events_total', [])}
+    for event in events:
+        events[event] = total(metrics, 'sonapp_jitter_buffer_events_total', event=event)
+    if events:
+        lines.append("Jitter buffers: " + " | ".join(f"{event} {count:.0f}" for event, count in events.items()) +
+                     f" | send drops {total(metrics, 'sonapp_frames_dropped_total'):.0f}"
+                     f" | slow listeners degraded {total(metrics, 'sonapp_slow_consumers_total', action='degrade'):.0f}"
+                     f", evicted {total(metrics, 'sonapp_slow_consumers_total', action='evict'):.0f}")
+
+    shards = sorted({labels['shard'] for labels, _ in metrics.get('sonapp_shard_report_age_seconds', [])}, key=int)
+    for shard in shards:
+        lines.append(f"Shard {shard} | channels: {total(metrics, 'sonapp_channels', shard=shard):.0f} | "
+                     f"clients: {total(metrics, 'sonapp_clients', shard=shard):.0f} | "
+                     f"missed ticks: {total(metrics, 'sonapp_mix_ticks_missed_total', shard=shard):.0f} | "
+                     f"report age: {total(metrics, 'sonapp_shard_report_age_seconds', shard=shard):.1f} s")
+
+    clients = {}
+    for name, key in (('sonapp_client_level_dbfs', 'level'), ('sonapp_client_peak_dbfs', 'peak'),
+                      ('sonapp_client_talking', 'talking'), ('sonapp_client_jitter_buffer_frames', 'depth')):
+        for labels, value in metrics.get(name, []):
+            clients.setdefault((labels['channel'], labels['client']), {})[key] = value
+    for labels, members in sorted(metrics.get('sonapp_channel_members', []), key=lambda item: item[0]['channel']):
+        channel = labels['channel']
+        lines.append(f"\nChannel: {channel} ({members:.0f} clients)")
+        lines.append("-" * 50)
+        for (client_channel, client), state in sorted(clients.items()):
+            if client_channel != channel:
+                continue
+            level = state.get('level', -100.0)
+            bars = '█' * int((level + 100) // 5)
+            talking = (' | talking' if state['talking'] else ' | silent') if 'talking' in state else ''
+            depth = f" | jitter buffer {state['depth']:.0f}" if 'depth' in state else ''
+            peak = f" (peak {state['peak']:.1f})" if 'peak' in state else ''
+            lines.append(f"{client} | Level: {bars} {level:.1f} dB{peak}{talking}{depth}")
+    return '\n'.join(lines)
+
+
+def run(url, interval):
+    previous, previous_time = None, None
+    while True:
+        try:
+            metrics = fetch(url)
+        except OSError as e:
+            print(f"{CLEAR}Waiting for {url}: {e}", flush=True)
+            time.sleep(interval)
+            continue
+        now = time.monotonic()
+        elapsed = now - previous_time if previous_time is not None else 0
+        print(CLEAR + render(metrics, previous, elapsed, url), flush=True)
+        previous, previous_time = metrics, now
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Console dashboard for a voice server's metrics endpoint")
+    parser.add_argument('--url', default='http://127.0.0.1:9464/metrics')
+    parser.add_argument('--interval', type=float, default=1.0)
+    args = parser.parse_args()
+    try:
+        run(args.url, args.interval)
+    except KeyboardInterrupt:
+        pass
@@ -1,22 +1,57 @@
 import socket
 import threading
-import numpy as np
-from collections import deque, defaultdict
+from collections import defaultdict
 import time
 import json
 import netifaces
-import os
+import secrets
+
+import framing
+from audio_codecs import CODEC_IDS, cheaper_codec, create_codec, negotiate
+from channel_mixer import ChannelMixer
+from directory import RingSnapshot
+from jitter_buffer import SILENCE, LockedJitterBuffer
+from level_meter import LevelMeter
+from metrics import MIX_BUCKETS, MetricsRegistry, MetricsServer, family
+from mix_clock import MixClock
+from presence import PresenceService
+from resampler import FrameResampler, ResampledSource
+from send_queue import DEGRADE, EVICT, SendQueue, SlowConsumerPolicy
+
+def is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
 
 class CentralAudioServer:
-    def __init__(self, buffer_size=1024, discovery_port=65431):
+    HEARTBEAT_INTERVAL = 5
+    MAX_PENDING_FRAMES = 8  # per-listener send queue; older mixes are dropped beyond this
+    # Kernel send buffer per listener. Left to autotune it grows to megabytes,
+    # i.e. seconds of stale audio queued where drop-oldest cannot reach it.
+    SEND_BUFFER = 64 * 1024
+    JITTER_EVENTS = ('late', 'lost', 'duplicated', 'dropped', 'underruns')
+    # Accepted client rates, the standard ones only so the polyphase banks stay few;
+    # the mix runs at self.sample_rate
+    SAMPLE_RATES = (8000, 11025, 16000, 22050, 24000, 32000, 44100, 48000, 88200, 96000, 176400, 192000)
+    FRAME_SIZES = range(64, framing.MAX_PAYLOAD // 4 + 1)  # an f32 frame must fit one payload
+    # Client and media threads put while the mix thread pops
+    JITTER_BUFFER = LockedJitterBuffer
+
+    def __init__(self, buffer_size=1024, discovery_port=65431, sample_rate=48000, directory=None,
+                 metrics_port=9464, stream_port=65432):
         self.buffer_size = buffer_size
+        self.sample_rate = sample_rate
         self.discovery_port = discovery_port
-        self.stream_port = 65432
+        self.stream_port = stream_port
         self.running = True
 
         self.clients = {}  # client_id -> client_data
         self.channels = defaultdict(dict)  # channel_key -> {client_id: client_data}
-        self.audio_levels = {}
+        self.mixers = {}  # channel_key -> ChannelMixer
+        self.levels = LevelMeter()  # fed per channel from the mixer's frame matrix
+        self.clock = MixClock(buffer_size, sample_rate)
+        self.slow_consumers = SlowConsumerPolicy()
+        self.next_review = 0.0
+        self.presence = PresenceService()  # app users online, queried by clients on the discovery port
 
         self.host = self.get_local_ip()
         print(f"\n=== Central Audio Server ===")
@@ -29,8 +64,98 @@ class CentralAudioServer:
         self.discovery_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.discovery_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
 
-        threading.Thread(target=self.display_status, daemon=True).start()
+        # Optional UDP media path on the stream port; TCP stays the control channel
+        self.media_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.media_buffer = bytearray(framing.MAX_DATAGRAM)
+        self.media_view = memoryview(self.media_buffer)
+        self.media_port = None  # defaults to stream_port at start
+        self.media_tokens = {}  # token -> client_id
+
+        # Outgoing audio is built in place, media token then header then payload, and
+        # sent as a memoryview; only the mix thread or event loop writes these
+        self.tx_buffer = bytearray(framing.MAX_DATAGRAM)
+        self.tx_view = memoryview(self.tx_buffer)
+        self.shared_payloads = {}  # codec name -> slab for a channel's shared mix, encoded once
+
+        # Cluster mode: a DirectoryService/DirectoryClient decides which node owns a channel
+        self.directory = directory
+        self.node_id = None
+        self.ring = RingSnapshot()  # replaced whole by the heartbeat thread; joins only read it
+
+        # Hot-path metrics are bare counters; everything else is read at scrape time
+        self.metrics_port = metrics_port
+        self.metrics = MetricsRegistry()
+        received = self.metrics.counter('sonapp_frames_received_total', "Frames received from clients", ('type',))
+        sent = self.metrics.counter('sonapp_frames_sent_total', "Frames sent to clients", ('type',))
+        self.frames_in = {t: received.labels(name) for t, name in framing.TYPE_NAMES.items()}
+        self.frames_out = {t: sent.labels(name) for t, name in framing.TYPE_NAMES.items()}
+        self.bytes_in = self.metrics.counter('sonapp_bytes_received_total', "Frame bytes received from clients")
+        self.bytes_out = self.metrics.counter('sonapp_bytes_sent_total', "Frame bytes sent to clients")
+        self.dropped = self.metrics.counter('sonapp_frames_dropped_total', "Outgoing frames dropped", ('reason',))
+        self.send_drops = self.dropped.labels('send_queue')
+        self.slow_actions = self.metrics.counter('sonapp_slow_consumers_total',
+                                                 "Listeners degraded or evicted for not keeping up", ('action',))
+        self.mix_seconds = self.metrics.histogram('sonapp_mix_seconds', "Time to mix and send one tick", MIX_BUCKETS)
+        self.jitter_retired = dict.fromkeys(self.JITTER_EVENTS, 0)  # totals of clients that left
+        self.metrics.add_collector(self.collect_metrics)
+
+    def start_services(self):
+        if self.metrics_port is not None:
+            MetricsServer(self.metrics, port=self.metrics_port).start()
+            print(f"Metrics on http://127.0.0.1:{self.metrics_port}/metrics")
         threading.Thread(target=self.handle_discovery, daemon=True).start()
+        if self.directory is not None:
+            self.node_id = self.node_id or f"{self.host}:{self.stream_port}"
+            threading.Thread(target=self.heartbeat_loop, daemon=True).start()
+
+    def heartbeat_loop(self):
+        while self.running:
+            try:
+                self.directory.register(self.node_id, self.host, self.stream_port)
+                members = self.directory.members()
+                if members != self.ring.members:
+                    self.ring = RingSnapshot(members)
+            except Exception as e:
+                print(f"Directory heartbeat failed: {e}")
+            time.sleep(self.HEARTBEAT_INTERVAL)
+
+    def route(self, channel_key):
+        """Return the owning node when another cluster node should host this channel.
+
+        Reads the ring snapshot the heartbeat keeps, so a join never waits on
+        the directory.
+        """
+        if self.node_id is None:
+            return None
+        owner = self.ring.lookup(channel_key)
+        if owner is None or owner['node'] == self.node_id:
+            return None
+        return owner
+
+    def rehome_channels(self):
+        """Redirect every member of a channel this node no longer owns, all together.
+
+        When a node joins the ring it takes over about 1/N of the channels.
+        Their members here are told to rejoin at the new owner, where
+        latecomers are already being sent, so a team is never left split.
+        """
+        for channel_key, members in list(self.channels.items()):
+            owner = self.route(channel_key)
+            if owner is None:
+                continue
+            print(f"[>] channel {channel_key} moves to {owner['host']}:{owner['port']}")
+            for client_data in list(members.values()):
+                self.send_control(client_data, {'op': 'redirect', 'channel': channel_key,
+                                                'host': owner['host'], 'port': owner['port']})
+
+    def redirect_frame(self, channel_key, owner):
+        return framing.pack_json(framing.CONTROL, {'op': 'redirect', 'channel': channel_key,
+                                                   'host': owner['host'], 'port': owner['port']})
+
+    def bind_media(self):
+        if self.media_port is None:
+            self.media_port = self.stream_port
+        self.media_socket.bind((self.host, self.media_port))
 
     def get_local_ip(self):
         try:
@@ -47,31 +172,59 @@ class CentralAudioServer:
         except:
             return '127.0.0.1'
 
-    def calculate_audio_level(self, audio_data):
-        try:
-            audio_array = np.frombuffer(audio_data, dtype=np.float32)
-            rms = np.sqrt(np.mean(np.square(audio_array)))
-            db = 20 * np.log10(rms) if rms > 0 else -100
-            return max(-100, db)
-        except:
-            return -100
+    def collect_metrics(self, detail=True):
+        """Scrape-time view of server state, read from snapshots of the live dicts.
 
-    def display_status(self):
-        while self.running:
-            os.system('cls' if os.name == 'nt' else 'clear')
-            print("\n=== Central Audio Server Status ===")
-            print(f"Server IP: {self.host}:{self.stream_port}")
-            print(f"Channels: {len(self.channels)}")
-
-            for channel, members in self.channels.items():
-                print(f"\nChannel: {channel} ({len(members)} clients)")
-                print("-" * 50)
-                for client_id, client_data in members.items():
-                    address = client_data['address']
-                    level = self.audio_levels.get(client_id, -100)
-                    bars = '█' * int((level + 100) // 5)
-                    print(f"{address[0]}:{address[1]} | Level: {bars} {level:.1f} dB")
-            time.sleep(0.5)
+        With detail=False the per-channel and per-client series are left out,
+        which keeps shard reports small.
+        """
+        clients = list(self.clients.items())
+        levels = self.levels.levels() if detail else {}
+        clock = self.clock.stats()
+        jitter = dict(self.jitter_retired)
+        depth = 0
+        for _, client_data in clients:
+            stats = client_data['buffer'].stats()
+            depth += stats['depth']
+            for event in self.JITTER_EVENTS:
+                jitter[event] += stats[event]
+
+        families = [
+            family('sonapp_clients', "Connected clients", 'gauge', [({}, len(clients))]),
+            family('sonapp_channels', "Active channels", 'gauge', [({}, len(self.channels))]),
+            family('sonapp_presence_online', "App users with a live presence heartbeat", 'gauge',
+                   [({}, len(self.presence))]),
+            family('sonapp_mix_ticks_total', "Mix clock ticks", 'counter', [({}, clock['ticks'])]),
+            family('sonapp_mix_ticks_missed_total', "Mix periods skipped because a tick ran late", 'counter',
+                   [({}, clock['missed'])]),
+            family('sonapp_mix_clock_jitter_seconds', "Smoothed deviation of the tick interval", 'gauge',
+                   [({}, clock['jitter_ms'] / 1000)]),
+            family('sonapp_mix_max_lateness_seconds', "Latest a tick has fired after its deadline", 'gauge',
+                   [({}, clock['max_lateness_ms'] / 1000)]),
+            family('sonapp_jitter_buffer_frames', "Frames queued in all jitter buffers", 'gauge', [({}, depth)]),
+            family('sonapp_jitter_buffer_events_total', "Jitter buffer late, lost, duplicate and dropped frames",
+                   'counter', [({'event': event}, count) for event, count in jitter.items()]),
+        ]
+        if detail:
+            families.append(family('sonapp_channel_members', "Clients per channel", 'gauge',
+                                   [({'channel': channel}, len(members))
+                                    for channel, members in list(self.channels.items())]))
+            client_labels = [({'channel': client_data['channel'],
+                               'client': f"{client_data['address'][0]}:{client_data['address'][1]}"},
+                              client_id, client_data) for client_id, client_data in clients]
+            families.extend([
+                family('sonapp_client_level_dbfs', "Smoothed RMS level per client", 'gauge',
+                       [(labels, levels.get(cid, (-100.0, -100.0))[0]) for labels, cid, _ in client_labels]),
+                family('sonapp_client_peak_dbfs', "Held peak level per client", 'gauge',
+                       [(labels, levels.get(cid, (-100.0, -100.0))[1]) for labels, cid, _ in client_labels]),
+                family('sonapp_client_talking', "1 while the client is in a talk spurt", 'gauge',
+                       [(labels, int(data['talking'])) for labels, _, data in client_labels]),
+                family('sonapp_client_gated', "1 while the client has muted or released push-to-talk", 'gauge',
+                       [(labels, int(data['gated'])) for labels, _, data in client_labels]),
+                family('sonapp_client_jitter_buffer_frames', "Frames queued per client", 'gauge',
+                       [(labels, data['buffer'].depth()) for labels, _, data in client_labels]),
+            ])
+        return families
 
     def handle_discovery(self):
         self.discovery_socket.bind(('', self.discovery_port))
@@ -79,83 +232,415 @@ class CentralAudioServer:
 
         while self.running:
             try:
-                _, client_address = self.discovery_socket.recvfrom(1024)
+                request, client_address = self.discovery_socket.recvfrom(4096)
+                message = json.loads(request.decode()) if request else {}
+                if str(message.get('op', '')).startswith('presence_'):
+                    reply = self.handle_presence(message, client_address)
+                    self.discovery_socket.sendto(json.dumps(reply).encode(), client_address)
+                    continue
                 info = {'host': self.host, 'port': self.stream_port}
+                channel_key = message.get('channel')
+                owner = self.route(channel_key) if channel_key else None
+                if owner is not None:
+                    info = {'host': owner['host'], 'port': owner['port']}
                 self.discovery_socket.sendto(json.dumps(info).encode(), client_address)
             except:
                 pass
 
-    def mix_audio(self, channel_key, current_client_id):
-        mixed = np.zeros(self.buffer_size, dtype=np.float32)
-        active_clients = 0
-        for cid, cdata in self.channels[channel_key].items():
-            if cid != current_client_id and cdata['buffer']:
-                try:
-                    audio_data = cdata['buffer'].popleft()
-                    audio_array = np.frombuffer(audio_data, dtype=np.float32)
-                    if len(audio_array) == self.buffer_size:
-                        mixed += audio_array
-                        active_clients += 1
-                except IndexError:
+    def handle_presence(self, request, address):
+        op = request.get('op')
+        if op == 'presence_heartbeat':
+            return {'ok': self.presence.heartbeat(request['ids'], source=address[0])}
+        if op == 'presence_leave':
+            return {'ok': self.presence.leave(request['ids'], source=address[0])}
+        if op == 'presence_query':
+            return {'online': self.presence.online(request['participants'])}
+        return {'error': f"unknown op {op!r}"}
+
+    def mix_channel(self, channel_key):
+        """Pull one frame per talking contributor and mix the channel.
+
+        Returns ({speaker_id: mix}, shared_mix, listener_ids): speakers hear
+        everyone but themselves and silent members share one mix. Nobody is
+        returned when there is nothing to hear.
+        """
+        members = list(self.channels.get(channel_key, {}).items())
+        mixer = self.mixers.get(channel_key)
+        if not members or mixer is None:
+            return {}, None, []
+        frames = mixer.load(len(members))
+        speakers = []
+        listeners = []
+        for cid, cdata in members:
+            if cdata['gated']:
+                # Muted or released push-to-talk: out of the mix now, not after the buffer drains
+                # A resampled source holds a partial frame and filter history of its own
+                if len(cdata['buffer']) or cdata['source'] is not cdata['buffer']:
+                    cdata['source'].reset()
+                cdata['talking'] = False
+                listeners.append(cid)
+                continue
+            audio_array = cdata['source'].pop()
+            if audio_array is SILENCE:
+                cdata['talking'] = False
+            if audio_array is None or audio_array is SILENCE:
+                listeners.append(cid)
+                continue
+            cdata['talking'] = True
+            frames[len(speakers)] = audio_array
+            speakers.append(cid)
+
+        if not speakers:
+            return {}, None, []
+        self.levels.update(speakers, frames[:len(speakers)])
+        own, shared = mixer.mix(len(speakers))
+        own_mixes = {cid: own[i] for i, cid in enumerate(speakers)} if len(speakers) > 1 else {}
+        return own_mixes, shared, listeners
+
+    def mix_tick(self):
+        started = time.perf_counter()
+        frames = sent = 0
+        for channel_key in list(self.channels):
+            own_mixes, shared, listeners = self.mix_channel(channel_key)
+            for cid, mixed in own_mixes.items():
+                size = self.send_audio(cid, mixed)
+                frames += size > 0
+                sent += size
+            encoded = {}  # stateless codecs encode the shared mix once per channel
+            for cid in listeners:
+                size = self.send_audio(cid, shared, encoded)
+                frames += size > 0
+                sent += size
+        # Counted once per tick so instrumentation stays negligible next to mixing
+        self.frames_out[framing.AUDIO].inc(frames)
+        self.bytes_out.inc(sent)
+        self.mix_seconds.observe(time.perf_counter() - started)
+        if started >= self.next_review:
+            self.next_review = started + self.slow_consumers.window
+            self.review_listeners()
+            self.rehome_channels()
+
+    def review_listeners(self):
+        """Degrade, or failing that evict, listeners whose send queues keep overflowing"""
+        now = time.monotonic()
+        for client_data in list(self.clients.values()):
+            action = self.slow_consumers.assess(client_data['send_queue'], now)
+            if action == DEGRADE and self.degrade(client_data):
+                continue
+            if action is not None:
+                self.evict(client_data)
+
+    def degrade(self, client_data):
+        """Step a slow listener's downstream down to the next cheaper codec they offered.
+
+        Every audio frame names its codec in the header flags, so the client
+        follows the switch on the first frame it receives in the new format.
+        """
+        name = cheaper_codec(client_data['offered'], client_data['tx_codec'].name)
+        if name is None:
+            return False
+        print(f"[!] {client_data['address']} is not keeping up, sending {name}")
+        client_data['tx_codec'] = create_codec(name)
+        self.slow_actions.labels(DEGRADE).inc()
+        return True
+
+    def evict(self, client_data):
+        print(f"[!] {client_data['address']} evicted for not keeping up")
+        self.slow_actions.labels(EVICT).inc()
+        client_data['send_queue'].close()
+        try:
+            client_data['socket'].shutdown(socket.SHUT_RDWR)  # also wakes a sender blocked in send()
+        except OSError:
+            pass
+        self.remove_client(client_data['id'])
+
+    def send_audio(self, client_id, samples, encoded=None):
+        """Send one mix to a client; returns the bytes sent.
+
+        Clients at the mix rate and frame size get one frame per tick. Anyone
+        else gets their own resampled stream, framed at their size, so a tick
+        may send them no frame or two.
+        """
+        client_data = self.clients.get(client_id)
+        if client_data is None:
+            return 0
+        downstream = client_data['downstream']
+        if downstream is None:
+            return self.send_frame(client_data, samples, encoded)
+        downstream.push(samples)
+        sent = 0
+        while downstream.ready():
+            sent += self.send_frame(client_data, downstream.pull())
+        return sent
+
+    def send_frame(self, client_data, samples, encoded=None):
+        """Encode one frame into the transmit slab and send it; returns the frame size in bytes"""
+        codec = client_data['tx_codec']
+        start = framing.TOKEN.size  # room for the media token ahead of the frame
+        payload = self.tx_view[start + framing.HEADER.size:]
+        if encoded is None or codec.stateful:
+            length = codec.encode_into(samples, payload)
+        else:
+            shared = encoded.get(codec.name)
+            if shared is None:
+                slab = self.shared_payloads.get(codec.name)
+                if slab is None:
+                    slab = self.shared_payloads[codec.name] = memoryview(bytearray(framing.MAX_PAYLOAD))
+                shared = encoded[codec.name] = slab[:codec.encode_into(samples, slab)]
+            length = len(shared)
+            payload[:length] = shared
+        client_data['tx_seq'] += 1
+        end = start + framing.pack_header_into(self.tx_buffer, start, framing.AUDIO, length, client_data['tx_seq'],
+                                               CODEC_IDS[codec.name])
+        if client_data['udp_addr'] is not None:
+            framing.TOKEN.pack_into(self.tx_buffer, 0, client_data['token'])
+            self.send_datagram(client_data, self.tx_view[:end])
+        else:
+            self.send_mix(client_data, self.tx_view[start:end])
+        return end - start
+
+    def send_mix(self, client_data, frame):
+        """Queue a frame for the listener's sender thread; a full queue drops its oldest frame"""
+        if not client_data['send_queue'].put(frame):
+            self.send_drops.inc()
+
+    def sender_loop(self, client_data):
+        """Drain one listener's send queue so a slow socket only ever blocks this thread"""
+        try:
+            client_data['send_queue'].drain(client_data['socket'])
+        except OSError as e:
+            if not client_data['send_queue'].closed:
+                print(f"Send error {client_data['address']}: {e}")
+                self.remove_client(client_data['id'])
+
+    def send_datagram(self, client_data, datagram):
+        try:
+            self.media_socket.sendto(datagram, client_data['udp_addr'])
+        except OSError:
+            pass  # datagrams are best effort; a full send buffer is just loss
+
+    def handle_datagram(self, size, address):
+        try:
+            token, frame = framing.parse_datagram(self.media_view, size)
+        except framing.ProtocolError:
+            return
+        client_id = self.media_tokens.get(token)
+        client_data = self.clients.get(client_id)
+        if client_data is None:
+            return
+        # Follow the latest source address so NAT rebinding does not strand the client
+        client_data['udp_addr'] = address
+        if frame.type == framing.KEEPALIVE:
+            self.frames_in[framing.KEEPALIVE].inc()
+            self.send_datagram(client_data, framing.pack_datagram(client_data['token'],
+                                                                  framing.pack_frame(framing.KEEPALIVE)))
+        else:
+            self.handle_frame(client_id, frame)
+
+    def handle_media(self):
+        while self.running:
+            try:
+                size, address = self.media_socket.recvfrom_into(self.media_buffer)
+            except OSError:
+                if self.running:
                     continue
-        if active_clients > 0:
-            mixed /= active_clients
-            mixed = np.clip(mixed, -1.0, 1.0)
-        return mixed.tobytes()
+                return
+            self.handle_datagram(size, address)
+
+    def mix_loop(self):
+        self.clock.start()
+        while self.running:
+            self.clock.wait()
+            try:
+                self.mix_tick()
+            except Exception as e:
+                print(f"Mix error: {e}")
+
+    def parse_join(self, frame):
+        if frame is None or frame.type != framing.JOIN:
+            print("Rejected client without a join frame")
+            return None
+        try:
+            info = frame.json()
+        except ValueError:
+            print("Failed to parse client join")
+            return None
+        if not isinstance(info, dict):
+            print("Rejected client with a malformed join")
+            return None
+        if not isinstance(info.get('channel'), str) or not info['channel']:
+            print("Rejected client with no channel info")
+            return None
+        codecs = info.get('codecs')
+        if codecs is not None and not (isinstance(codecs, list) and all(isinstance(c, str) for c in codecs)):
+            print("Rejected client with a malformed codec list")
+            return None
+        sample_rate = info.get('sample_rate', self.sample_rate)
+        frame_size = info.get('frame_size', self.buffer_size)
+        # JSON 44100.0 compares equal to 44100 but breaks the resampler and buffer sizing
+        if (not is_int(sample_rate) or sample_rate not in self.SAMPLE_RATES or
+                not is_int(frame_size) or frame_size not in self.FRAME_SIZES):
+            print(f"Rejected client with unsupported format: {info.get('sample_rate')} Hz, "
+                  f"{info.get('frame_size')} samples")
+            return None
+        return info
+
+    def handle_frame(self, client_id, frame):
+        client_data = self.clients.get(client_id)
+        if client_data is None:
+            return
+        counter = self.frames_in.get(frame.type)
+        if counter is not None:
+            counter.inc()
+        self.bytes_in.inc(framing.HEADER.size + len(frame.payload))
+        if frame.type == framing.AUDIO:
+            # Decoded by the jitter buffer straight into its ring; malformed frames count as lost.
+            # Stragglers that arrive after the client closed its gate are not played.
+            if len(frame.payload) == client_data['frame_bytes'] and not client_data['gated']:
+                client_data['buffer'].put(frame.seq, frame.timestamp, frame.payload)
+        elif frame.type == framing.SILENCE:
+            client_data['buffer'].put(frame.seq, frame.timestamp, SILENCE)
+        elif frame.type == framing.CONTROL:
+            message = frame.json()
+            if message.get('op') == 'ping':
+                self.send_control(client_data, {'op': 'pong', 'timestamp': frame.timestamp})
+            elif message.get('op') == 'talk_state':
+                client_data['gated'] = not message.get('talking', True)
+
+    def send_control(self, client_data, message):
+        frame = framing.pack_json(framing.CONTROL, message)
+        self.frames_out[framing.CONTROL].inc()
+        self.bytes_out.inc(len(frame))
+        self.send_mix(client_data, frame)
 
     def handle_client(self, client_socket, client_address):
+        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.SEND_BUFFER)
+        reader = framing.FrameReader(client_socket)
         try:
-            header = client_socket.recv(512).decode()
-            info = json.loads(header)
-            channel_key = info.get('channel')
-            if not channel_key:
-                print("Rejected client with no channel info")
+            info = self.parse_join(reader.read_frame())
+            if info is None:
                 client_socket.close()
                 return
-        except:
-            print("Failed to parse client header")
+            owner = self.route(info['channel'])
+            if owner is not None:
+                print(f"[>] {client_address} redirected to {owner['host']}:{owner['port']} for {info['channel']}")
+                client_socket.sendall(self.redirect_frame(info['channel'], owner))
+                client_socket.close()
+                return
+            client_id, client_data = self.join_client(client_socket, client_address, info)
+        except Exception as e:
+            print(f"Client error {client_address}: {e}")
+            self.discard_client(id(client_socket))
             client_socket.close()
             return
+        threading.Thread(target=self.sender_loop, args=(client_data,), daemon=True).start()
 
+        try:
+            while self.running:
+                frame = reader.read_frame()
+                if frame is None:
+                    break
+                self.handle_frame(client_id, frame)
+        except Exception as e:
+            print(f"Client error {client_address}: {e}")
+        finally:
+            self.remove_client(client_id)
+
+    def join_client(self, client_socket, client_address, info):
+        codec = negotiate(info.get('codecs'))
+        client_id, client_data = self.add_client(client_socket, client_address, info['channel'], codec,
+                                                 info.get('sample_rate'), info.get('frame_size'))
+        client_data['offered'] = info.get('codecs')
+        # Clients that predate format negotiation send nothing and get the mix format back
+        ack = {'op': 'joined', 'channel': info['channel'], 'codec': codec, 'silence_suppression': True,
+               'sample_rate': client_data['sample_rate'], 'frame_size': client_data['frame_size']}
+        if info.get('transport') == 'udp':
+            client_data['token'] = secrets.randbits(32)
+            self.media_tokens[client_data['token']] = client_id
+            ack.update(transport='udp', udp_port=self.media_port, token=client_data['token'])
+        self.send_control(client_data, ack)
+        return client_id, client_data
+
+    def add_client(self, client_socket, client_address, channel_key, codec='f32', sample_rate=None,
+                   frame_size=None):
         client_id = id(client_socket)
+        codec = create_codec(codec)
+        sample_rate = sample_rate or self.sample_rate
+        frame_size = frame_size or self.buffer_size
+        buffer = self.JITTER_BUFFER(frame_size / sample_rate, frame_size=frame_size, store=codec.decode_into)
+        if (sample_rate, frame_size) == (self.sample_rate, self.buffer_size):
+            source = buffer
+            downstream = None
+        else:
+            # Converted to and from the mix format by resamplers that keep this client's filter state
+            source = ResampledSource(buffer, sample_rate, self.sample_rate, frame_size, self.buffer_size)
+            downstream = FrameResampler(self.sample_rate, sample_rate, self.buffer_size, frame_size)
         client_data = {
+            'id': client_id,
             'socket': client_socket,
             'address': client_address,
-            'buffer': deque(maxlen=5),
-            'channel': channel_key
+            'buffer': buffer,
+            'source': source,  # what the mixer pops: the buffer itself at the mix format
+            'downstream': downstream,
+            'sample_rate': sample_rate,
+            'frame_size': frame_size,
+            'channel': channel_key,
+            'codec': codec,
+            'tx_codec': codec,  # may step down to a cheaper offered codec for a slow listener
+            'offered': None,
+            'send_queue': SendQueue(self.MAX_PENDING_FRAMES),
+            'frame_bytes': codec.payload_size(frame_size),
+            'tx_seq': 0,
+            'talking': False,
+            'gated': False,  # push-to-talk released or muted; the client sends talk_state to change it
+            'token': None,
+            'udp_addr': None
         }
 
         self.clients[client_id] = client_data
         self.channels[channel_key][client_id] = client_data
+        if channel_key not in self.mixers:
+            self.mixers[channel_key] = ChannelMixer(self.buffer_size)
 
-        print(f"[+] {client_address} joined channel: {channel_key}")
+        print(f"[+] {client_address} joined channel: {channel_key}"
+              + ("" if downstream is None else f" ({sample_rate} Hz, {frame_size} samples, resampled)"))
+        return client_id, client_data
 
+    def discard_client(self, client_id):
+        """remove_client() for a join that failed, possibly partway through add_client()"""
         try:
-            while self.running:
-                data = client_socket.recv(self.buffer_size * 4)
-                if not data:
-                    break
+            self.remove_client(client_id)
+        except Exception:
+            self.clients.pop(client_id, None)
 
-                self.audio_levels[client_id] = self.calculate_audio_level(data)
-                client_data['buffer'].append(data)
-                mixed = self.mix_audio(channel_key, client_id)
-                client_socket.sendall(mixed)
-        except Exception as e:
-            print(f"Client error {client_address}: {e}")
-        finally:
-            print(f"[-] {client_address} left channel: {channel_key}")
-            del self.channels[channel_key][client_id]
-            if not self.channels[channel_key]:
+    def remove_client(self, client_id):
+        client_data = self.clients.pop(client_id, None)
+        if client_data is None:
+            return
+        channel_key = client_data['channel']
+        print(f"[-] {client_data['address']} left channel: {channel_key}")
+        members = self.channels.get(channel_key)
+        if members is not None:
+            members.pop(client_id, None)
+            if not members:
                 del self.channels[channel_key]
-            if client_id in self.audio_levels:
-                del self.audio_levels[client_id]
-            del self.clients[client_id]
-            client_socket.close()
+                self.mixers.pop(channel_key, None)
+        self.levels.remove(client_id)
+        client_data['send_queue'].close()
+        self.media_tokens.pop(client_data['token'], None)
+        stats = client_data['buffer'].stats()
+        for event in self.JITTER_EVENTS:
+            self.jitter_retired[event] += stats[event]
+        client_data['socket'].close()
 
     def start(self):
+        self.start_services()
         self.server_socket.bind((self.host, self.stream_port))
         self.server_socket.listen(10)
+        self.bind_media()
         print(f"Central server started on {self.host}:{self.stream_port}")
+        threading.Thread(target=self.handle_media, daemon=True).start()
+        threading.Thread(target=self.mix_loop, daemon=True).start()
         while self.running:
             try:
                 sock, addr = self.server_socket.accept()
@@ -166,6 +651,7 @@ class CentralAudioServer:
     def stop(self):
         self.running = False
         self.discovery_socket.close()
+        self.media_socket.close()
         self.server_socket.close()
         print("Server shut down")
 
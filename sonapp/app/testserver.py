@@ -1,82 +1,75 @@
 import requests
-import json
 import time
-import base64
-import psutil
-import re
 import os
 import socket
 import threading
 from urllib3.exceptions import InsecureRequestWarning
 from dotenv import load_dotenv
+
+import framing
+from lcu_credentials import LcuCredentialCache
+from lcu_events import LcuEventStream
+from presence import PresenceClient, PresenceHeartbeat
 load_dotenv()
 
 requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
 RIOT_API_KEY = os.getenv('RIOT_API_KEY')
 VC_SERVER_HOST = os.getenv('VC_SERVER_HOST')
 VC_SERVER_PORT = int(os.getenv('VC_SERVER_PORT'))
+VC_DISCOVERY_PORT = int(os.getenv('VC_DISCOVERY_PORT', 65431))  # also answers presence
+CHAMP_SELECT = '/lol-champ-select/v1/session'
+GAMEFLOW = '/lol-gameflow/v1/session'
+EVENTS_RETRY = 30  # seconds of polling before trying the WebSocket again
 
 class LoLClientMonitor:
-    def __init__(self):
+    def __init__(self, lcu_host='127.0.0.1'):
+        self.lcu_host = lcu_host
         self.lcu_port = None
         self.lcu_token = None
         self.lcu_headers = None
+        self.credentials = LcuCredentialCache()
+        self.lcu_pid = None
+        # One keep-alive session, so REST lookups after the first skip the TLS handshake
+        self.http = requests.Session()
+        self.events_retry_at = 0
         self.current_summoner = None
         self.last_game_state = None
         self.in_champ_select = False
         self.in_game = False
         self.voice_thread = None
         self.voice_socket = None
+        self.presence = None
 
     def find_lcu_credentials(self):
-        if not hasattr(self, '_debug_printed'):
-            league_processes = []
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    if proc.info['name'] and ('league' in proc.info['name'].lower() or 'riot' in proc.info['name'].lower()):
-                        league_processes.append(proc.info['name'])
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-            if league_processes:
-                print(f"🔍 Found League processes: {list(set(league_processes))}")
-            self._debug_printed = True
-
-        possible_names = ['LeagueClientUx.exe', 'LeagueClient.exe', 'RiotClientUx.exe', 'RiotClientServices.exe']
-
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                if proc.info['name'] in possible_names:
-                    cmdline = ' '.join(proc.info['cmdline']) if proc.info['cmdline'] else ''
-                    port_match = re.search(r'--app-port=(\d+)', cmdline)
-                    if port_match:
-                        self.lcu_port = port_match.group(1)
-                    token_match = re.search(r'--remoting-auth-token=([^"]+)', cmdline)
-                    if token_match:
-                        self.lcu_token = token_match.group(1).strip('"')
-                    if self.lcu_port and self.lcu_token:
-                        if not hasattr(self, '_credentials_found'):
-                            print(f"✓ Found LCU credentials from {proc.info['name']} (Port: {self.lcu_port})")
-                            print(f"🔑 Token length: {len(self.lcu_token)} chars")
-                            self._credentials_found = True
-                        auth_string = f"riot:{self.lcu_token}"
-                        auth_bytes = base64.b64encode(auth_string.encode()).decode()
-                        self.lcu_headers = {
-                            'Authorization': f'Basic {auth_bytes}',
-                            'Content-Type': 'application/json'
-                        }
-                        return True
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-        return False
+        # Near free while the client runs: the cache only re-checks that its process is alive
+        credentials = self.credentials.get()
+        if credentials is None:
+            self.lcu_port = self.lcu_token = self.lcu_headers = self.lcu_pid = None
+            return False
+        if credentials.pid != self.lcu_pid:
+            print(f"✓ Found LCU credentials from {credentials.source} (Port: {credentials.port}, PID: {credentials.pid})")
+            print(f"🔑 Token length: {len(credentials.token)} chars")
+            self.lcu_pid = credentials.pid
+            self.http.close()  # connections to a previous client are dead
+        if self.http.headers.get('Authorization') != credentials.headers['Authorization']:
+            # Also after a 401 brought a new token under the same PID, or it would be 401 forever
+            self.http.headers.update(credentials.headers)
+        self.lcu_port = credentials.port
+        self.lcu_token = credentials.token
+        self.lcu_headers = credentials.headers
+        return True
 
     def lcu_request(self, endpoint):
         if not self.lcu_port or not self.lcu_headers:
             return None
-        url = f"https://127.0.0.1:{self.lcu_port}{endpoint}"
+        url = f"https://{self.lcu_host}:{self.lcu_port}{endpoint}"
         try:
-            response = requests.get(url, headers=self.lcu_headers, verify=False, timeout=5)
+            # verify per request: a CA bundle in the environment would override session.verify
+            response = self.http.get(url, verify=False, timeout=5)
             if response.status_code == 200:
                 return response.json()
+            if response.status_code == 401:
+                self.credentials.invalidate()  # client restarted under a PID we still took for alive
         except Exception:
             pass
         return None
@@ -89,16 +82,28 @@ class LoLClientMonitor:
             return True
         return False
 
+    def start_presence(self):
+        """Tell the central server we run the app, so teammates can find us"""
+        # Only the PUUID: the client's summonerId is a local number, not the encrypted
+        # id the Riot API gives teammates, so nobody could ever match it
+        ids = [self.current_summoner.get('puuid')]
+        self.presence = PresenceHeartbeat(PresenceClient(VC_SERVER_HOST, VC_DISCOVERY_PORT), ids).start()
+
+    def stop_presence(self):
+        if self.presence:
+            self.presence.stop()
+            self.presence = None
+
     def join_voice_channel(self, channel_name):
         def voice_loop():
             try:
                 self.voice_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                 self.voice_socket.connect((VC_SERVER_HOST, VC_SERVER_PORT))
-                header = json.dumps({"channel": channel_name})
-                self.voice_socket.sendall(header.encode().ljust(512))
+                self.voice_socket.sendall(framing.pack_json(framing.JOIN, {"channel": channel_name}))
+                reader = framing.FrameReader(self.voice_socket)
                 while True:
-                    mixed = self.voice_socket.recv(4096)
-                    if not mixed:
+                    mixed = reader.read_frame()
+                    if mixed is None:
                         break
             except Exception as e:
                 print(f"[VC] Error: {e}")
@@ -124,7 +129,9 @@ class LoLClientMonitor:
         print("[VC] Left voice channel")
 
     def check_champion_select(self):
-        champ_select = self.lcu_request('/lol-champ-select/v1/session')
+        self.on_champ_select(self.lcu_request(CHAMP_SELECT))
+
+    def on_champ_select(self, champ_select):
         if champ_select and not self.in_champ_select:
             self.in_champ_select = True
             print("\n🎯 CHAMPION SELECT DETECTED\n" + "=" * 50)
@@ -139,7 +146,9 @@ class LoLClientMonitor:
             print("❌ Champion select ended")
 
     def check_in_game(self):
-        game_session = self.lcu_request('/lol-gameflow/v1/session')
+        self.on_gameflow(self.lcu_request(GAMEFLOW))
+
+    def on_gameflow(self, game_session):
         if game_session and game_session.get('phase') == 'InProgress':
             if not self.in_game:
                 self.in_game = True
@@ -159,6 +168,39 @@ class LoLClientMonitor:
             self.leave_voice_channel()
             print("❌ Game ended")
 
+    def on_lcu_event(self, uri, event_type, data):
+        data = None if event_type == 'Delete' else data
+        try:
+            if uri == CHAMP_SELECT:
+                self.on_champ_select(data)
+            elif uri == GAMEFLOW:
+                self.on_gameflow(data)
+        except Exception as e:
+            print(f"Error checking game state: {e}")
+
+    def watch_events(self):
+        """Follow champ select and the gameflow phase as the client pushes them.
+
+        Blocks until the client closes the WebSocket. Returns False at once
+        if it cannot be opened, so the caller can poll instead.
+        """
+        stream = LcuEventStream(self.lcu_port, self.lcu_headers, (CHAMP_SELECT, GAMEFLOW), self.on_lcu_event,
+                                host=self.lcu_host)
+        try:
+            stream.connect()
+        except Exception as e:
+            print(f"LCU events unavailable ({e}), polling instead")
+            return False
+        print("✓ Following client events")
+        # Catch up on anything that changed before the subscriptions took effect
+        try:
+            self.check_champion_select()
+            self.check_in_game()
+        except Exception as e:
+            print(f"Error checking game state: {e}")
+        stream.run()
+        return True
+
     def monitor(self):
         print("🔍 Looking for League of Legends client...")
         while True:
@@ -166,6 +208,7 @@ class LoLClientMonitor:
                 if self.current_summoner:
                     print("❌ League client closed")
                     self.current_summoner = None
+                    self.stop_presence()
                     self.in_champ_select = False
                     self.in_game = False
                     self.leave_voice_channel()
@@ -174,9 +217,15 @@ class LoLClientMonitor:
             if not self.current_summoner:
                 if self.get_current_summoner():
                     print("✓ Connected to League client!")
+                    self.start_presence()
                 else:
                     time.sleep(2)
                     continue
+            if LcuEventStream.available() and time.monotonic() >= self.events_retry_at:
+                if self.watch_events():
+                    time.sleep(1)  # the client closed the socket: check it is still running
+                    continue
+                self.events_retry_at = time.monotonic() + EVENTS_RETRY
             try:
                 self.check_champion_select()
                 self.check_in_game()
@@ -195,3 +244,4 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\n👋 Monitoring stopped")
         monitor.leave_voice_channel()
+        monitor.stop_presence()
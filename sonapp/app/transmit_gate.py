@@ -0,0 +1,64 @@
+import threading
+
+OPEN = 'open'  # transmit whenever unmuted; silence suppression still applies
+PUSH_TO_TALK = 'push_to_talk'  # transmit while the key is held
+TOGGLE = 'toggle'  # each key press starts or stops transmitting
+MODES = (OPEN, PUSH_TO_TALK, TOGGLE)
+
+
+class TransmitGate:
+    """Whether the microphone is on the air: talk mode, key state and mute.
+
+    Mute overrides every mode. Key and GUI handlers call press(), release(),
+    toggle() and set_muted() from their own threads; the capture callback
+    only reads is_open. on_change(is_open) is called after every change of
+    the combined state, from the thread that made it, so it must be quick.
+    """
+
+    def __init__(self, mode=OPEN, on_change=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown talk mode {mode!r}, expected one of {', '.join(MODES)}")
+        self.mode = mode
+        self.on_change = on_change
+        self.muted = False
+        self.pressed = False  # push-to-talk key held
+        self.latched = False  # toggle-to-talk state
+        self.lock = threading.Lock()
+        self.is_open = self._evaluate()
+
+    def _evaluate(self):
+        if self.muted:
+            return False
+        if self.mode == PUSH_TO_TALK:
+            return self.pressed
+        if self.mode == TOGGLE:
+            return self.latched
+        return True
+
+    def _update(self, **state):
+        with self.lock:
+            for name, value in state.items():
+                setattr(self, name, value)
+            is_open = self._evaluate()
+            changed = is_open != self.is_open
+            self.is_open = is_open
+        if changed and self.on_change is not None:
+            self.on_change(is_open)
+
+    def press(self):
+        self._update(pressed=True)
+
+    def release(self):
+        self._update(pressed=False)
+
+    def toggle(self):
+        self._update(latched=not self.latched)
+
+    def set_muted(self, muted):
+        self._update(muted=bool(muted))
+
+    def set_mode(self, mode):
+        if mode not in MODES:
+            raise ValueError(f"Unknown talk mode {mode!r}, expected one of {', '.join(MODES)}")
+        # A key held or latched under the old mode does not carry over
+        self._update(mode=mode, pressed=False, latched=False)
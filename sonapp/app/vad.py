@@ -0,0 +1,36 @@
+import numpy as np
+
+
+class VoiceActivityDetector:
+    """Energy gate with an adaptive noise floor and hangover.
+
+    A frame counts as speech when its level clears both an absolute
+    threshold and the tracked noise floor by a margin. The hangover keeps
+    the gate open for a few frames after speech so word endings and short
+    pauses are not clipped. One dot product per frame, no temporaries.
+    """
+
+    def __init__(self, threshold_db=-50, margin_db=10, hangover_frames=15, floor_gain=0.05):
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.hangover_frames = hangover_frames
+        self.floor_gain = floor_gain
+        self.noise_floor_db = threshold_db - margin_db
+        self.hangover = 0
+
+    def level_db(self, samples):
+        samples = samples.reshape(-1)
+        energy = float(np.dot(samples, samples)) / max(1, samples.size)
+        return 10 * np.log10(energy) if energy > 1e-10 else -100.0
+
+    def is_speech(self, samples):
+        db = self.level_db(samples)
+        if db > max(self.threshold_db, self.noise_floor_db + self.margin_db):
+            self.hangover = self.hangover_frames
+            return True
+        # Only learn the floor from non-speech frames so talking never raises it.
+        self.noise_floor_db += (db - self.noise_floor_db) * self.floor_gain
+        if self.hangover > 0:
+            self.hangover -= 1
+            return True
+        return False
@@ -9,6 +9,11 @@ setup(
         'sounddevice',
         'numpy',
         'requests',
-        'keyboard'
+        'keyboard',
+        'netifaces',
     ],
+    extras_require={
+        # LCU WebSocket events; without it the client monitor polls
+        'events': ['websocket-client'],
+    },
 )
\ No newline at end of file